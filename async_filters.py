@@ -0,0 +1,203 @@
+import asyncio
+import concurrent.futures
+
+# Marks the end of the scans in the queues
+_END = object()
+
+
+class AsyncFilterStream:
+    """
+    The async_filter_stream object
+
+    Filters the scans of an async iterator with any filter object that has
+    an update method, such as a RangeFilter, TemporalMedianFilter or
+    FilterPipeline. Reading the scans, filtering them and consuming the
+    results run concurrently: a reader task queues incoming scans, a filter
+    task runs update in an executor, and the filtered scans are queued for
+    the consumer, which iterates over the stream with async for.
+
+    Both queues hold at most max_queued scans. If the consumer falls behind
+    the reader waits for room, holding back the source, unless drop_oldest
+    is set, in which case the oldest queued scan is dropped instead. A scan
+    handed to the consumer more than max_delay seconds after it was read is
+    counted as late.
+
+    The tasks and the executor are stopped when the scans run out or an
+    error is raised. A consumer that stops iterating before that has to
+    call aclose, or use the stream with async with, which calls it on exit.
+    Until then the tasks keep the source open and the stream alive.
+
+    Attributes:
+
+        stage: the filter object whose update is applied to each scan
+        scans: async iterator of scans as accepted by stage.update
+        max_queued (int): max number of scans held in each queue, default
+        value is 2
+        drop_oldest (bool): drop the oldest queued scan rather than wait when
+        the queue is full, default value is False
+        max_delay (int or float): delay in seconds after which a scan is late,
+        default value is None for never
+        executor (Executor): executor that runs update, default value is None
+        for a single thread owned by the stream
+    """
+    def __init__(self, stage, scans, max_queued=2, drop_oldest=False,
+                 max_delay=None, executor=None):
+        self.__stage = stage
+        self.__scans = scans
+        self.__max_queued = max_queued
+        self.__drop_oldest = drop_oldest
+        self.__max_delay = max_delay
+        self.__check_args()
+
+        # Filters keep state, so update must never run concurrently
+        self.__own_executor = executor is None
+        if executor is None:
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.__executor = executor
+
+        self.__tasks = []
+        self.__closed = False
+        self.__received = 0
+        self.__filtered = 0
+        self.__dropped = 0
+        self.__late = 0
+
+    def __check_args(self):
+        """Checks the stage, queue size and delay
+
+        Raises:
+
+            TypeError: Invalid type
+            ValueError: Invalid value
+        """
+        if not hasattr(self.__stage, "update"):
+            error_msg = "stage must have an update method, but given '"
+            error_msg += str(type(self.__stage)) + "'"
+            raise TypeError(error_msg)
+
+        if not isinstance(self.__max_queued, int) or \
+                isinstance(self.__max_queued, bool):
+            error_msg = "max_queued must of type 'int', but given '"
+            error_msg += str(type(self.__max_queued)) + "'"
+            raise TypeError(error_msg)
+        elif self.__max_queued < 1:
+            error_msg = "max_queued must be greater than or equal to one"
+            raise ValueError(error_msg)
+
+        if self.__max_delay is not None:
+            if not isinstance(self.__max_delay, (float, int)) or \
+                    isinstance(self.__max_delay, bool):
+                error_msg = "max_delay must of type int or float, but given: "
+                error_msg += str(type(self.__max_delay))
+                raise TypeError(error_msg)
+            elif self.__max_delay < 0:
+                error_msg = "max_delay must be greater than or equal to zero"
+                raise ValueError(error_msg)
+
+    def stats(self):
+        """Gives the frame counters of the stream
+
+        Returns:
+
+            counters (dict): number of scans "received" from the source,
+            "filtered", "dropped" before filtering and handed to the consumer
+            "late"
+        """
+        return {"received": self.__received, "filtered": self.__filtered,
+                "dropped": self.__dropped, "late": self.__late}
+
+    def __aiter__(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+    async def __anext__(self):
+        if self.__closed:
+            raise StopAsyncIteration
+        if not self.__tasks:
+            self.__start()
+
+        item = await self.__output.get()
+        if item is _END:
+            await self.aclose()
+            raise StopAsyncIteration
+        if isinstance(item, BaseException):
+            await self.aclose()
+            raise item
+
+        scan_list, read_time = item
+        if self.__max_delay is not None and \
+                self.__loop.time() - read_time > self.__max_delay:
+            self.__late += 1
+        return scan_list
+
+    def __start(self):
+        """Creates the queues and starts the reader and filter tasks"""
+        self.__loop = asyncio.get_running_loop()
+        self.__input = asyncio.Queue(maxsize=self.__max_queued)
+        self.__output = asyncio.Queue(maxsize=self.__max_queued)
+        self.__tasks = [self.__loop.create_task(self.__read()),
+                        self.__loop.create_task(self.__filter())]
+
+    async def __read(self):
+        """Queues each scan of the source with the time it was read, and
+        closes the source when stopped"""
+        try:
+            async for scan in self.__scans:
+                self.__received += 1
+                item = (scan, self.__loop.time())
+                if self.__drop_oldest and self.__input.full():
+                    self.__input.get_nowait()
+                    self.__dropped += 1
+                    self.__input.put_nowait(item)
+                else:
+                    await self.__input.put(item)
+            await self.__input.put(_END)
+        except Exception as error:
+            await self.__input.put(error)
+        finally:
+            aclose = getattr(self.__scans, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    async def __filter(self):
+        """Runs update in the executor on each queued scan"""
+        while True:
+            item = await self.__input.get()
+            if item is _END or isinstance(item, BaseException):
+                await self.__output.put(item)
+                return
+
+            scan, read_time = item
+            try:
+                scan_list = await self.__loop.run_in_executor(
+                    self.__executor, self.__stage.update, scan)
+            except Exception as error:
+                await self.__output.put(error)
+                return
+            self.__filtered += 1
+            await self.__output.put((scan_list, read_time))
+
+    async def aclose(self):
+        """Stops reading and filtering scans and closes the source. Scans
+        still queued are discarded, an update already running is allowed to
+        finish. Must be called by a consumer that stops iterating before
+        the scans run out, unless the stream is used with async with
+        """
+        if self.__closed:
+            return
+        self.__closed = True
+        for task in self.__tasks:
+            task.cancel()
+        for task in self.__tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self.__tasks = []
+        if self.__own_executor:
+            self.__executor.shutdown(wait=False)
@@ -0,0 +1,283 @@
+"""Times RangeFilter and TemporalMedianFilter across beam counts, window
+sizes, input types and single versus batch calls, and writes the results
+as JSON so runs on different commits can be compared.
+
+Needs Python 3.4 or newer for time.perf_counter and tracemalloc.
+
+    python benchmark.py --output results.json
+    python benchmark.py --quick --compare results.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from filters import RangeFilter
+from filters import TemporalMedianFilter
+
+BEAM_COUNTS = [360, 1080, 4096, 32768, 131072]
+WINDOW_SIZES = [0, 3, 10, 25, 50]
+INPUT_TYPES = ["ndarray", "list"]
+MODES = ["update", "update_batch", "update_unchecked"]
+
+# Upper bound on the measurements in the scans of one case, wide scans are
+# timed over fewer scans
+MAX_CASE_ELEMENTS = 2**22
+
+
+def make_scans(num_scans, num_points, seed=0):
+    """Makes num_scans random scans with values both below and above the
+    default range limits
+
+    Returns:
+
+        scan_block (numpy.ndarray): num_scans x num_points array
+    """
+    return np.random.RandomState(seed).uniform(-1.0, 60.0,
+                                               (num_scans, num_points))
+
+
+def percentile(latencies, fraction):
+    """Gives the latency below which fraction of the latencies fall"""
+    return float(np.percentile(latencies, 100.0 * fraction))
+
+
+def time_case(make_filter, mode, scans, repeats):
+    """Times one case, warming up the filter with one pass first
+
+    Args:
+
+        make_filter: function returning a new filter
+        mode (str): "update", "update_batch" or "update_unchecked"
+        scans (list or numpy.ndarray): the scans, one per row
+        repeats (int): number of timed passes over the scans
+
+    Returns:
+
+        latencies (list): seconds per call of the filter, for update_batch
+        one call per pass over all the scans
+        peak_bytes (int): peak memory allocated during one pass
+    """
+    def run_pass(median_filter):
+        latencies = []
+        if mode != "update_batch":
+            update = getattr(median_filter, mode)
+            for scan in scans:
+                start = time.perf_counter()
+                update(scan)
+                latencies.append(time.perf_counter() - start)
+        else:
+            start = time.perf_counter()
+            median_filter.update_batch(scans)
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    median_filter = make_filter()
+    run_pass(median_filter)
+    latencies = []
+    for repeat in range(repeats):
+        latencies += run_pass(median_filter)
+
+    tracemalloc.start()
+    run_pass(median_filter)
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return latencies, peak_bytes
+
+
+def run(beam_counts, window_sizes, input_types, modes, num_scans, repeats):
+    """Times every combination of the given parameters
+
+    Returns:
+
+        results (list): one dict per case
+    """
+    results = []
+    cases = [("RangeFilter", None)]
+    cases += [("TemporalMedianFilter", window) for window in window_sizes]
+    for num_points in beam_counts:
+        case_scans = max(10, min(num_scans, MAX_CASE_ELEMENTS // num_points))
+        scan_block = make_scans(case_scans, num_points)
+        for name, num_prev_scans in cases:
+            if name == "RangeFilter":
+                make_filter = RangeFilter
+            else:
+                def make_filter(num_prev_scans=num_prev_scans):
+                    return TemporalMedianFilter(num_prev_scans)
+            for input_type in input_types:
+                scans = scan_block
+                if input_type == "list":
+                    scans = scan_block.tolist()
+                for mode in modes:
+                    if mode == "update_unchecked" and input_type == "list":
+                        # The trusted input fast path only takes arrays
+                        continue
+                    latencies, peak_bytes = time_case(make_filter, mode,
+                                                      scans, repeats)
+                    result = {
+                        "filter": name,
+                        "num_prev_scans": num_prev_scans,
+                        "num_points": num_points,
+                        "input": input_type,
+                        "mode": mode,
+                        "num_scans": case_scans,
+                        "peak_bytes": peak_bytes}
+                    if mode == "update_batch":
+                        # Only one call per pass, too few for percentiles
+                        # per scan, the calls themselves are reported
+                        mean = float(np.mean(latencies)) / case_scans
+                        result["latency_p50_us"] = None
+                        result["latency_p99_us"] = None
+                        result["batch_call_median_us"] = \
+                            1e6 * percentile(latencies, 0.5)
+                        result["batch_call_max_us"] = 1e6 * max(latencies)
+                    else:
+                        mean = float(np.mean(latencies))
+                        result["latency_p50_us"] = \
+                            1e6 * percentile(latencies, 0.5)
+                        result["latency_p99_us"] = \
+                            1e6 * percentile(latencies, 0.99)
+                    result["latency_mean_us"] = 1e6 * mean
+                    result["scans_per_second"] = 1.0 / mean
+                    result["beams_per_second"] = num_points / mean
+                    results.append(result)
+                    print_result(results[-1])
+    return results
+
+
+def print_result(result):
+    """Prints one result as a line of the progress table, the mean latency
+    per scan and per call for update_batch, otherwise the p50 and p99
+    latency per scan"""
+    window = result["num_prev_scans"]
+    window = "-" if window is None else str(window)
+    if result["latency_p50_us"] is None:
+        latency = "%10.1f us mean %9.1f us call" % (
+            result["latency_mean_us"], result["batch_call_median_us"])
+    else:
+        latency = "%10.1f us p50 %10.1f us p99 " % (
+            result["latency_p50_us"], result["latency_p99_us"])
+    sys.stderr.write("%-20s %3s %7d %-7s %-16s %s %10d B peak\n" % (
+        result["filter"], window, result["num_points"], result["input"],
+        result["mode"], latency, result["peak_bytes"]))
+
+
+def typical_latency(result):
+    """Gives the latency per scan a case is compared by, the p50 latency,
+    or the mean latency for update_batch which has no percentiles per
+    scan. Results of earlier runs hold the mean of update_batch as p50"""
+    if result.get("latency_p50_us") is None:
+        return result["latency_mean_us"]
+    return result["latency_p50_us"]
+
+
+def case_key(result):
+    """Gives the parameters identifying a case"""
+    return (result["filter"], result["num_prev_scans"], result["num_points"],
+            result["input"], result["mode"])
+
+
+def compare(results, baseline, threshold):
+    """Prints the typical latency of each case relative to a baseline run
+
+    Args:
+
+        results (list): results of this run
+        baseline (dict): JSON document of an earlier run
+        threshold (float): ratio above which a case counts as a regression
+
+    Returns:
+
+        regressions (int): number of cases slower than threshold times the
+        baseline
+    """
+    baseline = dict((case_key(result), result)
+                    for result in baseline["results"])
+    regressions = 0
+    for result in results:
+        old = baseline.get(case_key(result))
+        if old is None:
+            continue
+        ratio = typical_latency(result) / typical_latency(old)
+        flag = ""
+        if ratio > threshold:
+            regressions += 1
+            flag = "  REGRESSION"
+        sys.stdout.write("%-60s %6.2fx%s\n" % (
+            " ".join(str(value) for value in case_key(result)), ratio, flag))
+    return regressions
+
+
+def git_commit():
+    """Gives the commit of the working tree, or None outside a git repo"""
+    try:
+        output = subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__)))
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.decode("ascii").strip()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--beams", type=int, nargs="+", default=BEAM_COUNTS,
+                        help="beam counts to time")
+    parser.add_argument("--windows", type=int, nargs="+",
+                        default=WINDOW_SIZES, help="num_prev_scans to time")
+    parser.add_argument("--inputs", nargs="+", default=INPUT_TYPES,
+                        choices=INPUT_TYPES, help="input types to time")
+    parser.add_argument("--modes", nargs="+", default=MODES, choices=MODES,
+                        help="methods to time")
+    parser.add_argument("--scans", type=int, default=200,
+                        help="scans per case, fewer for wide scans")
+    parser.add_argument("--repeats", type=int, default=3,
+                        help="timed passes over the scans of each case")
+    parser.add_argument("--quick", action="store_true",
+                        help="only 360 and 4096 beams and windows 0 and 10")
+    parser.add_argument("--output", help="file to write the JSON results to, "
+                        "default is standard output")
+    parser.add_argument("--compare", help="JSON results of an earlier run to "
+                        "compare latencies against")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="latency ratio above which --compare reports a "
+                        "regression and exits with status 1")
+    args = parser.parse_args(argv)
+    if args.quick:
+        args.beams = [360, 4096]
+        args.windows = [0, 10]
+
+    results = run(args.beams, args.windows, args.inputs, args.modes,
+                  args.scans, args.repeats)
+    document = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z")},
+        "results": results}
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(document, output_file, indent=1)
+    elif not args.compare:
+        json.dump(document, sys.stdout, indent=1)
+        sys.stdout.write("\n")
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
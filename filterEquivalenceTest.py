@@ -0,0 +1,414 @@
+import os
+import numpy as np
+import unittest
+from filters import RangeFilter
+from filters import TemporalMedianFilter
+from filters import FilterPipeline
+from filters import RangeFilterBank
+from filters import TemporalMedianFilterBank
+from filters import ShardedTemporalMedianFilter
+from filters import RegionOfInterest
+from filters import RegionOfInterestFilter
+from filters import filter_stream
+
+# Number of random scan streams each test checks, raise it for a longer
+# search, e.g. FILTER_EQUIVALENCE_STREAMS=2000 python filterEquivalenceTest.py
+NUM_STREAMS = int(os.environ.get("FILTER_EQUIVALENCE_STREAMS", "60"))
+WINDOW_SIZES = [0, 1, 2, 3, 4, 5, 8, 13, 24]
+BEAM_COUNTS = [1, 2, 3, 7, 16, 61, 360]
+
+
+class ReferenceRangeFilter:
+    """
+    Frozen copy of the original per scan RangeFilter.update, the model
+    every accelerated path is checked against. Only changed so that it no
+    longer writes into the caller's array
+    """
+    def __init__(self, min_range=0.03, max_range=50.0):
+        self.__min_range = min_range
+        self.__max_range = max_range
+
+    def update(self, scan):
+        scan_array = np.array(scan, dtype=float)
+        element_count = scan_array.size
+        scan_array.shape = (element_count)
+
+        for index in range(scan_array.size):
+            if scan_array[index] < self.__min_range:
+                scan_array[index] = self.__min_range
+            elif scan_array[index] > self.__max_range:
+                scan_array[index] = self.__max_range
+
+        scan_list = scan_array.tolist()
+        return scan_list
+
+
+class ReferenceTemporalMedianFilter:
+    """
+    Frozen copy of the original per scan TemporalMedianFilter.update, the
+    model every accelerated path is checked against. Only changed to use
+    integer division and to not reshape the caller's array
+    """
+    def __init__(self, num_prev_scans=3):
+        self.__N = 0;   # num of data points in scan
+        self.__num_prev_scans = num_prev_scans
+        self.__ordered_data = np.array([[]])
+        self.__unordered_data = np.array([[]])
+
+    def update(self, scan):
+        scan_array = np.array(scan)
+        element_count = scan_array.size
+        scan_array.shape = (element_count)
+
+        # Remove the last entry in the array to maintain num_prev_scans
+        # most recent scans
+        num_scans = self.__unordered_data.shape[0]
+        if num_scans > self.__num_prev_scans:
+            num_scans-=1
+            self.__unordered_data = \
+                np.delete(self.__unordered_data, num_scans,axis=0)
+
+        # Return the scan if it is the very first input into the array
+        if self.__unordered_data.size == 0:
+            self.__N = scan_array.size;
+            self.__unordered_data = np.vstack([scan_array])
+            return self.__unordered_data[0].tolist()
+        else:
+            # Check every scan has same number of measurements as first scan
+            if scan_array.size != self.__N:
+                raise ValueError("number of data points not consistent")
+            else:
+                self.__unordered_data = \
+                    np.vstack([scan_array, self.__unordered_data])
+                self.__ordered_data = self.__unordered_data.copy()
+                num_scans+=1
+
+        # sort by column
+        self.__ordered_data.sort(axis=0)
+
+        # determine the median val for each column
+        if num_scans%2:
+            median_val = self.__ordered_data[(num_scans + 1)//2 - 1, :]
+        else:
+            median_val_1 = self.__ordered_data[num_scans//2 - 1, :]
+            median_val_2 = self.__ordered_data[(num_scans + 2)//2 - 1, :]
+            median_val = (median_val_1 + median_val_2) / 2.0
+
+        median_val = median_val.tolist()
+        return median_val
+
+
+def random_stream(random_state, num_scans, num_points, nan=True):
+    """Makes a random stream of scans with ties, values outside the default
+    range limits, constant beams and, if nan is set, NaN
+
+    Returns:
+
+        scan_block (numpy.ndarray): num_scans x num_points array
+    """
+    scan_block = random_state.uniform(-5.0, 60.0, (num_scans, num_points))
+    kind = random_state.randint(4)
+    if kind == 1:
+        # Few distinct values, so windows are full of ties
+        scan_block = np.round(scan_block / 10.0) * 10.0
+    elif kind == 2:
+        scan_block[:, random_state.uniform(size=num_points) < 0.3] = 7.5
+    if nan:
+        scan_block[random_state.uniform(size=scan_block.shape) < 0.05] = \
+            np.nan
+    return scan_block
+
+
+def reference_medians(num_prev_scans, scan_block):
+    """Runs the reference model over a stream
+
+    Returns:
+
+        median_block (list): the medians of each scan as lists
+    """
+    reference = ReferenceTemporalMedianFilter(num_prev_scans)
+    return [reference.update(scan) for scan in scan_block]
+
+
+def batch_cuts(random_state, num_scans):
+    """Gives random points to split a stream into update_batch calls"""
+    num_cuts = random_state.randint(0, 4)
+    return sorted(set(random_state.randint(0, num_scans + 1, num_cuts))) + \
+        [num_scans]
+
+
+class TestFilterEquivalence(unittest.TestCase):
+
+    def streams(self, seed, nan=True):
+        """Yields random stream parameters, with a message naming them so
+        that a failure can be reproduced"""
+        random_state = np.random.RandomState(seed)
+        for idx in range(NUM_STREAMS):
+            num_prev_scans = WINDOW_SIZES[random_state.randint(
+                len(WINDOW_SIZES))]
+            num_points = BEAM_COUNTS[random_state.randint(len(BEAM_COUNTS))]
+            num_scans = random_state.randint(1, 40)
+            scan_block = random_stream(random_state, num_scans, num_points,
+                                       nan)
+            msg = "seed %d stream %d: num_prev_scans %d, %d x %d scans" % (
+                seed, idx, num_prev_scans, num_scans, num_points)
+            yield random_state, num_prev_scans, scan_block, msg
+
+    def assertScansEqual(self, expected_result, actual_result, msg):
+        np.testing.assert_array_equal(np.asarray(expected_result),
+                                      np.asarray(actual_result), err_msg=msg)
+
+    def test_update_matches_reference(self):
+        for random_state, num_prev_scans, scan_block, msg in self.streams(0):
+            expected_result = reference_medians(num_prev_scans, scan_block)
+            median_filter = TemporalMedianFilter(num_prev_scans)
+            for scan, expected_scan in zip(scan_block, expected_result):
+                actual_scan = median_filter.update(scan.tolist())
+                self.assertIsInstance(actual_scan, list, msg)
+                self.assertScansEqual(expected_scan, actual_scan, msg)
+
+    def test_update_out_and_unchecked_match_reference(self):
+        for random_state, num_prev_scans, scan_block, msg in self.streams(1):
+            expected_result = reference_medians(num_prev_scans, scan_block)
+            median_filter = TemporalMedianFilter(num_prev_scans)
+            unchecked_filter = TemporalMedianFilter(num_prev_scans)
+            out = np.empty(scan_block.shape[1])
+            for scan, expected_scan in zip(scan_block, expected_result):
+                median_filter.update(scan, out=out)
+                self.assertScansEqual(expected_scan, out, msg)
+                self.assertScansEqual(expected_scan,
+                                      unchecked_filter.update_unchecked(scan),
+                                      msg)
+
+    def test_update_batch_matches_reference(self):
+        for random_state, num_prev_scans, scan_block, msg in self.streams(2):
+            expected_result = reference_medians(num_prev_scans, scan_block)
+            median_filter = TemporalMedianFilter(num_prev_scans)
+            actual_result = []
+            start = 0
+            for stop in batch_cuts(random_state, scan_block.shape[0]):
+                actual_result += median_filter.update_batch(
+                    scan_block[start:stop]).tolist()
+                if stop < scan_block.shape[0]:
+                    actual_result.append(median_filter.update(
+                        scan_block[stop]))
+                    stop += 1
+                start = stop
+            self.assertScansEqual(expected_result,
+                                  actual_result[:len(expected_result)], msg)
+            self.assertEqual(len(expected_result), len(actual_result), msg)
+
+    def test_modes_without_invalid_returns_match_reference(self):
+        # With every return valid, masking and an adaptive window that never
+        # shrinks leave the medians unchanged
+        for random_state, num_prev_scans, scan_block, msg in \
+                self.streams(3, nan=False):
+            scan_block = np.abs(scan_block) + 0.5
+            expected_result = reference_medians(num_prev_scans, scan_block)
+            for kwargs in [{"mask_invalid": True},
+                           {"motion_threshold": float("inf")}]:
+                median_filter = TemporalMedianFilter(num_prev_scans, **kwargs)
+                actual_result = [median_filter.update(scan)
+                                 for scan in scan_block[:3]]
+                actual_result += median_filter.update_batch(
+                    scan_block[3:]).tolist()
+                self.assertScansEqual(expected_result, actual_result,
+                                      msg + " " + str(kwargs))
+
+    def test_float32_and_float16_match_reference(self):
+        for random_state, num_prev_scans, scan_block, msg in self.streams(4):
+            for dtype in [np.float32, np.float16]:
+                typed_block = scan_block.astype(dtype)
+                reference = ReferenceTemporalMedianFilter(num_prev_scans)
+                expected_result = [np.asarray(reference.update(scan),
+                                              dtype=dtype).tolist()
+                                   for scan in typed_block]
+                median_filter = TemporalMedianFilter(num_prev_scans,
+                                                     dtype=dtype)
+                actual_result = [median_filter.update(scan)
+                                 for scan in typed_block[:2]]
+                actual_result += median_filter.update_batch(
+                    typed_block[2:]).tolist()
+                self.assertScansEqual(expected_result, actual_result,
+                                      msg + " " + np.dtype(dtype).name)
+
+    def test_uint16_matches_reference_in_millimetres(self):
+        for random_state, num_prev_scans, scan_block, msg in \
+                self.streams(5, nan=False):
+            millimetres = np.clip(np.round(scan_block * 1000.0), 0, 65535)
+            expected_result = reference_medians(num_prev_scans, millimetres)
+            expected_result = np.asarray(expected_result, dtype=np.float32)
+            expected_result /= np.float32(1000)
+            median_filter = TemporalMedianFilter(num_prev_scans,
+                                                 dtype=np.uint16)
+            scans = millimetres / 1000.0
+            actual_result = [median_filter.update(scan) for scan in scans[:2]]
+            actual_result += median_filter.update_batch(scans[2:]).tolist()
+            self.assertScansEqual(expected_result, actual_result, msg)
+
+    def test_inconsistent_num_measurement_matches_reference(self):
+        for random_state, num_prev_scans, scan_block, msg in self.streams(6):
+            num_points = scan_block.shape[1]
+            other_scan = np.ones(num_points + 1)
+            reference = ReferenceTemporalMedianFilter(num_prev_scans)
+            median_filter = TemporalMedianFilter(num_prev_scans)
+            batch_filter = TemporalMedianFilter(num_prev_scans)
+            reference.update(scan_block[0])
+            median_filter.update(scan_block[0])
+            batch_filter.update_batch(scan_block[:1])
+            if num_prev_scans == 0:
+                # Every scan is the first, any number of measurements goes
+                self.assertScansEqual(reference.update(other_scan),
+                                      median_filter.update(other_scan), msg)
+                continue
+            with self.assertRaises(ValueError, msg=msg):
+                reference.update(other_scan)
+            with self.assertRaises(ValueError, msg=msg):
+                median_filter.update(other_scan)
+            with self.assertRaises(ValueError, msg=msg):
+                batch_filter.update_batch(other_scan.reshape(1, -1))
+
+    def test_pipeline_and_stream_match_reference(self):
+        for random_state, num_prev_scans, scan_block, msg in self.streams(7):
+            range_reference = ReferenceRangeFilter()
+            expected_result = reference_medians(
+                num_prev_scans,
+                [range_reference.update(scan) for scan in scan_block])
+
+            pipeline = FilterPipeline([RangeFilter(),
+                                       TemporalMedianFilter(num_prev_scans)])
+            actual_result = [pipeline.update(scan) for scan in scan_block]
+            self.assertScansEqual(expected_result, actual_result, msg)
+
+            pipeline = FilterPipeline([RangeFilter(),
+                                       TemporalMedianFilter(num_prev_scans)])
+            self.assertScansEqual(expected_result,
+                                  pipeline.update_batch(scan_block), msg)
+
+            actual_result = list(filter_stream(
+                FilterPipeline([RangeFilter(),
+                                TemporalMedianFilter(num_prev_scans)]),
+                iter(scan_block)))
+            self.assertScansEqual(expected_result, actual_result, msg)
+
+    def test_banks_match_reference(self):
+        for random_state, num_prev_scans, scan_block, msg in self.streams(8):
+            # Split each scan into sensors with different beam counts
+            num_points = scan_block.shape[1]
+            bounds = [0] + sorted(random_state.randint(
+                0, num_points + 1, random_state.randint(0, 3))) + [num_points]
+            sensors = [(start, stop) for start, stop in zip(bounds, bounds[1:])
+                       if stop > start]
+
+            references = [ReferenceTemporalMedianFilter(num_prev_scans)
+                          for sensor in sensors]
+            bank = TemporalMedianFilterBank(num_prev_scans)
+            for scan in scan_block:
+                frame = [scan[start:stop] for start, stop in sensors]
+                expected_frame = [reference.update(scan)
+                                  for reference, scan in zip(references,
+                                                             frame)]
+                actual_frame = bank.update(frame)
+                for expected_scan, actual_scan in zip(expected_frame,
+                                                      actual_frame):
+                    self.assertScansEqual(expected_scan, actual_scan, msg)
+
+            min_ranges = [random_state.uniform(0.0, 5.0) for sensor in sensors]
+            max_ranges = [random_state.uniform(20.0, 50.0)
+                          for sensor in sensors]
+            range_bank = RangeFilterBank(min_ranges, max_ranges)
+            for scan in scan_block:
+                frame = [scan[start:stop] for start, stop in sensors]
+                actual_frame = range_bank.update(frame)
+                for idx, actual_scan in enumerate(actual_frame):
+                    reference = ReferenceRangeFilter(min_ranges[idx],
+                                                     max_ranges[idx])
+                    self.assertScansEqual(reference.update(frame[idx]),
+                                          actual_scan, msg)
+
+    def test_range_filter_modes_match_reference(self):
+        for random_state, num_prev_scans, scan_block, msg in self.streams(9):
+            min_range = random_state.uniform(0.0, 5.0)
+            max_range = random_state.uniform(20.0, 50.0)
+            reference = ReferenceRangeFilter(min_range, max_range)
+            expected_result = [reference.update(scan) for scan in scan_block]
+            range_filter = RangeFilter(min_range, max_range)
+
+            actual_result = [range_filter.update(scan.tolist())
+                             for scan in scan_block]
+            self.assertIsInstance(actual_result[0], list, msg)
+            self.assertScansEqual(expected_result, actual_result, msg)
+            self.assertScansEqual(expected_result,
+                                  range_filter.update_batch(scan_block), msg)
+            self.assertScansEqual(
+                expected_result,
+                [range_filter.update_unchecked(scan) for scan in scan_block],
+                msg)
+            in_place = scan_block.copy()
+            for scan in in_place:
+                range_filter.update(scan, out=scan)
+            self.assertScansEqual(expected_result, in_place, msg)
+
+            for dtype in [np.float32, np.float16]:
+                range_filter = RangeFilter(min_range, max_range, dtype=dtype)
+                self.assertScansEqual(
+                    np.asarray(expected_result, dtype=dtype),
+                    range_filter.update_batch(scan_block), msg)
+
+    def test_region_changes_match_reference(self):
+        # Beams that stay in the region continue their reference filter,
+        # beams that join it start a new one
+        for random_state, num_prev_scans, scan_block, msg in self.streams(11):
+            num_scans, num_points = scan_block.shape
+
+            def random_region():
+                start = random_state.randint(num_points + 1)
+                stop = random_state.randint(start, num_points + 1)
+                return RegionOfInterest(ranges=[(start, stop)],
+                                        stride=random_state.randint(1, 3))
+
+            region_filter = RegionOfInterestFilter(
+                TemporalMedianFilter(num_prev_scans), random_region(),
+                scatter=True)
+            references = {}
+            for idx, scan in enumerate(scan_block):
+                if idx and random_state.uniform() < 0.3:
+                    region_filter.change_region(random_region())
+                if random_state.uniform() < 0.5:
+                    actual_scan = region_filter.update(scan)
+                else:
+                    actual_scan = region_filter.update_batch(
+                        scan.reshape(1, -1))[0]
+                beams = region_filter.beams().tolist()
+                references = dict(
+                    (beam, references.get(beam,
+                                          ReferenceTemporalMedianFilter(
+                                              num_prev_scans)))
+                    for beam in beams)
+                expected_scan = np.full(num_points, np.nan)
+                for beam in beams:
+                    expected_scan[beam] = references[beam].update(
+                        scan[beam:beam + 1])[0]
+                self.assertScansEqual(expected_scan, actual_scan,
+                                      msg + " scan %d" % idx)
+
+    def test_sharded_matches_reference(self):
+        # Worker processes are slow to start, so fewer and shorter streams
+        for random_state, num_prev_scans, scan_block, msg in self.streams(10):
+            if random_state.uniform() > 0.1:
+                continue
+            expected_result = reference_medians(num_prev_scans, scan_block)
+            sharded_filter = ShardedTemporalMedianFilter(num_prev_scans,
+                                                         num_workers=2)
+            try:
+                actual_result = [sharded_filter.update(scan)
+                                 for scan in scan_block[:2]]
+                actual_result += sharded_filter.update_batch(
+                    scan_block[2:]).tolist()
+            finally:
+                sharded_filter.close()
+            self.assertScansEqual(expected_result, actual_result, msg)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
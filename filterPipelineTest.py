@@ -0,0 +1,138 @@
+import numpy as np
+import unittest
+from filters import RangeFilter
+from filters import TemporalMedianFilter
+from filters import FilterPipeline
+from filters import SpatialMedianFilter
+
+
+class RecordingRangeFilter(RangeFilter):
+
+    def update(self, scan, out=None):
+        self.scan_dtype = scan.dtype
+        return RangeFilter.update(self, scan, out=out)
+
+
+class TestFilterPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.scan_array = np.random.RandomState(0).uniform(-5.0, 60.0, (20, 8))
+
+    def chained_result(self, filters, scan_array):
+        result = []
+        for scan in scan_array:
+            for stage in filters:
+                scan = stage.update(scan)
+            result.append(scan)
+        return result
+
+    def test_spatial_stage_matches_chained_filters(self):
+        filters = [RangeFilter(0.03, 50.0), SpatialMedianFilter(0.5, 0.25),
+                   TemporalMedianFilter(3)]
+        expected_result = self.chained_result(filters, self.scan_array)
+        self.pipeline = FilterPipeline(
+            [RangeFilter(0.03, 50.0), SpatialMedianFilter(0.5, 0.25),
+             TemporalMedianFilter(3)])
+        self.assertEqual(expected_result,
+                         self.pipeline.update_batch(self.scan_array).tolist())
+
+    def test_range_then_median_matches_chained_filters(self):
+        expected_result = self.chained_result(
+            [RangeFilter(0.03, 50.0), TemporalMedianFilter(3)],
+            self.scan_array)
+        self.pipeline = FilterPipeline(
+            [RangeFilter(0.03, 50.0), TemporalMedianFilter(3)])
+        actual_result = [self.pipeline.update(scan)
+                         for scan in self.scan_array]
+        self.assertEqual(expected_result, actual_result)
+
+    def test_median_then_range_matches_chained_filters(self):
+        expected_result = self.chained_result(
+            [TemporalMedianFilter(4), RangeFilter(1.0, 40.0)],
+            self.scan_array)
+        self.pipeline = FilterPipeline(
+            [TemporalMedianFilter(4), RangeFilter(1.0, 40.0)])
+        actual_result = [self.pipeline.update(scan)
+                         for scan in self.scan_array]
+        self.assertEqual(expected_result, actual_result)
+
+    def test_stages_pass_their_result_dtype(self):
+        for dtype, result_dtype in [(np.float32, np.float32),
+                                    (np.float16, np.float16),
+                                    (np.uint16, np.float32)]:
+            last_stage = RecordingRangeFilter(dtype=result_dtype)
+            pipeline = FilterPipeline([
+                TemporalMedianFilter(2, dtype=dtype),
+                SpatialMedianFilter(dtype=result_dtype), last_stage])
+            expected_result = self.chained_result(
+                [TemporalMedianFilter(2, dtype=dtype),
+                 SpatialMedianFilter(dtype=result_dtype),
+                 RangeFilter(dtype=result_dtype)], self.scan_array)
+            actual_result = [pipeline.update(scan) for scan in self.scan_array]
+            self.assertEqual(result_dtype, last_stage.scan_dtype)
+            self.assertEqual(expected_result, actual_result)
+
+    def test_update_with_list_and_zero_previous_scans(self):
+        self.pipeline = FilterPipeline(
+            [RangeFilter(0.03, 50.0), TemporalMedianFilter(0)])
+        scan_list = [-1.0,0.0,30.0,50.0,100.0]
+        expected_result = [0.03,0.03,30.0,50.0,50.0]
+        actual_result = self.pipeline.update(scan_list)
+        self.assertEqual(expected_result, actual_result)
+
+    def test_update_into_out_numpy_array(self):
+        expected_result = self.chained_result(
+            [RangeFilter(0.03, 50.0), TemporalMedianFilter(3)],
+            self.scan_array)
+        self.pipeline = FilterPipeline(
+            [RangeFilter(0.03, 50.0), TemporalMedianFilter(3)])
+        out = np.empty(8)
+        for idx in range(self.scan_array.shape[0]):
+            actual_result = self.pipeline.update(self.scan_array[idx], out=out)
+            self.assertIs(out, actual_result)
+            self.assertEqual(expected_result[idx], out.tolist())
+
+    def test_update_batch_matches_update(self):
+        self.pipeline = FilterPipeline(
+            [RangeFilter(0.03, 50.0), TemporalMedianFilter(3),
+             RangeFilter(1.0, 40.0)])
+        expected_result = [self.pipeline.update(scan)
+                           for scan in self.scan_array[:10]]
+
+        self.pipeline = FilterPipeline(
+            [RangeFilter(0.03, 50.0), TemporalMedianFilter(3),
+             RangeFilter(1.0, 40.0)])
+        actual_result = self.pipeline.update_batch(self.scan_array[:10])
+        self.assertEqual(expected_result, actual_result.tolist())
+        self.assertEqual(self.chained_result(
+            [RangeFilter(0.03, 50.0), TemporalMedianFilter(3),
+             RangeFilter(1.0, 40.0)], self.scan_array)[10],
+            self.pipeline.update(self.scan_array[10]))
+
+    def test_inconsistent_num_measurement(self):
+        self.pipeline = FilterPipeline(
+            [RangeFilter(0.03, 50.0), TemporalMedianFilter(3)])
+        self.pipeline.update([1.0,2.0,3.0])
+        with self.assertRaises(ValueError):
+            self.pipeline.update([1.0,2.0])
+
+    def test_empty_filters(self):
+        with self.assertRaises(ValueError):
+            self.pipeline = FilterPipeline([])
+
+    def test_wrong_filter_type(self):
+        with self.assertRaises(TypeError):
+            self.pipeline = FilterPipeline([RangeFilter(), "median"])
+
+    def test_wrong_filters_type(self):
+        with self.assertRaises(TypeError):
+            self.pipeline = FilterPipeline(RangeFilter())
+
+    def test_wrong_scan_type(self):
+        self.pipeline = FilterPipeline([RangeFilter()])
+        with self.assertRaises(TypeError):
+            self.pipeline.update((1.0,2.0))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
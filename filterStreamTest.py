@@ -0,0 +1,123 @@
+import asyncio
+import concurrent.futures
+import numpy as np
+import unittest
+from filters import RangeFilter
+from filters import TemporalMedianFilter
+from filters import FilterPipeline
+from filters import filter_stream
+from async_filters import AsyncFilterStream
+
+
+async def async_scans(scans, delay=0.0):
+    for scan in scans:
+        await asyncio.sleep(delay)
+        yield scan
+
+
+async def collect(stream, delay=0.0):
+    result = []
+    async for scan in stream:
+        result.append(scan)
+        await asyncio.sleep(delay)
+    return result
+
+
+class TestFilterStream(unittest.TestCase):
+
+    def setUp(self):
+        self.scan_array = np.random.RandomState(0).uniform(-5.0, 60.0, (12, 6))
+
+    def test_filter_stream_matches_update(self):
+        reference = TemporalMedianFilter(3)
+        expected_result = [reference.update(scan) for scan in self.scan_array]
+        actual_result = list(filter_stream(TemporalMedianFilter(3),
+                                           iter(self.scan_array)))
+        self.assertEqual(expected_result, actual_result)
+
+    def test_filter_stream_is_lazy(self):
+        stream = filter_stream(RangeFilter(), iter([[100.0], "not a scan"]))
+        self.assertEqual([50.0], next(stream))
+        with self.assertRaises(TypeError):
+            next(stream)
+
+    def test_async_stream_matches_update(self):
+        reference = FilterPipeline([RangeFilter(), TemporalMedianFilter(3)])
+        expected_result = [reference.update(scan) for scan in self.scan_array]
+        stream = AsyncFilterStream(
+            FilterPipeline([RangeFilter(), TemporalMedianFilter(3)]),
+            async_scans(self.scan_array))
+        actual_result = asyncio.run(collect(stream))
+        self.assertEqual(expected_result, actual_result)
+        self.assertEqual({"received": 12, "filtered": 12, "dropped": 0,
+                          "late": 0}, stream.stats())
+
+    def test_async_stream_drops_oldest_when_consumer_falls_behind(self):
+        stream = AsyncFilterStream(RangeFilter(), async_scans(self.scan_array),
+                                   max_queued=1, drop_oldest=True)
+        actual_result = asyncio.run(collect(stream, delay=0.01))
+        stats = stream.stats()
+        self.assertEqual(12, stats["received"])
+        self.assertGreater(stats["dropped"], 0)
+        self.assertEqual(12, stats["filtered"] + stats["dropped"])
+        self.assertEqual(stats["filtered"], len(actual_result))
+        self.assertEqual(RangeFilter().update(self.scan_array[-1]),
+                         actual_result[-1])
+
+    def test_async_stream_counts_late_scans(self):
+        stream = AsyncFilterStream(RangeFilter(), async_scans(self.scan_array),
+                                   max_delay=0.0)
+        actual_result = asyncio.run(collect(stream, delay=0.005))
+        self.assertEqual(12, len(actual_result))
+        self.assertGreater(stream.stats()["late"], 0)
+
+    def test_async_stream_raises_filter_error(self):
+        stream = AsyncFilterStream(TemporalMedianFilter(3),
+                                   async_scans([[1.0,2.0], [1.0]]))
+        with self.assertRaises(ValueError):
+            asyncio.run(collect(stream))
+
+    def test_async_stream_early_exit_stops_tasks(self):
+        source_state = {"read": 0, "closed": False}
+
+        async def endless_scans():
+            try:
+                while True:
+                    source_state["read"] += 1
+                    yield [1.0,2.0]
+            finally:
+                source_state["closed"] = True
+
+        async def first_scans(stream):
+            result = []
+            async with stream:
+                async for scan in stream:
+                    result.append(scan)
+                    if len(result) == 3:
+                        break
+            self.assertTrue(source_state["closed"])
+            read = source_state["read"]
+            await asyncio.sleep(0.01)
+            # Nothing is read once the stream is closed
+            self.assertEqual(read, source_state["read"])
+            self.assertEqual([], [scan async for scan in stream])
+            return result
+
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        stream = AsyncFilterStream(RangeFilter(), endless_scans(),
+                                   executor=executor)
+        actual_result = asyncio.run(first_scans(stream))
+        executor.shutdown()
+        self.assertEqual([[1.0,2.0]] * 3, actual_result)
+
+    def test_async_stream_wrong_stage_type(self):
+        with self.assertRaises(TypeError):
+            AsyncFilterStream("median", async_scans([]))
+
+    def test_async_stream_zero_max_queued(self):
+        with self.assertRaises(ValueError):
+            AsyncFilterStream(RangeFilter(), async_scans([]), max_queued=0)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -1,225 +1,4498 @@
+import os
+import struct
+from timeit import default_timer
+
 import numpy as np
-import copy
 
-class RangeFilter:
+# json, zlib and multiprocessing are imported where they are used, so that
+# importing this module only pays for what the filters need on every scan
+
+# Number of measurements per window position a batch median processes at
+# once, small enough that a chunk of windows stays in cache
+BATCH_CHUNK_ELEMENTS = 2**14
+
+# dtypes measurements can be kept in. A TemporalMedianFilter can also keep
+# its history in uint16 as whole millimetres, for ranges up to 65.535
+FLOAT_DTYPES = (np.float64, np.float32, np.float16)
+FIXED_POINT_DTYPE = np.uint16
+MILLIMETRES_PER_UNIT = 1000
+
+# Median engines of a TemporalMedianFilter. The histogram engine counts
+# each beam's measurements in bins, grouped in blocks of this many bins so
+# that finding the median bin scans the block totals and then one block
+MEDIAN_ENGINES = ("exact", "histogram")
+HISTOGRAM_BLOCK_BINS = 32
+
+# Stages an update is timed in and counters kept while profiling
+RANGE_FILTER_STAGES = ("convert", "count", "clip", "output")
+RANGE_FILTER_COUNTERS = ("scans", "beams", "clamped_low", "clamped_high",
+                         "invalid")
+TEMPORAL_MEDIAN_STAGES = ("convert", "insert", "median", "output")
+TEMPORAL_MEDIAN_COUNTERS = ("scans", "beams", "evictions")
+
+# A filter state file is a header, the filter's settings and the layout of
+# its arrays as JSON, then the raw data of each array starting on a
+# multiple of STATE_ALIGNMENT bytes so that it can be memory mapped
+STATE_MAGIC = b"FLTSTATE"
+STATE_VERSION = 1
+STATE_HEADER = struct.Struct("<8sHI")  # magic, version, JSON length
+STATE_ALIGNMENT = 64
+
+
+def _to_scan_block(scans):
+    """Converts scans to a 2D numpy.ndarray with one scan per row
+
+    Args:
+
+        scans (list or numpy.ndarray): T scans of N measurements each
+
+    Raises:
+
+        TypeError: scans is the wrong type
+        ValueError: scans is not 2D
+
+    Returns:
+
+        scan_block (numpy.ndarray): T x N array of scans
+    """
+    if not isinstance(scans, (list, np.ndarray)):
+        error_msg = "scans wrong type, expected 'list' or 'numpy.ndarray'"
+        raise TypeError(error_msg)
+
+    scan_block = np.asarray(scans)
+    if scan_block.ndim != 2:
+        error_msg = "scans must be 2D with one scan per row, but given "
+        error_msg += str(scan_block.ndim) + "D"
+        raise ValueError(error_msg)
+    return scan_block
+
+
+def _check_dtype(dtype, allowed):
+    """Checks that dtype is one of the allowed dtypes
+
+    Args:
+
+        dtype: anything numpy.dtype accepts
+        allowed (tuple): the allowed dtypes
+
+    Raises:
+
+        TypeError: Invalid type
+
+    Returns:
+
+        dtype (numpy.dtype): the dtype
+    """
+    names = ", ".join(np.dtype(option).name for option in allowed)
+    try:
+        dtype = np.dtype(dtype)
+    except TypeError:
+        dtype = None
+    if dtype is None or dtype not in [np.dtype(option) for option in allowed]:
+        error_msg = "dtype must be one of " + names + ", but given: "
+        error_msg += str(dtype)
+        raise TypeError(error_msg)
+    return dtype
+
+
+def _result_dtype(dtype):
+    """Gives the dtype of the results of a filter that keeps measurements
+    in dtype, float32 metres for uint16 millimetres
+
+    Returns:
+
+        result_dtype (numpy.dtype): dtype of the results
+    """
+    if np.dtype(dtype) == FIXED_POINT_DTYPE:
+        return np.dtype(np.float32)
+    return np.dtype(dtype)
+
+
+def _to_millimetres(scan_array, nan_value):
+    """Converts measurements in metres to the whole millimetres of a uint16
+    history, saturating at 0 and 65535
+
+    Args:
+
+        scan_array (numpy.ndarray): measurements in metres
+        nan_value (int): value NaN is stored as
+
+    Returns:
+
+        history_array (numpy.ndarray): measurements as uint16
+    """
+    scan_array = np.asarray(scan_array, dtype=float)
+    history_array = np.rint(scan_array * MILLIMETRES_PER_UNIT)
+    np.clip(history_array, 0, np.iinfo(FIXED_POINT_DTYPE).max,
+            out=history_array)
+    history_array[np.isnan(history_array)] = nan_value
+    return history_array.astype(FIXED_POINT_DTYPE)
+
+
+def _check_trusted_scan(scan_array, out, dtype):
+    """Checks the first scan given to an update_unchecked method, later
+    scans are trusted to be the same kind of array
+
+    Args:
+
+        scan_array: the scan
+        out: the array receiving the result, or None
+        dtype (numpy.dtype): dtype the scan and out must have
+
+    Raises:
+
+        TypeError: scan_array or out is not a numpy.ndarray of dtype
+        ValueError: scan_array is not a contiguous 1D vector or out is not
+        the same shape
+    """
+    for name, array in (("scan", scan_array), ("out", out)):
+        if array is None and name == "out":
+            continue
+        if not isinstance(array, np.ndarray) or array.dtype != dtype:
+            error_msg = name + " must be a numpy.ndarray of dtype "
+            error_msg += dtype.name + ", but given '" + str(type(array))
+            error_msg += "' of dtype " + str(getattr(array, "dtype", None))
+            raise TypeError(error_msg)
+    if scan_array.ndim != 1 or not scan_array.flags.c_contiguous:
+        error_msg = "scan must be a contiguous 1D vector"
+        raise ValueError(error_msg)
+    if out is not None and out.shape != scan_array.shape:
+        error_msg = "out must be the same shape as scan"
+        raise ValueError(error_msg)
+
+
+def _to_channels(scan, range_key):
+    """Splits a scan with auxiliary channels into its ranges and the other
+    channels, as 1D views of the given arrays where possible
+
+    Args:
+
+        scan (dict or numpy.ndarray): dict of equal length arrays or lists,
+        or a numpy structured array, one entry or field per channel
+        range_key (str): name of the channel holding the ranges
+
+    Raises:
+
+        TypeError: scan is the wrong type
+        ValueError: range_key is not a channel or the channels have
+        different numbers of elements
+
+    Returns:
+
+        ranges (numpy.ndarray): 1D vector of the ranges
+        channels (dict): 1D vector of each other channel
+    """
+    if isinstance(scan, dict):
+        items = [(name, np.asarray(values)) for name, values in scan.items()]
+    elif isinstance(scan, np.ndarray) and scan.dtype.names is not None:
+        items = [(name, scan[name]) for name in scan.dtype.names]
+    else:
+        error_msg = "scan wrong type, expected 'dict' or a structured "
+        error_msg += "'numpy.ndarray'"
+        raise TypeError(error_msg)
+
+    channels = dict((name, values.reshape(values.size))
+                    for name, values in items)
+    if range_key not in channels:
+        error_msg = "scan has no channel " + repr(range_key)
+        raise ValueError(error_msg)
+    ranges = channels.pop(range_key)
+    for values in channels.values():
+        if values.size != ranges.size:
+            error_msg = "every channel must have the same number of "
+            error_msg += "elements as " + repr(range_key)
+            raise ValueError(error_msg)
+    return ranges, channels
+
+
+def _invalid_returns(scan_array):
+    """Flags the measurements a driver reports for beams with no return:
+    NaN, plus or minus infinity and exactly zero
+
+    Args:
+
+        scan_array (numpy.ndarray): measurements
+
+    Returns:
+
+        invalid (numpy.ndarray): bool array, True for each invalid return
+    """
+    invalid = ~np.isfinite(scan_array)
+    invalid |= scan_array == 0
+    return invalid
+
+
+def _sorting_network(num_rows):
+    """Builds a Batcher odd-even merge sorting network for num_rows values
+
+    Args:
+
+        num_rows (int): number of values in each window
+
+    Returns:
+
+        network (list): (low, high) pairs of positions to compare and swap
+        so that the smaller value ends up at low
+    """
+    size = 1
+    while size < num_rows:
+        size *= 2
+
+    pairs = []
+    block = 1
+    while block < size:
+        step = block
+        while step >= 1:
+            start = step % block
+            while start < size - step:
+                for idx in range(min(step, size - start - step)):
+                    low = idx + start
+                    if low // (block * 2) == (low + step) // (block * 2):
+                        pairs.append((low, low + step))
+                start += 2 * step
+            step //= 2
+        block *= 2
+
+    # Positions past num_rows act as +inf and are never swapped down
+    return [pair for pair in pairs if pair[1] < num_rows]
+
+
+def _align(size):
+    """Rounds size up to a multiple of STATE_ALIGNMENT"""
+    return -(-size // STATE_ALIGNMENT) * STATE_ALIGNMENT
+
+
+def _write_state(path, kind, settings, arrays):
+    """Writes a filter state file. The file is written next to path and
+    then renamed, so an existing state is never left half overwritten
+
+    Args:
+
+        path (str): path of the state file
+        kind (str): class name of the filter
+        settings (dict): the filter's settings, as JSON types
+        arrays (list): (name, numpy.ndarray) pairs
+    """
+    import json
+    import zlib
+
+    layout = []
+    offset = 0
+    for idx, (name, array) in enumerate(arrays):
+        array = np.ascontiguousarray(array)
+        arrays[idx] = (name, array)
+        layout.append({"name": name, "dtype": array.dtype.str,
+                       "shape": list(array.shape), "offset": offset,
+                       "crc32": zlib.crc32(array.tobytes()) & 0xffffffff})
+        offset += _align(array.nbytes)
+    meta = json.dumps({"kind": kind, "settings": settings,
+                       "arrays": layout}).encode("utf-8")
+    data_start = _align(STATE_HEADER.size + len(meta))
+
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as state_file:
+        state_file.write(STATE_HEADER.pack(STATE_MAGIC, STATE_VERSION,
+                                           len(meta)))
+        state_file.write(meta)
+        for entry, (name, array) in zip(layout, arrays):
+            state_file.seek(data_start + entry["offset"])
+            state_file.write(array.tobytes())
+    getattr(os, "replace", os.rename)(temp_path, path)
+
+
+def _read_state(path, kind):
+    """Reads and checks a filter state file, memory mapping its arrays.
+    Each array is checked against its CRC-32, the settings are not covered
+    by a checksum and have to be checked by the filter loading them
+
+    Args:
+
+        path (str): path of the state file
+        kind (str): class name of the filter it must hold
+
+    Raises:
+
+        ValueError: not a state file of kind, an unsupported version, or
+        truncated or corrupt data
+
+    Returns:
+
+        settings (dict): the filter's settings
+        arrays (dict): read only numpy.ndarray of each name
+    """
+    import json
+    import zlib
+
+    with open(path, "rb") as state_file:
+        header = state_file.read(STATE_HEADER.size)
+        if len(header) < STATE_HEADER.size:
+            raise ValueError(path + " is not a filter state file")
+        magic, version, meta_size = STATE_HEADER.unpack(header)
+        if magic != STATE_MAGIC:
+            raise ValueError(path + " is not a filter state file")
+        elif version != STATE_VERSION:
+            error_msg = path + " has filter state version " + str(version)
+            error_msg += ", expected " + str(STATE_VERSION)
+            raise ValueError(error_msg)
+        try:
+            meta = json.loads(state_file.read(meta_size).decode("utf-8"))
+        except ValueError:
+            raise ValueError(path + " is not a filter state file")
+
+    if meta["kind"] != kind:
+        error_msg = path + " holds the state of a " + meta["kind"]
+        error_msg += ", not a " + kind
+        raise ValueError(error_msg)
+
+    data_start = _align(STATE_HEADER.size + meta_size)
+    file_size = os.path.getsize(path)
+    arrays = {}
+    for entry in meta["arrays"]:
+        dtype = np.dtype(entry["dtype"])
+        shape = tuple(entry["shape"])
+        start = data_start + entry["offset"]
+        nbytes = dtype.itemsize * int(np.prod(shape))
+        if nbytes == 0:
+            array = np.empty(shape, dtype=dtype)
+        elif start + nbytes > file_size:
+            raise ValueError(path + " is truncated")
+        else:
+            array = np.memmap(path, dtype=dtype, mode="r", offset=start,
+                              shape=shape)
+        if zlib.crc32(array.tobytes()) & 0xffffffff != entry["crc32"]:
+            raise ValueError(path + " is corrupt")
+        arrays[entry["name"]] = array
+    return meta["settings"], arrays
+
+
+def _check_state_settings(path, settings, expected):
+    """Checks that a state file was saved with the given settings
+
+    Args:
+
+        path (str): path of the state file
+        settings (dict): settings read from it
+        expected (dict): the settings the filter has
+
+    Raises:
+
+        ValueError: a setting differs
+    """
+    for name in sorted(expected):
+        if settings.get(name) != expected[name]:
+            error_msg = path + " was saved with " + name + " "
+            error_msg += str(settings.get(name)) + ", but the filter has "
+            error_msg += str(expected[name])
+            raise ValueError(error_msg)
+
+
+def _median_network(num_rows):
+    """Builds a sorting network for num_rows values, keeping only the
+    comparators the median positions depend on
+
+    Args:
+
+        num_rows (int): number of values in each window
+
+    Returns:
+
+        network (list): (low, high) pairs of positions to compare and swap
+        so that the smaller value ends up at low
+    """
+    pairs = _sorting_network(num_rows)
+
+    # Walk back from the median positions to drop unused comparators
+    needed = set([(num_rows - 1)//2, num_rows//2])
+    network = []
+    for low, high in reversed(pairs):
+        if low in needed or high in needed:
+            network.append((low, high))
+            needed.update((low, high))
+    network.reverse()
+    return network
+
+
+def _to_sensor_frame(scans):
+    """Converts one scan per sensor to a 2D numpy.ndarray with one sensor
+    per row. Scans with fewer measurements than the longest are padded
+    with zeros
+
+    Args:
+
+        scans (list or numpy.ndarray): S scans, either as an S x N array or
+        a list of S scans of possibly different lengths
+
+    Raises:
+
+        TypeError: scans is the wrong type
+        ValueError: scans is not one scan per sensor
+
+    Returns:
+
+        frame (numpy.ndarray): S x N array of scans, a view of scans if it
+        is already an S x N numpy.ndarray
+        beam_counts (list): number of measurements in each sensor's scan
+    """
+    if not isinstance(scans, (list, np.ndarray)):
+        error_msg = "scans wrong type, expected 'list' or 'numpy.ndarray'"
+        raise TypeError(error_msg)
+
+    if isinstance(scans, np.ndarray) and scans.dtype != object:
+        if scans.ndim != 2:
+            error_msg = "scans must be 2D with one scan per sensor, but given "
+            error_msg += str(scans.ndim) + "D"
+            raise ValueError(error_msg)
+        return scans, [scans.shape[1]] * scans.shape[0]
+
+    rows = []
+    for scan in scans:
+        if not isinstance(scan, (list, np.ndarray)):
+            error_msg = "scan wrong type, expected 'list' or 'numpy.ndarray'"
+            raise TypeError(error_msg)
+        scan_array = np.asarray(scan)
+        rows.append(scan_array.reshape(scan_array.size))
+
+    beam_counts = [row.size for row in rows]
+    frame = np.zeros((len(rows), max(beam_counts + [0])))
+    for idx, row in enumerate(rows):
+        frame[idx, :row.size] = row
+    return frame, beam_counts
+
+
+def _to_sensor_lists(frame, beam_counts):
+    """Converts an S x N array to a list with each sensor's scan as a list,
+    dropping the padding
+
+    Args:
+
+        frame (numpy.ndarray): S x N array with one sensor per row
+        beam_counts (list): number of measurements of each sensor
+
+    Returns:
+
+        scan_lists (list): S lists of measurements
+    """
+    return [row[:count].tolist() for row, count in zip(frame, beam_counts)]
+
+
+def _to_frame_block(scans):
+    """Converts frames of sensor scans to a 3D numpy.ndarray with one frame
+    per row
+
+    Args:
+
+        scans (list or numpy.ndarray): T frames of S scans of N measurements
+
+    Raises:
+
+        TypeError: scans is the wrong type
+        ValueError: scans is not 3D
+
+    Returns:
+
+        scan_block (numpy.ndarray): T x S x N array of frames
+    """
+    if not isinstance(scans, (list, np.ndarray)):
+        error_msg = "scans wrong type, expected 'list' or 'numpy.ndarray'"
+        raise TypeError(error_msg)
+
+    scan_block = np.asarray(scans)
+    if scan_block.ndim != 3:
+        error_msg = "scans must be 3D with one frame of scans per row, but "
+        error_msg += "given " + str(scan_block.ndim) + "D"
+        raise ValueError(error_msg)
+    return scan_block
+
+
+def filter_stream(stage, scans):
+    """Passes each scan from an iterable of scans through a filter, yielding
+    the filtered scans as they are produced
+
+    Args:
+
+        stage: any filter object with an update method, such as a
+        RangeFilter, TemporalMedianFilter or FilterPipeline
+        scans (iterable): scans as accepted by stage.update
+
+    Yields:
+
+        scan_list (list): each filtered scan, as returned by stage.update
+    """
+    for scan in scans:
+        yield stage.update(scan)
+
+
+class UpdateProfile:
+    """
+    The update_profile object
+
+    Holds the timings and counters a filter records while profiling is
+    enabled. The time each update spends in each stage goes into a
+    preallocated ring buffer that keeps the last capacity calls, so
+    recording never allocates. A call of update_batch is kept as one row
+    with only its total time. Counters cover every call since profiling
+    was enabled or reset.
+
+    Only the filter writes to the profile, without locks. A snapshot taken
+    from another thread while an update is recorded may miss or half
+    include that one call.
+
+    Attributes:
+
+        stages (tuple): names of the timed stages
+        counters (tuple): names of the counters
+        capacity (int): number of most recent calls whose timings are kept,
+        default value is 1024
+        callback: function called after each call with a dict holding the
+        seconds spent in each stage, "total" and the counter increments of
+        that call, default value is None
+    """
+    def __init__(self, stages, counters, capacity=1024, callback=None):
+        self.__stages = tuple(stages)
+        self.__counter_names = tuple(counters)
+        self.__capacity = capacity
+        self.__callback = callback
+        self.__check_args()
+        self.__durations = np.empty((capacity, len(self.__stages) + 1))
+        self.reset()
+
+    def __check_args(self):
+        """Checks capacity and callback
+
+        Raises:
+
+            TypeError: Invalid type
+            ValueError: Invalid value
+        """
+        if not isinstance(self.__capacity, int) or \
+                isinstance(self.__capacity, bool):
+            error_msg = "capacity must of type 'int', but given '"
+            error_msg += str(type(self.__capacity)) + "'"
+            raise TypeError(error_msg)
+        elif self.__capacity < 1:
+            error_msg = "capacity must be greater than or equal to one"
+            raise ValueError(error_msg)
+
+        if self.__callback is not None and not callable(self.__callback):
+            error_msg = "callback must be callable, but given '"
+            error_msg += str(type(self.__callback)) + "'"
+            raise TypeError(error_msg)
+
+    def reset(self):
+        """Clears the timings and counters"""
+        self.__calls = 0
+        self.__counts = [0] * len(self.__counter_names)
+
+    def _record(self, times, counts):
+        """Records one call
+
+        Args:
+
+            times (list): timer readings at the start of the call and at the
+            end of each stage, or only at the start and end of the call
+            counts (tuple): increment of each counter
+        """
+        row = self.__durations[self.__calls % self.__capacity]
+        num_stages = len(self.__stages)
+        if len(times) == num_stages + 1:
+            for idx in range(num_stages):
+                row[idx] = times[idx + 1] - times[idx]
+        else:
+            row[:num_stages] = np.nan
+        row[num_stages] = times[-1] - times[0]
+        for idx in range(len(counts)):
+            self.__counts[idx] += counts[idx]
+        self.__calls += 1
+
+        if self.__callback is not None:
+            sample = dict(zip(self.__stages + ("total",), row.tolist()))
+            sample.update(zip(self.__counter_names, counts))
+            self.__callback(sample)
+
+    def export(self):
+        """Gives the raw timings of the calls held and the counters
+
+        Returns:
+
+            profile (dict): "stages" names the columns of "durations", a
+            calls x (stages + 1) array of seconds, oldest call first, whose
+            last column is the total. "calls" is the number of calls
+            recorded and "counters" maps each counter to its value
+        """
+        calls = self.__calls
+        counts = list(self.__counts)
+        num_held = min(calls, self.__capacity)
+        rows = np.arange(calls - num_held, calls) % self.__capacity
+        return {"stages": list(self.__stages) + ["total"],
+                "durations": self.__durations[rows],
+                "calls": calls,
+                "counters": dict(zip(self.__counter_names, counts))}
+
+    def snapshot(self):
+        """Summarizes the timings of the calls held
+
+        Returns:
+
+            summary (dict): "calls" and "counters" as from export, and
+            "stages" mapping each stage and "total" to the number of timed
+            calls and the "mean", "p50", "p99" and "max" seconds spent in it
+        """
+        profile = self.export()
+        summary = {"calls": profile["calls"],
+                   "counters": profile["counters"],
+                   "stages": {}}
+        for name, column in zip(profile["stages"], profile["durations"].T):
+            column = column[~np.isnan(column)]
+            stats = {"calls": column.size}
+            if column.size:
+                stats["mean"] = float(column.mean())
+                stats["p50"] = float(np.percentile(column, 50))
+                stats["p99"] = float(np.percentile(column, 99))
+                stats["max"] = float(column.max())
+            summary["stages"][name] = stats
+        return summary
+
+
+class RangeFilter:
+    """
+    The range_filter object
+
+    Attributes:
+
+        min_range (int): used to determine if a measurement is below this value,
+        default value is set to 0.03
+        max_range (int): used to determine if a measurement is above this value,
+        default value is set to 50.0
+        dtype (numpy.dtype): dtype of the results, float64, float32 or
+        float16, default value is float64
+        mask_invalid (bool): give NaN for invalid returns (NaN, inf and 0)
+        rather than clamping them, default value is False
+    """
+    def __init__(self,min_range=0.03,max_range=50.0,dtype=np.float64,
+                 mask_invalid=False):
+        self.__min_range = min_range
+        self.__max_range = max_range
+        self.__mask_invalid = mask_invalid
+        self.__check_args()
+        self.__dtype = _check_dtype(dtype, FLOAT_DTYPES)
+        self.__profile = None
+        self.__trusted = False
+
+    def __check_args(self):
+        self.__check_args_type()
+        self.__check_args_val()
+
+    def __check_args_type(self):
+        """Checks that min_range and max_range are int or float types
+
+        Raises:
+
+            TypeError: Invalid type
+        """
+        if not isinstance(self.__min_range, (float, int)):
+            error_msg = "min_range must of type int or float, but given: "
+            error_msg += str(type(self.__min_range))
+            raise TypeError(error_msg)
+        elif not isinstance(self.__max_range, (float, int)):
+            error_msg = "max_range must of type int or float, but given: "
+            error_msg += str(type(self.__max_range))
+            raise TypeError(error_msg)
+
+        if isinstance(self.__min_range, bool):
+            error_msg = "min_range must of type int or float, but given: "
+            error_msg += str(type(self.__min_range))
+            raise TypeError(error_msg)
+        elif isinstance(self.__max_range, bool):
+            error_msg = "max_range must of type int or float, but given: "
+            error_msg += str(type(self.__max_range))
+            raise TypeError(error_msg)
+
+        if not isinstance(self.__mask_invalid, bool):
+            error_msg = "mask_invalid must of type 'bool', but given '"
+            error_msg += str(type(self.__mask_invalid)) + "'"
+            raise TypeError(error_msg)
+
+    def __check_args_val(self):
+        """Checks that min_range and max_range are valid and logical values
+
+        Raises:
+
+            ValueError: Invalid value
+        """
+        if self.__min_range < 0:
+            error_msg = "min_range must be greater than or equal to zero"
+            raise ValueError(error_msg)
+        elif self.__max_range < 0:
+            error_msg = "max_range must be greater than or equal to zero"
+            raise ValueError(error_msg)
+        elif self.__max_range < self.__min_range:
+            error_msg = "max_range must be greater than or equal to min_range"
+            raise ValueError(error_msg)
+
+    def change_min_range(self, min_range):
+        """Changes min_range, checked as in the constructor
+
+        Raises:
+
+            TypeError: Invalid type
+            ValueError: Invalid value, min_range is then left unchanged
+        """
+        self.change_range(min_range, self.__max_range)
+
+    def change_max_range(self, max_range):
+        """Changes max_range, checked as in the constructor
+
+        Raises:
+
+            TypeError: Invalid type
+            ValueError: Invalid value, max_range is then left unchanged
+        """
+        self.change_range(self.__min_range, max_range)
+
+    def change_range(self, min_range, max_range):
+        """Changes min_range and max_range together, so that limits can move
+        past each other. Both are checked before either is changed, and the
+        next update uses the new limits
+
+        Raises:
+
+            TypeError: Invalid type
+            ValueError: Invalid value, the limits are then left unchanged
+        """
+        old_range = (self.__min_range, self.__max_range)
+        self.__min_range = min_range
+        self.__max_range = max_range
+        try:
+            self.__check_args()
+        except (TypeError, ValueError):
+            self.__min_range, self.__max_range = old_range
+            raise
+
+    def __clip(self, scan_array, out):
+        """Clamps the measurements into out, then marks invalid returns as
+        NaN if mask_invalid is set
+
+        Args:
+
+            scan_array (numpy.ndarray): measurements, may be out itself
+            out (numpy.ndarray): array of the same shape as scan_array
+        """
+        # np.maximum then np.minimum gives the same result as np.clip, but
+        # without np.clip's overhead for scalar limits
+        if not self.__mask_invalid:
+            np.maximum(scan_array, self.__min_range, out=out)
+            np.minimum(out, self.__max_range, out=out)
+            return
+
+        invalid = _invalid_returns(scan_array)
+        np.maximum(scan_array, self.__min_range, out=out)
+        np.minimum(out, self.__max_range, out=out)
+        out[invalid] = np.nan
+
+    def __count(self, scan_block):
+        """Counts the measurements update will clamp, for profiling
+
+        Args:
+
+            scan_block (numpy.ndarray): T x N block of scans
+
+        Returns:
+
+            counts (tuple): increments of RANGE_FILTER_COUNTERS
+        """
+        below = scan_block < self.__min_range
+        above = scan_block > self.__max_range
+        invalid = 0
+        if self.__mask_invalid:
+            invalid_returns = _invalid_returns(scan_block)
+            below &= ~invalid_returns
+            above &= ~invalid_returns
+            invalid = int(np.count_nonzero(invalid_returns))
+        return (scan_block.shape[0], scan_block.size,
+                int(np.count_nonzero(below)), int(np.count_nonzero(above)),
+                invalid)
+
+    def enable_profiling(self, capacity=1024, callback=None):
+        """Starts recording the time each update spends in each of
+        RANGE_FILTER_STAGES and the RANGE_FILTER_COUNTERS. The "count"
+        stage only runs while profiling
+
+        Args:
+
+            capacity (int): number of most recent calls whose timings are
+            kept, default value is 1024
+            callback: function called after each call with its timings and
+            counter increments, default value is None
+
+        Raises:
+
+            TypeError: Invalid type
+            ValueError: Invalid value
+
+        Returns:
+
+            profile (UpdateProfile): the profile the calls are recorded in
+        """
+        self.__profile = UpdateProfile(RANGE_FILTER_STAGES,
+                                       RANGE_FILTER_COUNTERS, capacity,
+                                       callback)
+        return self.__profile
+
+    def disable_profiling(self):
+        """Stops recording, updates are then not timed at all"""
+        self.__profile = None
+
+    def profile(self):
+        """Gives the profile being recorded
+
+        Returns:
+
+            profile (UpdateProfile): the profile, None if profiling is
+            disabled
+        """
+        return self.__profile
+
+    def save_state(self, path):
+        """Writes min_range and max_range to a state file
+
+        Args:
+
+            path (str): path of the state file, replaced if it exists
+        """
+        settings = {"min_range": self.__min_range,
+                    "max_range": self.__max_range,
+                    "dtype": self.__dtype.name,
+                    "mask_invalid": self.__mask_invalid}
+        _write_state(path, "RangeFilter", settings, [])
+
+    def load_state(self, path):
+        """Restores min_range and max_range from a state file written by
+        save_state. The checksums of a state file cover its arrays only, so
+        the limits are checked as in change_range
+
+        Args:
+
+            path (str): path of the state file
+
+        Raises:
+
+            ValueError: not the state of a RangeFilter, an unsupported
+            version, saved with another dtype or mask_invalid, or limits
+            change_range rejects. The limits are then left unchanged
+        """
+        settings = _read_state(path, "RangeFilter")[0]
+        _check_state_settings(path, settings, {
+            "dtype": self.__dtype.name, "mask_invalid": self.__mask_invalid})
+        try:
+            self.change_range(settings["min_range"], settings["max_range"])
+        except (TypeError, ValueError) as error:
+            raise ValueError(path + " holds invalid limits: " + str(error))
+
+    def _output_dtype(self):
+        """Gives the dtype of the results of update, so that a FilterPipeline
+        passes them to the next stage without converting them
+
+        Returns:
+
+            dtype (numpy.dtype): dtype of the results
+        """
+        return self.__dtype
+
+    def update(self, scan, out=None):
+        """Replaces measurements in scan by min_range or max_range if
+        measurement below or above them respectively. With mask_invalid,
+        invalid returns are replaced by NaN instead
+
+        By default scan is left untouched and a new list is returned. If out
+        is given the result is written into it and out itself is returned,
+        so no list is built. Passing the scan as out filters it in place.
+
+        Args:
+
+            scan (list or numpy.ndarray): list or numpy.ndarray of values
+            out (numpy.ndarray): optional array with the same number of
+            elements as scan that receives the result, default value is None
+
+        Raises:
+
+            TypeError: scan or out is the wrong type
+            ValueError: out does not have the same number of elements as scan
+
+        Returns:
+
+            scan_list (list): a list of updated measurements, or out if given
+        """
+
+        profile = self.__profile
+        if profile is not None:
+            times = [default_timer()]
+
+        # Convert the data to an numpy.ndarray and reszie to ensure it
+        # is a 1D vector, without reshaping the caller's array
+        if not isinstance(scan, (list, np.ndarray)):
+            error_msg = "Arg wrong type, expected 'list' or 'numpy.ndarray'"
+            raise TypeError(error_msg)
+        else:
+            scan_array = np.asarray(scan)
+            element_count = scan_array.size
+            scan_array = scan_array.reshape(element_count)
+
+        if out is None:
+            result = np.empty(element_count, dtype=self.__dtype)
+        elif not isinstance(out, np.ndarray):
+            error_msg = "out wrong type, expected 'numpy.ndarray'"
+            raise TypeError(error_msg)
+        elif out.size != element_count:
+            error_msg = "out must have the same number of elements as scan"
+            raise ValueError(error_msg)
+        else:
+            result = out
+            scan_array = scan_array.reshape(out.shape)
+
+        if profile is not None:
+            times.append(default_timer())
+            counts = self.__count(scan_array.reshape(1, element_count))
+            times.append(default_timer())
+
+        self.__clip(scan_array, result)
+        if profile is not None:
+            times.append(default_timer())
+
+        if out is None:
+            result = result.tolist()
+        if profile is not None:
+            times.append(default_timer())
+            profile._record(times, counts)
+        return result
+
+    def update_unchecked(self, scan_array, out=None):
+        """Fast path of update for trusted input. Only the first call checks
+        its arguments, later calls are trusted to pass the same kind of
+        arrays and go straight to the clamp, without conversion, reshaping
+        or profiling
+
+        Args:
+
+            scan_array (numpy.ndarray): contiguous 1D vector of measurements
+            in dtype
+            out (numpy.ndarray): optional array of the same shape and dtype
+            that receives the result, may be scan_array itself, default
+            value is None
+
+        Raises:
+
+            TypeError: on the first call, scan_array or out is not a
+            numpy.ndarray of dtype
+            ValueError: on the first call, scan_array is not a contiguous 1D
+            vector or out is not the same shape
+
+        Returns:
+
+            result (numpy.ndarray): the updated measurements, out if given
+        """
+        if not self.__trusted:
+            _check_trusted_scan(scan_array, out, self.__dtype)
+            self.__trusted = True
+        if out is None:
+            out = np.empty_like(scan_array)
+        self.__clip(scan_array, out)
+        return out
+
+    def update_channels(self, scan, range_key="range"):
+        """Applies update to the ranges of a scan that also carries other
+        channels, such as intensity, ring index or per beam timestamps
+
+        Args:
+
+            scan (dict or numpy.ndarray): dict of equal length arrays or
+            lists, or a numpy structured array, one entry or field per
+            channel
+            range_key (str): name of the channel holding the ranges, default
+            value is "range"
+
+        Raises:
+
+            TypeError: scan is the wrong type
+            ValueError: range_key is not a channel, the channels have
+            different numbers of elements, or a channel is named "clamped"
+
+        Returns:
+
+            channels (dict): the updated ranges under range_key, "clamped", a
+            bool vector that is True for each range replaced by min_range or
+            max_range, and the other channels as 1D views of those given
+        """
+        ranges, channels = _to_channels(scan, range_key)
+        if range_key == "clamped" or "clamped" in channels:
+            error_msg = "scan must not have a channel named 'clamped'"
+            raise ValueError(error_msg)
+        result = np.empty(ranges.size, dtype=self.__dtype)
+        self.update(ranges, out=result)
+
+        clamped = ranges < self.__min_range
+        clamped |= ranges > self.__max_range
+        if self.__mask_invalid:
+            clamped &= ~_invalid_returns(ranges)
+        channels[range_key] = result
+        channels["clamped"] = clamped
+        return channels
+
+    def update_batch(self, scans, out=None):
+        """Applies update to every scan in a block of scans in one call
+
+        Args:
+
+            scans (list or numpy.ndarray): T x N block with one scan per row
+            out (numpy.ndarray): optional T x N array that receives the
+            result, passing scans filters them in place, default value is None
+
+        Raises:
+
+            TypeError: scans or out is the wrong type
+            ValueError: scans is not 2D or out is not the same shape as scans
+
+        Returns:
+
+            scan_block (numpy.ndarray): T x N array of updated measurements,
+            out if given
+        """
+        profile = self.__profile
+        if profile is not None:
+            start = default_timer()
+
+        scan_block = _to_scan_block(scans)
+        if out is None:
+            out = np.empty(scan_block.shape, dtype=self.__dtype)
+        elif not isinstance(out, np.ndarray):
+            error_msg = "out wrong type, expected 'numpy.ndarray'"
+            raise TypeError(error_msg)
+        elif out.shape != scan_block.shape:
+            error_msg = "out must be the same shape as scans"
+            raise ValueError(error_msg)
+
+        if profile is not None:
+            counts = self.__count(scan_block)
+        self.__clip(scan_block, out)
+        if profile is not None:
+            profile._record([start, default_timer()], counts)
+        return out
+
+class _HistogramWindow:
+    """
+    Counts of the measurements in each beam's window over bins of
+    bin_width, for the histogram engine of a TemporalMedianFilter
+
+    Inserting and evicting a measurement changes one bin count and one
+    block total per beam. The median is the centre of the bin holding the
+    middle measurement, found by running through the block totals and then
+    through the bins of one block. Counts are kept one bin per row so that
+    each step is a vector operation over all beams. Measurements below zero
+    fall in the first bin, measurements past num_bins * bin_width in the
+    last one and NaN in a bin of its own that sorts last.
+
+    Attributes:
+
+        num_rows (int): number of scans in a full window
+        bin_width (float): width of each bin
+        num_bins (int): number of bins
+    """
+    def __init__(self, num_rows, bin_width, num_bins):
+        self.__num_rows = num_rows
+        self.__bin_width = float(bin_width)
+        self.__num_bins = num_bins
+
+        # One bin past num_bins for NaN, rounded up to whole blocks
+        self.__num_blocks = -(-(num_bins + 1) // HISTOGRAM_BLOCK_BINS)
+        padded_bins = self.__num_blocks * HISTOGRAM_BLOCK_BINS
+        self.__nan_bin = padded_bins - 1
+        self.__centres = (np.arange(padded_bins) + 0.5) * self.__bin_width
+        self.__centres[num_bins:] = np.nan
+
+        self.__count_dtype = self.__counts_dtype(num_rows)
+        self.__allocate(0)
+
+    def __counts_dtype(self, num_rows):
+        """Gives the smallest unsigned dtype that counts up to num_rows"""
+        if num_rows <= np.iinfo(np.uint8).max:
+            return np.dtype(np.uint8)
+        elif num_rows <= np.iinfo(np.uint16).max:
+            return np.dtype(np.uint16)
+        return np.dtype(np.uint32)
+
+    def __allocate(self, num_points):
+        """Allocates empty counts and history for scans of num_points
+        measurements
+
+        Args:
+
+            num_points (int): number of measurements in each scan
+        """
+        padded_bins = self.__num_blocks * HISTOGRAM_BLOCK_BINS
+        self.__N = num_points
+        self.__counts = np.zeros(padded_bins * num_points,
+                                 dtype=self.__count_dtype)
+        self.__block_counts = np.zeros(self.__num_blocks * num_points,
+                                       dtype=self.__count_dtype)
+        self.__history = np.empty((self.__num_rows, num_points),
+                                  dtype=np.intp)
+        self.__columns = np.arange(num_points, dtype=np.intp)
+        self.__block_rows = np.arange(HISTOGRAM_BLOCK_BINS)[:, None]
+        self.__block_rows = self.__block_rows * num_points
+        self.__block_totals = np.zeros((self.__num_blocks + 1, num_points),
+                                       dtype=np.int32)
+        self.__bin_totals = np.zeros((HISTOGRAM_BLOCK_BINS + 1, num_points),
+                                     dtype=np.int32)
+        self.__head = 0
+        self.__num_scans = 0
+
+    def reset(self, num_points):
+        """Empties the window for scans of num_points measurements. The
+        counts are reused if already that size
+
+        Args:
+
+            num_points (int): number of measurements in each scan
+        """
+        if self.__N != num_points:
+            self.__allocate(num_points)
+            return
+
+        # Evicting the held scans is cheaper than clearing every bin
+        for idx in range(self.__num_scans):
+            self.__count(self.__history[idx], False)
+        self.__head = 0
+        self.__num_scans = 0
+
+    def __to_bins(self, scan_array):
+        """Gives the bin of each measurement
+
+        Returns:
+
+            bins (numpy.ndarray): bin index of each measurement
+        """
+        bins = np.floor(np.asarray(scan_array, dtype=float) / self.__bin_width)
+        np.clip(bins, 0, self.__num_bins - 1, out=bins)
+        bins[np.isnan(bins)] = self.__nan_bin
+        return bins.astype(np.intp)
+
+    def __count(self, bins, add):
+        """Adds or removes one measurement per beam from the counts
+
+        Args:
+
+            bins (numpy.ndarray): bin of each beam's measurement
+            add (bool): True to add the measurements, False to remove them
+        """
+        bin_index = bins * self.__N + self.__columns
+        block_index = bins // HISTOGRAM_BLOCK_BINS * self.__N + self.__columns
+        if add:
+            self.__counts[bin_index] += 1
+            self.__block_counts[block_index] += 1
+        else:
+            self.__counts[bin_index] -= 1
+            self.__block_counts[block_index] -= 1
+
+    def insert(self, scan_array):
+        """Adds a scan to the window, evicting the oldest scan once the
+        window is full
+
+        Args:
+
+            scan_array (numpy.ndarray): 1D vector of N measurements
+
+        Returns:
+
+            num_scans (int): number of scans in the window after the insert
+        """
+        return self.__insert_bins(self.__to_bins(scan_array))
+
+    def __insert_bins(self, bins):
+        """Adds the bins of a scan to the window, evicting the oldest scan
+        once the window is full
+
+        Args:
+
+            bins (numpy.ndarray): bin index of each measurement
+
+        Returns:
+
+            num_scans (int): number of scans in the window after the insert
+        """
+        if self.__num_scans == self.__num_rows:
+            # The oldest scan is in the row the new scan is written to
+            self.__count(self.__history[self.__head], False)
+        else:
+            self.__num_scans += 1
+        self.__count(bins, True)
+        self.__history[self.__head] = bins
+        self.__head = (self.__head + 1) % self.__num_rows
+        return self.__num_scans
+
+    def rows(self):
+        """Gives the rows of the window the scans held are kept in
+
+        Returns:
+
+            rows (numpy.ndarray): row of each scan held, oldest scan first
+        """
+        rows = np.arange(self.__head - self.__num_scans, self.__head)
+        return rows % self.__num_rows
+
+    def window(self):
+        """Gives the bins of the scans held
+
+        Returns:
+
+            bins (numpy.ndarray): num_scans x N array of bin indices, oldest
+            scan first
+        """
+        return self.__history.take(self.rows(), axis=0)
+
+    def centres(self, rows):
+        """Gives the centres of the bins of the scans held in rows
+
+        Args:
+
+            rows (numpy.ndarray): rows of the window
+
+        Returns:
+
+            centres (numpy.ndarray): float64 array with one row per row
+            given, NaN for NaN measurements
+        """
+        return self.__centres[self.__history.take(rows, axis=0)]
+
+    def resize(self, num_rows):
+        """Changes the number of scans in a full window, evicting the oldest
+        scans held that no longer fit. The counts are kept
+
+        Args:
+
+            num_rows (int): number of scans in a full window
+        """
+        bins = self.window()
+        num_drop = max(0, bins.shape[0] - num_rows)
+        for row in bins[:num_drop]:
+            self.__count(row, False)
+        bins = bins[num_drop:]
+
+        count_dtype = self.__counts_dtype(num_rows)
+        if count_dtype.itemsize > self.__count_dtype.itemsize:
+            self.__count_dtype = count_dtype
+            self.__counts = self.__counts.astype(count_dtype)
+            self.__block_counts = self.__block_counts.astype(count_dtype)
+
+        if self.__history.shape[0] < num_rows:
+            self.__history = np.empty((num_rows, self.__N), dtype=np.intp)
+        else:
+            self.__history = self.__history[:num_rows]
+        self.__history[:bins.shape[0]] = bins
+        self.__num_rows = num_rows
+        self.__num_scans = bins.shape[0]
+        self.__head = self.__num_scans % num_rows
+
+    def load(self, bins):
+        """Replaces the scans held by the bins of up to num_rows scans
+
+        Args:
+
+            bins (numpy.ndarray): T x N array of bin indices, oldest scan
+            first
+
+        Raises:
+
+            ValueError: more scans than a window holds or a bin index out
+            of range
+        """
+        num_bins = self.__num_blocks * HISTOGRAM_BLOCK_BINS
+        if bins.shape[0] > self.__num_rows:
+            raise ValueError("more scans than the window holds")
+        elif bins.size and (bins.min() < 0 or bins.max() >= num_bins):
+            raise ValueError("bin index out of range")
+        self.reset(bins.shape[1])
+        for row in bins:
+            self.__insert_bins(row.astype(np.intp))
+
+    def __walk(self, rows, rank, totals):
+        """Finds for each beam the row of counts holding its rank-th
+        smallest measurement
+
+        Args:
+
+            rows (numpy.ndarray): counts with one row per bin or block
+            rank (int or numpy.ndarray): zero based rank for all beams or
+            for each beam
+            totals (numpy.ndarray): buffer with one more row than rows, its
+            first row all zero
+
+        Returns:
+
+            found (numpy.ndarray): row index for each beam
+            before (numpy.ndarray): number of measurements in the rows
+            before it
+        """
+        # Running totals row by row, a cumulative sum along the short
+        # axis is several times slower
+        for idx in range(rows.shape[0]):
+            np.add(totals[idx], rows[idx], out=totals[idx + 1])
+        found = np.count_nonzero(totals[1:] <= rank, axis=0)
+        return found, totals[found, self.__columns]
+
+    def __select(self, rank):
+        """Finds the bin holding the rank-th smallest measurement of each
+        beam
+
+        Args:
+
+            rank (int): zero based rank within the window
+
+        Returns:
+
+            bins (numpy.ndarray): bin index for each beam
+        """
+        block_counts = self.__block_counts.reshape(self.__num_blocks, self.__N)
+        blocks, before = self.__walk(block_counts, rank, self.__block_totals)
+        first_bins = blocks * HISTOGRAM_BLOCK_BINS
+        bin_index = self.__block_rows + (first_bins * self.__N +
+                                         self.__columns)
+        offsets, before = self.__walk(self.__counts[bin_index], rank - before,
+                                      self.__bin_totals)
+        return first_bins + offsets
+
+    def median(self, num_scans, skip_nan=False):
+        """Determines each beam's median from the bin centres
+
+        Args:
+
+            num_scans (int): number of scans in the window
+            skip_nan (bool): determine each beam's median over its
+            measurements that are not NaN, default value is False
+
+        Returns:
+
+            median_val (numpy.ndarray): float64 median of each beam, with
+            skip_nan NaN for beams without any measurement that is not NaN
+        """
+        if skip_nan:
+            nan_counts = self.__counts[self.__nan_bin * self.__N:]
+            num_valid = num_scans - nan_counts.astype(np.intp)
+            median_val_1 = self.__centres[self.__select((num_valid - 1)//2)]
+            median_val_2 = self.__centres[self.__select(num_valid//2)]
+            median_val = (median_val_1 + median_val_2) / 2.0
+            median_val[num_valid == 0] = np.nan
+            return median_val
+
+        if num_scans%2:
+            return self.__centres[self.__select((num_scans + 1)//2 - 1)]
+        median_val_1 = self.__centres[self.__select(num_scans//2 - 1)]
+        median_val_2 = self.__centres[self.__select((num_scans + 2)//2 - 1)]
+        return (median_val_1 + median_val_2) / 2.0
+
+
+class TemporalMedianFilter:
+    """
+    The temporal_median_filter object
+
+    The current scan and the num_prev_scans most recent scans are held in a
+    preallocated circular history of shape (num_prev_scans + 2, N), the
+    spare row is where the next scan is written before the oldest scan is
+    evicted. A (num_prev_scans + 1, N) buffer keeps each beam's window
+    sorted, so every update is a single insertion and eviction per beam
+    rather than a full sort.
+
+    The history, ordered window and results are kept in dtype. With uint16
+    the history holds each measurement rounded to whole millimetres, scans
+    are still given in metres and the results are float32 metres.
+
+    With engine "histogram" each beam's window is instead kept as counts
+    over num_bins bins of bin_width, starting at zero. An update then costs
+    the same for any num_prev_scans, and each median is the centre of the
+    bin holding the exact median, so it is within bin_width of the exact
+    result for measurements between 0 and num_bins * bin_width. Outside
+    that range measurements saturate at the first or last bin.
+
+    With mask_invalid, NaN, inf and 0 are treated as beams without a
+    return. A bool mask of the valid returns is kept alongside the history
+    and each beam's median is taken over the valid returns in its window
+    only, NaN if there are none.
+
+    Attributes:
+        num_prev_scans (int): used to store that many previous scans, default
+        value is 3
+        dtype (numpy.dtype): dtype of the history and results, float64,
+        float32, float16 or uint16, default value is float64
+        engine (str): "exact" or "histogram", default value is "exact"
+        bin_width (int or float): bin width of the histogram engine, default
+        value is 0.05
+        num_bins (int): number of bins of the histogram engine, default value
+        is 1024
+        mask_invalid (bool): take medians over valid returns only, default
+        value is False
+        motion_threshold (int or float): adapt each beam's window to motion,
+        shrinking it when a measurement is further than this from the
+        beam's last median, default value is None for a fixed window
+        min_prev_scans (int): number of previous scans a shrunk window
+        keeps, default value is 2
+    """
+    def __init__(self, num_prev_scans=3, dtype=np.float64, engine="exact",
+                 bin_width=0.05, num_bins=1024, mask_invalid=False,
+                 motion_threshold=None, min_prev_scans=2):
+        self.__N = 0;   # num of data points in scan
+        self.__num_prev_scans = num_prev_scans
+        self.__engine = engine
+        self.__bin_width = bin_width
+        self.__num_bins = num_bins
+        self.__mask_invalid = mask_invalid
+        self.__motion_threshold = motion_threshold
+        self.__min_prev_scans = min_prev_scans
+        self.__check_args()
+        self.__dtype = _check_dtype(dtype, FLOAT_DTYPES + (FIXED_POINT_DTYPE,))
+        self.__fixed_point = self.__dtype == FIXED_POINT_DTYPE
+        self.__result_dtype = _result_dtype(self.__dtype)
+
+        # NaN is stored as 0 in a uint16 history, as the largest value when
+        # it marks an invalid return so that it sorts last
+        self.__fixed_point_nan = 0
+        if mask_invalid:
+            self.__fixed_point_nan = np.iinfo(FIXED_POINT_DTYPE).max
+
+        # Marks the scans dropped from a window shrunk by motion, it sorts
+        # after every measurement
+        self.__marker = np.nan
+        if self.__fixed_point:
+            self.__marker = np.iinfo(FIXED_POINT_DTYPE).max
+        self.__profile = None
+        self.__trusted = False
+        self.__channels = {}    # auxiliary channels of each history row
+        self.__num_channel_scans = 0    # most recent scans with channels
+        self.__num_shrinks = 0
+        self.__partial = False  # some beams joined after the held scans
+        self.__histogram = None
+        if self.__engine == "histogram":
+            self.__histogram = _HistogramWindow(num_prev_scans + 1,
+                                                bin_width, num_bins)
+        self.__num_scans = 0    # num of scans currently in the window
+        self.__head = 0         # history row the next scan is written to
+        self.__buffers = None
+        self.__history = np.empty((0, 0))
+        self.__network = []
+        self.__sort_network = []
+        self.__network_rows = 0
+        self.__allocate(0)
+
+    def __check_args(self):
+        """Checks that num_prev_scans is the correct data type and value
+        """
+        self.__check_args_type()
+        self.__check_args_val()
+
+    def __check_args_type(self):
+        """Checks that num_prev_scans and num_bins are int, engine is str,
+        bin_width is int or float and mask_invalid is bool
+
+        Raises:
+            TypeError: Invalid type
+        """
+        if not isinstance(self.__num_prev_scans, int):
+            error_msg = "num_prev_scans must of type 'int', but given '"
+            error_msg += str(type(self.__num_prev_scans))+ "'"
+            raise TypeError(error_msg)
+
+        if isinstance(self.__num_prev_scans, bool):
+            error_msg = "num_prev_scans must of type 'int', but given '"
+            error_msg += str(type(self.__num_prev_scans))+ "'"
+            raise TypeError(error_msg)
+
+        if not isinstance(self.__engine, str):
+            error_msg = "engine must of type 'str', but given '"
+            error_msg += str(type(self.__engine))+ "'"
+            raise TypeError(error_msg)
+
+        if not isinstance(self.__bin_width, (float, int)) or \
+                isinstance(self.__bin_width, bool):
+            error_msg = "bin_width must of type int or float, but given: "
+            error_msg += str(type(self.__bin_width))
+            raise TypeError(error_msg)
+
+        if not isinstance(self.__num_bins, int) or \
+                isinstance(self.__num_bins, bool):
+            error_msg = "num_bins must of type 'int', but given '"
+            error_msg += str(type(self.__num_bins))+ "'"
+            raise TypeError(error_msg)
+
+        if not isinstance(self.__mask_invalid, bool):
+            error_msg = "mask_invalid must of type 'bool', but given '"
+            error_msg += str(type(self.__mask_invalid))+ "'"
+            raise TypeError(error_msg)
+
+        if self.__motion_threshold is not None and \
+                (not isinstance(self.__motion_threshold, (float, int)) or
+                 isinstance(self.__motion_threshold, bool)):
+            error_msg = "motion_threshold must of type int or float, but "
+            error_msg += "given: " + str(type(self.__motion_threshold))
+            raise TypeError(error_msg)
+
+        if not isinstance(self.__min_prev_scans, int) or \
+                isinstance(self.__min_prev_scans, bool):
+            error_msg = "min_prev_scans must of type 'int', but given '"
+            error_msg += str(type(self.__min_prev_scans))+ "'"
+            raise TypeError(error_msg)
+
+    def __check_args_val(self):
+        """Checks that num_prev_scans is positive, engine is known and the
+        histogram has bins of positive width
+
+        Raises:
+
+            ValueError: Invalid value
+        """
+        if self.__num_prev_scans < 0:
+            error_msg = "num_prev_scans must be greater than or equal to zero"
+            raise ValueError(error_msg)
+
+        if self.__engine not in MEDIAN_ENGINES:
+            error_msg = "engine must be one of " + ", ".join(MEDIAN_ENGINES)
+            error_msg += ", but given: " + self.__engine
+            raise ValueError(error_msg)
+
+        if not self.__bin_width > 0:
+            error_msg = "bin_width must be greater than zero"
+            raise ValueError(error_msg)
+
+        if self.__num_bins < 1:
+            error_msg = "num_bins must be greater than or equal to one"
+            raise ValueError(error_msg)
+
+        if self.__motion_threshold is not None:
+            if self.__motion_threshold < 0:
+                error_msg = "motion_threshold must be greater than or equal "
+                error_msg += "to zero"
+                raise ValueError(error_msg)
+            elif self.__engine != "exact":
+                error_msg = "motion_threshold needs engine exact"
+                raise ValueError(error_msg)
+
+        if self.__min_prev_scans < 0:
+            error_msg = "min_prev_scans must be greater than or equal to zero"
+            raise ValueError(error_msg)
+
+    def error_bound(self):
+        """Gives the largest difference between the results of this filter
+        and of the exact engine, for measurements inside the histogram's
+        range
+
+        Returns:
+
+            bound (float): bin_width for the histogram engine, else 0.0
+        """
+        if self.__histogram is None:
+            return 0.0
+        return float(self.__bin_width)
+
+    def enable_profiling(self, capacity=1024, callback=None):
+        """Starts recording the time each update spends in each of
+        TEMPORAL_MEDIAN_STAGES and the TEMPORAL_MEDIAN_COUNTERS
+
+        Args:
+
+            capacity (int): number of most recent calls whose timings are
+            kept, default value is 1024
+            callback: function called after each call with its timings and
+            counter increments, default value is None
+
+        Raises:
+
+            TypeError: Invalid type
+            ValueError: Invalid value
+
+        Returns:
+
+            profile (UpdateProfile): the profile the calls are recorded in
+        """
+        self.__profile = UpdateProfile(TEMPORAL_MEDIAN_STAGES,
+                                       TEMPORAL_MEDIAN_COUNTERS, capacity,
+                                       callback)
+        return self.__profile
+
+    def disable_profiling(self):
+        """Stops recording, updates are then not timed at all"""
+        self.__profile = None
+
+    def profile(self):
+        """Gives the profile being recorded
+
+        Returns:
+
+            profile (UpdateProfile): the profile, None if profiling is
+            disabled
+        """
+        return self.__profile
+
+    def save_state(self, path):
+        """Writes the scans held and the settings to a state file, so that a
+        filter can resume from them with load_state without replaying scans
+
+        Args:
+
+            path (str): path of the state file, replaced if it exists
+        """
+        settings = {"num_prev_scans": self.__num_prev_scans,
+                    "dtype": self.__dtype.name,
+                    "engine": self.__engine,
+                    "bin_width": self.__bin_width,
+                    "num_bins": self.__num_bins,
+                    "mask_invalid": self.__mask_invalid,
+                    "num_points": self.__N}
+        if self.__histogram is not None:
+            arrays = [("window", self.__histogram.window().astype(np.int32))]
+        else:
+            num_history = self.__history.shape[0]
+            rows = np.arange(self.__head - self.__num_scans, self.__head)
+            rows %= num_history
+            arrays = [("window", self.__history.take(rows, axis=0))]
+            if self.__mask_invalid:
+                valid = self.__valid_history.take(rows, axis=0)
+                arrays.append(("valid", np.packbits(valid, axis=1)))
+            if (self.__motion_threshold is not None or self.__partial) \
+                    and self.__N > 0:
+                arrays.append(("effective",
+                               self.__effective.astype(np.int32)))
+        _write_state(path, "TemporalMedianFilter", settings, arrays)
+
+    def load_state(self, path):
+        """Replaces the scans held and num_prev_scans by those of a state
+        file written by save_state. The scans are copied from the memory
+        mapped file, the next update continues as if they had just been
+        filtered
+
+        Args:
+
+            path (str): path of the state file
+
+        Raises:
+
+            ValueError: not the state of a TemporalMedianFilter, an
+            unsupported version, saved with another dtype, engine, bins or
+            mask_invalid, or holding settings or scans that do not fit them.
+            The filter is then left unchanged
+        """
+        settings, arrays = _read_state(path, "TemporalMedianFilter")
+        expected = {"dtype": self.__dtype.name, "engine": self.__engine,
+                    "mask_invalid": self.__mask_invalid}
+        if self.__histogram is not None:
+            expected["bin_width"] = self.__bin_width
+            expected["num_bins"] = self.__num_bins
+        _check_state_settings(path, settings, expected)
+
+        # The checksums cover the arrays only, so the settings are checked
+        # before anything is changed
+        for name in ["num_prev_scans", "num_points"]:
+            value = settings.get(name)
+            if not isinstance(value, int) or isinstance(value, bool) or \
+                    value < 0:
+                error_msg = path + " holds invalid " + name + " "
+                error_msg += repr(value)
+                raise ValueError(error_msg)
+        num_prev_scans = settings["num_prev_scans"]
+        num_points = settings["num_points"]
+        window = arrays.get("window")
+        if window is None or window.ndim != 2 or \
+                window.shape[0] > num_prev_scans + 1 or \
+                window.shape[1] != num_points:
+            raise ValueError(path + " is corrupt")
+        num_scans = window.shape[0]
+
+        histogram = None
+        valid = None
+        effective = arrays.get("effective")
+        if self.__histogram is not None:
+            if window.dtype.kind not in "iu":
+                raise ValueError(path + " is corrupt")
+            histogram = _HistogramWindow(num_prev_scans + 1,
+                                         self.__bin_width, self.__num_bins)
+            try:
+                histogram.load(window)
+            except ValueError as error:
+                raise ValueError(path + " is corrupt: " + str(error))
+        else:
+            if window.dtype != self.__dtype:
+                raise ValueError(path + " is corrupt")
+            if self.__mask_invalid:
+                valid = arrays.get("valid")
+                if valid is None or valid.dtype != np.uint8 or \
+                        valid.shape != (num_scans, (num_points + 7)//8):
+                    raise ValueError(path + " is corrupt")
+                valid = np.unpackbits(valid, axis=1)
+                valid = valid[:, :num_points].astype(bool)
+            if effective is not None and (effective.dtype.kind not in "iu" or
+                                          effective.shape != (num_points,)):
+                raise ValueError(path + " is corrupt")
+
+        self.__num_prev_scans = num_prev_scans
+        self.__allocate(num_points)
+        self.__trusted = False
+        if histogram is not None:
+            self.__histogram = histogram
+            self.__num_scans = num_scans
+            return
+        if num_scans == 0:
+            return
+
+        self.__load_window(window, valid)
+        if effective is not None:
+            np.minimum(effective, num_scans, out=self.__effective)
+            if self.__motion_threshold is None and not self.__mask_invalid:
+                self.__partial = bool(self.__effective.min() < num_scans)
+
+    def __allocate(self, num_points):
+        """Allocates the history, ordered window and work buffers for scans
+        of num_points measurements. Buffers are reused if already that size
+
+        Args:
+
+            num_points (int): number of measurements in each scan
+        """
+        self.__N = num_points
+        self.__num_scans = 0
+        self.__head = 0
+        self.__partial = False
+        self.__num_channel_scans = 0
+        if self.__histogram is not None:
+            self.__histogram.reset(num_points)
+            return
+
+        num_rows = self.__num_prev_scans + 1
+        if self.__mask_invalid:
+            self.__num_valid = np.zeros(num_points, dtype=np.intp)
+        self.__effective = np.zeros(num_points, dtype=np.intp)
+        if self.__motion_threshold is not None:
+            self.__last_median = np.full(num_points, np.nan,
+                                         dtype=self.__result_dtype)
+        buffers = self.__buffers
+        if buffers is None or buffers["ordered"].shape[1] != num_points or \
+                buffers["ordered"].shape[0] < num_rows:
+            self.__allocate_buffers(num_rows, num_points)
+        self.__use_rows(num_rows)
+
+    def __allocate_buffers(self, num_rows, num_points):
+        """Allocates the buffers for windows of up to num_rows scans of
+        num_points measurements
+
+        Args:
+
+            num_rows (int): number of scans in a full window
+            num_points (int): number of measurements in each scan
+        """
+        self.__buffers = {
+            "history": np.empty((num_rows + 1, num_points),
+                                dtype=self.__dtype),
+            "ordered": np.empty((num_rows, num_points), dtype=self.__dtype),
+            # Work buffers so that an update does not allocate full size
+            # arrays
+            "work": np.empty((num_rows, num_points), dtype=self.__dtype),
+            "old_less": np.empty((num_rows, num_points), dtype=bool),
+            "new_less": np.empty((num_rows, num_points), dtype=bool),
+            "move": np.empty((num_rows, num_points), dtype=bool)}
+        if self.__mask_invalid:
+            self.__buffers["valid"] = np.empty((num_rows + 1, num_points),
+                                               dtype=bool)
+        self.__evict_less = np.empty(num_points, dtype=bool)
+        self.__new_pos = np.empty(num_points, dtype=np.intp)
+        self.__columns = np.arange(num_points, dtype=np.intp)
+
+    def __use_rows(self, num_rows):
+        """Points the history, ordered window and work buffers at the first
+        rows of the buffers, for windows of num_rows scans
+
+        Args:
+
+            num_rows (int): number of scans in a full window
+        """
+        buffers = self.__buffers
+        self.__history = buffers["history"][:num_rows + 1]
+        self.__ordered_data = buffers["ordered"][:num_rows]
+        self.__work = buffers["work"][:num_rows]
+        self.__old_less = buffers["old_less"][:num_rows]
+        self.__new_less = buffers["new_less"][:num_rows]
+        self.__move = buffers["move"][:num_rows]
+        if self.__mask_invalid:
+            self.__valid_history = buffers["valid"][:num_rows + 1]
+
+    def change_num_prev_scans(self, num_prev_scans):
+        """Changes the number of previous scans the median is taken over,
+        keeping the most recent scans held. When the window shrinks the
+        oldest scans are evicted from the ordered window one at a time, and
+        when it grows the held scans stay sorted, so nothing is sorted
+        again. The buffers are reused unless the window grows past the
+        largest size they have held
+
+        Args:
+
+            num_prev_scans (int): number of previous scans
+
+        Raises:
+
+            TypeError: Invalid type
+            ValueError: Invalid value, num_prev_scans is then left unchanged
+        """
+        old_num_prev_scans = self.__num_prev_scans
+        self.__num_prev_scans = num_prev_scans
+        try:
+            self.__check_args()
+        except (TypeError, ValueError):
+            self.__num_prev_scans = old_num_prev_scans
+            raise
+
+        num_rows = num_prev_scans + 1
+        if self.__histogram is not None:
+            held_rows = self.__histogram.rows()
+            self.__histogram.resize(num_rows)
+            self.__num_scans = min(self.__num_scans, num_rows)
+            self.__keep_channels(held_rows[held_rows.size - self.__num_scans:])
+            return
+        if self.__buffers is None:
+            return
+
+        # Chronological history rows of the held scans, the oldest of which
+        # are evicted if the window shrinks
+        num_scans = self.__num_scans
+        rows = np.arange(self.__head - num_scans, self.__head)
+        rows %= self.__history.shape[0]
+        num_drop = max(0, num_scans - num_rows)
+        for row in rows[:num_drop]:
+            self.__evict(self.__history[row], num_scans)
+            if self.__mask_invalid:
+                self.__num_valid -= self.__valid_history[row]
+            num_scans -= 1
+        rows = rows[num_drop:]
+        window = self.__history.take(rows, axis=0)
+        if self.__mask_invalid:
+            valid = self.__valid_history.take(rows, axis=0)
+
+        if self.__buffers["ordered"].shape[0] < num_rows:
+            ordered = self.__ordered_data[:num_scans].copy()
+            self.__allocate_buffers(num_rows, self.__N)
+            self.__buffers["ordered"][:num_scans] = ordered
+        self.__use_rows(num_rows)
+
+        self.__history[:num_scans] = window
+        if self.__mask_invalid:
+            self.__valid_history[:num_scans] = valid
+        np.minimum(self.__effective, num_scans, out=self.__effective)
+        self.__head = num_scans
+        self.__num_scans = num_scans
+        self.__keep_channels(rows)
+
+    def _check_beams(self, beams):
+        """Checks the argument of select_beams without changing the filter,
+        so that a FilterPipeline can check every stage before changing any
+
+        Args:
+
+            beams (list or numpy.ndarray): for each beam of the next scans,
+            the index of the held beam it continues, or -1 for a new beam
+
+        Raises:
+
+            TypeError: beams is not a list or numpy.ndarray of integers
+            ValueError: beams is not 1D, holds an index out of range, or
+            holds a new beam while the histogram engine holds scans
+
+        Returns:
+
+            beams (numpy.ndarray): beams as a 1D vector of numpy.intp
+        """
+        if not isinstance(beams, (list, np.ndarray)):
+            error_msg = "beams wrong type, expected list or numpy.ndarray"
+            raise TypeError(error_msg)
+        beams = np.asarray(beams)
+        if beams.size and beams.dtype.kind not in "iu":
+            error_msg = "beams must hold integers, but given '"
+            error_msg += str(beams.dtype) + "'"
+            raise TypeError(error_msg)
+        beams = beams.astype(np.intp)
+        if beams.ndim != 1:
+            raise ValueError("beams must be a 1D vector")
+        elif beams.size and (beams.min() < -1 or beams.max() >= self.__N):
+            raise ValueError("beam index out of range")
+        elif self.__histogram is not None and self.__num_scans > 0 and \
+                (beams < 0).any():
+            error_msg = "the histogram engine cannot add beams to held scans"
+            raise ValueError(error_msg)
+        return beams
+
+    def select_beams(self, beams):
+        """Changes the beams of the next scans, keeping the held scans of the
+        beams that stay. Each beam of the next scans either continues a held
+        beam or is new, a new beam starts without held measurements and its
+        window grows with each scan until it is full, as the windows of the
+        very first scans do. The channels held for update_channels are
+        dropped
+
+        Args:
+
+            beams (list or numpy.ndarray): for each beam of the next scans,
+            the index of the held beam it continues, or -1 for a new beam
+
+        Raises:
+
+            TypeError: beams is not a list or numpy.ndarray of integers
+            ValueError: beams is not 1D, holds an index out of range, or
+            holds a new beam while the histogram engine holds scans. The
+            filter is then left unchanged
+        """
+        beams = self._check_beams(beams)
+        num_scans = self.__num_scans
+        new = beams < 0
+        self.__num_channel_scans = 0
+        self.__trusted = False
+        if num_scans == 0 or self.__num_prev_scans == 0:
+            # The next scan is treated as the first
+            self.__allocate(beams.size)
+            return
+        if self.__histogram is not None:
+            bins = self.__histogram.window().take(beams, axis=1)
+            self.__N = beams.size
+            self.__histogram.load(bins)
+            self.__num_scans = num_scans
+            return
+
+        # New beams hold the marker of scans dropped from a window, which
+        # sorts after every measurement and in a mask counts as invalid
+        kept = ~new
+        source = beams[kept]
+        rows = np.arange(self.__head - num_scans, self.__head)
+        rows %= self.__history.shape[0]
+        window = np.full((num_scans, beams.size), self.__marker,
+                         dtype=self.__dtype)
+        window[:, kept] = self.__history.take(rows, axis=0)[:, source]
+        valid = None
+        if self.__mask_invalid:
+            valid = np.zeros((num_scans, beams.size), dtype=bool)
+            valid[:, kept] = self.__valid_history.take(rows, axis=0)[:, source]
+        effective = np.zeros(beams.size, dtype=np.intp)
+        effective[kept] = self.effective_windows()[source]
+        if self.__motion_threshold is not None:
+            last_median = self.__last_median[source]
+
+        self.__allocate(beams.size)
+        self.__load_window(window, valid)
+        self.__effective[...] = effective
+        if self.__motion_threshold is not None:
+            self.__last_median[kept] = last_median
+        elif not self.__mask_invalid:
+            self.__partial = bool(effective.size and
+                                  effective.min() < num_scans)
+
+    def __evict(self, scan_array, num_scans):
+        """Removes one scan from the first num_scans rows of the ordered
+        window, shifting the entries after it up by one row
+
+        Args:
+
+            scan_array (numpy.ndarray): 1D vector of the scan's measurements
+            in the history dtype
+            num_scans (int): number of scans in the window
+        """
+        ordered = self.__ordered_data[:num_scans]
+        less = self.__old_less[:num_scans]
+        self.__sorts_before(ordered, scan_array, less)
+        work = self.__work[:num_scans]
+        work[...] = ordered
+        move = self.__move[:num_scans - 1]
+        np.logical_not(less[:-1], out=move)
+        np.copyto(ordered[:-1], work[1:], where=move)
+
+    def __to_history(self, scan_array):
+        """Converts measurements to the dtype of the history. For uint16
+        they are rounded to whole millimetres and saturate at 0 and
+        65535, NaN is stored as 0, or as 65535 with mask_invalid
+
+        Args:
+
+            scan_array (numpy.ndarray): measurements
+
+        Returns:
+
+            history_array (numpy.ndarray): measurements in the history dtype,
+            scan_array itself if already in it
+        """
+        if not self.__fixed_point:
+            return scan_array.astype(self.__dtype, copy=False)
+        return _to_millimetres(scan_array, self.__fixed_point_nan)
+
+    def __midpoint(self, median_val_1, median_val_2):
+        """Averages the two middle values of an even window
+
+        Returns:
+
+            median_val (numpy.ndarray): the averages in the result dtype
+        """
+        if self.__fixed_point:
+            median_val_1 = median_val_1.astype(self.__result_dtype)
+        return (median_val_1 + median_val_2) / 2.0
+
+    def __to_result(self, median_val):
+        """Converts medians from the history dtype to the result dtype
+
+        Returns:
+
+            median_val (numpy.ndarray): medians in the result dtype
+        """
+        if not self.__fixed_point:
+            return median_val
+        median_val = median_val.astype(self.__result_dtype)
+        median_val /= MILLIMETRES_PER_UNIT
+        return median_val
+
+    def __mask_returns(self, scan_array):
+        """Replaces invalid returns by NaN
+
+        Args:
+
+            scan_array (numpy.ndarray): measurements
+
+        Returns:
+
+            scan_array (numpy.ndarray): measurements as float, NaN for each
+            invalid return
+            valid (numpy.ndarray): bool array, True for each valid return
+        """
+        valid = ~_invalid_returns(scan_array)
+        return np.where(valid, scan_array, np.nan), valid
+
+    def __track_valid(self, valid):
+        """Updates each beam's count of valid returns in the window for the
+        scan about to be inserted, and records its mask in the history
+
+        Args:
+
+            valid (numpy.ndarray): bool array, True for each valid return
+        """
+        if self.__num_scans > self.__num_prev_scans:
+            num_history = self.__valid_history.shape[0]
+            self.__num_valid -= self.__valid_history[(self.__head + 1) %
+                                                     num_history]
+        self.__num_valid += valid
+        self.__valid_history[self.__head] = valid
+
+    def __sorts_before(self, ordered, values, out):
+        """Flags per column the entries of ordered that sort before values.
+        NaN sorts after every number, matching numpy.sort
+
+        Args:
+
+            ordered (numpy.ndarray): rows of the ordered window
+            values (numpy.ndarray): one value per column
+            out (numpy.ndarray): bool array the flags are written to
+        """
+        np.less(ordered, values, out=out)
+        nan_columns = np.isnan(values)
+        if nan_columns.any():
+            out[..., nan_columns] = ~np.isnan(ordered[..., nan_columns])
+
+    def __insert(self, scan_array):
+        """Writes scan_array into the circular history and updates the
+        ordered window by evicting the oldest scan and inserting the new one
+
+        Since each column of the ordered window is sorted, the entries that
+        sort before the evicted and the inserted value are a prefix of it.
+        The entries between the two positions shift by one row and the rest
+        stay in place, so no sort is needed.
+
+        Args:
+
+            scan_array (numpy.ndarray): 1D vector of N measurements
+
+        Returns:
+
+            num_scans (int): number of scans in the window after the insert
+        """
+        num_scans = self.__num_scans
+        ordered = self.__ordered_data
+        old_less = self.__old_less
+        new_less = self.__new_less
+        new_pos = self.__new_pos
+
+        if num_scans > self.__num_prev_scans:
+            # Window is full: the oldest scan is the row after the one the
+            # new scan is written to, it is the value evicted from each column
+            num_history = self.__history.shape[0]
+            oldest = self.__history[(self.__head + 1) % num_history]
+            self.__sorts_before(ordered, oldest, old_less)
+            self.__sorts_before(ordered, scan_array, new_less)
+            np.sum(new_less, axis=0, out=new_pos)
+            self.__sorts_before(oldest, scan_array, self.__evict_less)
+            new_pos -= self.__evict_less
+        else:
+            # Window still filling: the unused row num_scans is "evicted"
+            old_less[:num_scans] = True
+            old_less[num_scans] = False
+            self.__sorts_before(ordered[:num_scans], scan_array,
+                                new_less[:num_scans])
+            new_less[num_scans] = False
+            np.sum(new_less[:num_scans], axis=0, out=new_pos)
+            num_scans += 1
+
+        if num_scans > 1:
+            old_less = old_less[:num_scans]
+            new_less = new_less[:num_scans]
+            move = self.__move[:num_scans - 1]
+            work = self.__work[:num_scans]
+            work[...] = ordered[:num_scans]
+
+            # Entries after the evicted and before the inserted value
+            # shift to the previous row
+            np.greater(new_less[1:], old_less[:-1], out=move)
+            np.copyto(ordered[:num_scans - 1], work[1:], where=move)
+
+            # Entries after the inserted and before the evicted value
+            # shift to the next row
+            np.greater(old_less[:-1], new_less[:-1], out=move)
+            np.copyto(ordered[1:num_scans], work[:-1], where=move)
+
+        ordered[new_pos, self.__columns] = scan_array
+
+        self.__history[self.__head] = scan_array
+        self.__head = (self.__head + 1) % self.__history.shape[0]
+        self.__num_scans = num_scans
+        return num_scans
+
+    def _output_dtype(self):
+        """Gives the dtype of the results of update, so that a FilterPipeline
+        passes them to the next stage without converting them
+
+        Returns:
+
+            dtype (numpy.dtype): dtype of the results
+        """
+        return self.__result_dtype
+
+    def update(self, scan, out=None):
+        """Determines the median of the current scan with num_prev_scans
+
+        Args:
+
+            scan (list or numpy.ndarray): a set of measurements
+            out (numpy.ndarray): optional array with the same number of
+            elements as scan that receives the result, default value is None
+
+        Raises:
+
+            TypeError: scan or out is the wrong type
+            ValueError: the number of datapoints in scan not consistent with
+            previous scans, or out does not have the same number of elements
+            as scan
+
+        Returns:
+
+            median_val (list): scan with median values determined from
+            current and num_prev_scans, or out if given
+
+        """
+        profile = self.__profile
+        times = None
+        if profile is not None:
+            times = [default_timer()]
+
+        # Check the input type and convert to ndarray if a list
+        # and ensure that the input is a 1D vector
+        if not isinstance(scan, (list, np.ndarray)):
+            error_msg = "argument wrong type, expected list or numpy.ndarray"
+            raise TypeError(error_msg)
+        else:
+            scan_array = np.asarray(scan)
+            element_count = scan_array.size
+            scan_array = scan_array.reshape(element_count)
+
+        # The very first scan sets the number of data points, with no
+        # previous scans every scan is treated as the first
+        if out is not None:
+            if not isinstance(out, np.ndarray):
+                error_msg = "out wrong type, expected 'numpy.ndarray'"
+                raise TypeError(error_msg)
+            elif out.size != element_count:
+                error_msg = "out must have the same number of elements as scan"
+                raise ValueError(error_msg)
+
+        if self.__num_scans == 0 or self.__num_prev_scans == 0:
+            self.__allocate(scan_array.size)
+        elif scan_array.size != self.__N:
+            # Check every scan has same number of measurements as first scan
+            raise ValueError("number of data points not consistent")
+
+        if profile is not None:
+            evictions = int(self.__num_scans == self.__num_prev_scans + 1)
+            times.append(default_timer())
+
+        self.__num_channel_scans = 0
+        if self.__histogram is not None:
+            median_val = self.__histogram_update(scan_array, times)
+        else:
+            median_val = self.__exact_update(scan_array, times)
+        if profile is not None:
+            times.append(default_timer())
+
+        if out is not None:
+            out[...] = median_val.reshape(out.shape)
+            median_val = out
+        else:
+            median_val = median_val.tolist()
+        if profile is not None:
+            times.append(default_timer())
+            profile._record(times, (1, element_count, evictions))
+        return median_val
+
+    def update_unchecked(self, scan_array, out=None):
+        """Fast path of update for trusted input. Only the first call checks
+        its arguments, later calls are trusted to pass the same kind of
+        arrays with the same number of measurements, and go straight to the
+        insert and median without conversion, reshaping or profiling
+
+        Args:
+
+            scan_array (numpy.ndarray): contiguous 1D vector of measurements
+            in the result dtype, float32 metres for a uint16 history
+            out (numpy.ndarray): optional array of the same shape and dtype
+            that receives the result, default value is None
+
+        Raises:
+
+            TypeError: on the first call, scan_array or out is not a
+            numpy.ndarray of the result dtype
+            ValueError: on the first call, scan_array is not a contiguous 1D
+            vector, out is not the same shape, or the number of datapoints
+            is not consistent with previous scans
+
+        Returns:
+
+            median_val (numpy.ndarray): median of each beam, out if given
+        """
+        if not self.__trusted:
+            _check_trusted_scan(scan_array, out, self.__result_dtype)
+            if self.__num_scans > 0 and scan_array.size != self.__N:
+                raise ValueError("number of data points not consistent")
+            self.__trusted = True
+
+        if self.__num_scans == 0:
+            self.__allocate(scan_array.size)
+        self.__num_channel_scans = 0
+        if self.__histogram is not None:
+            median_val = self.__histogram_update(scan_array)
+        else:
+            median_val = self.__exact_update(scan_array)
+
+        # The median of an odd window is a view of the ordered window
+        if out is None:
+            return median_val.copy()
+        out[...] = median_val
+        return out
+
+    def update_channels(self, scan, range_key="range"):
+        """Applies update to the ranges of a scan that also carries other
+        channels, such as intensity, ring index or per beam timestamps. The
+        other channels are kept with each history row, and for each beam
+        the channels of the held sample nearest the median are gathered,
+        the most recent of equally near samples. That is the sample chosen
+        as the median of an odd window of the exact engine
+
+        Samples of scans given to update or update_batch, or held before
+        select_beams or load_state, have no channels and gather zeros
+
+        Args:
+
+            scan (dict or numpy.ndarray): dict of equal length arrays or
+            lists, or a numpy structured array, one entry or field per
+            channel
+            range_key (str): name of the channel holding the ranges, default
+            value is "range"
+
+        Raises:
+
+            TypeError: scan is the wrong type
+            ValueError: range_key is not a channel, the channels have
+            different numbers of elements, or the number of datapoints is
+            not consistent with previous scans
+
+        Returns:
+
+            channels (dict): the medians under range_key and each other
+            channel of the sample chosen for each beam
+        """
+        ranges, channels = _to_channels(scan, range_key)
+        num_channel_scans = self.__num_channel_scans
+        median_val = np.empty(ranges.size, dtype=self.__result_dtype)
+        self.update(ranges, out=median_val)
+
+        rows, num_history = self.__held_rows()
+        shape = (num_history, self.__N)
+        if sorted(self.__channels) != sorted(channels) or any(
+                self.__channels[name].shape != shape or
+                self.__channels[name].dtype != values.dtype
+                for name, values in channels.items()):
+            self.__channels = dict(
+                (name, np.zeros(shape, dtype=values.dtype))
+                for name, values in channels.items())
+            num_channel_scans = 0
+        for name, values in channels.items():
+            self.__channels[name][rows[-1]] = values
+        self.__num_channel_scans = min(num_channel_scans + 1,
+                                       self.__num_scans)
+
+        # Number of scans held after the sample chosen for each beam
+        age = self.__median_samples(median_val, rows[::-1])
+        source = rows[rows.size - 1 - age]
+        columns = np.arange(self.__N)
+        no_channels = age >= self.__num_channel_scans
+        channels = {}
+        for name, history in self.__channels.items():
+            channels[name] = history[source, columns]
+            channels[name][no_channels] = 0
+        channels[range_key] = median_val
+        return channels
+
+    def __held_rows(self):
+        """Gives the rows of the scans held, in the history of the exact
+        engine or the window of the histogram engine
+
+        Returns:
+
+            rows (numpy.ndarray): row of each scan held, oldest scan first
+            num_history (int): number of rows the scans are written to in
+            turn
+        """
+        if self.__histogram is not None:
+            return self.__histogram.rows(), self.__num_prev_scans + 1
+        num_history = self.__history.shape[0]
+        rows = np.arange(self.__head - self.__num_scans, self.__head)
+        return rows % num_history, num_history
+
+    def __median_samples(self, median_val, rows):
+        """Finds for each beam the held sample nearest its median, the most
+        recent of equally near samples, over the scans in its window. The
+        held samples are compared as the median engine gives them, so the
+        sample a median was taken from is at distance zero
+
+        Args:
+
+            median_val (numpy.ndarray): median of each beam, in the result
+            dtype
+            rows (numpy.ndarray): rows of the scans held, most recent first
+
+        Returns:
+
+            age (numpy.ndarray): for each beam the index in rows of the
+            chosen sample
+        """
+        if self.__histogram is not None:
+            held = self.__histogram.centres(rows)
+        else:
+            held = self.__to_result(self.__history.take(rows, axis=0))
+            if self.__mask_invalid:
+                held = held.astype(self.__result_dtype, copy=False)
+                held[~self.__valid_history.take(rows, axis=0)] = np.nan
+        distance = np.abs(held - median_val)
+        distance[np.isnan(distance)] = np.inf
+
+        # A NaN median is the median of NaN samples
+        nan_median = np.isnan(median_val)
+        if nan_median.any():
+            distance[:, nan_median] = np.where(
+                np.isnan(held[:, nan_median]), 0.0, np.inf)
+
+        # Scans dropped from a beam's window hold a marker
+        if self.__histogram is None and (self.__motion_threshold is not None
+                                         or self.__partial):
+            dropped = np.arange(rows.size)[:, None] >= self.__effective
+            distance[dropped] = np.inf
+        return np.argmin(distance, axis=0)
+
+    def __keep_channels(self, rows):
+        """Moves the channels of the scans kept by change_num_prev_scans to
+        the first rows of a history sized for the new window
+
+        Args:
+
+            rows (numpy.ndarray): rows the scans kept were held in, oldest
+            scan first
+        """
+        num_history = self.__held_rows()[1]
+        for name, history in self.__channels.items():
+            kept = history.take(rows, axis=0)
+            history = np.zeros((num_history, history.shape[1]),
+                               dtype=history.dtype)
+            history[:rows.size] = kept
+            self.__channels[name] = history
+        self.__num_channel_scans = min(self.__num_channel_scans, rows.size)
+
+    def _input_buffer(self, num_points):
+        """Gives the history row the next scan is written to, so that a
+        preceding stage can write its output straight into the history
+
+        Args:
+
+            num_points (int): number of measurements in the next scan
+
+        Returns:
+
+            row (numpy.ndarray): the history row, or None if a scan of
+            num_points measurements would be rejected by update or the
+            history is not kept as measurements in metres or invalid
+            returns have to be masked first
+        """
+        if self.__fixed_point or self.__mask_invalid or \
+                self.__histogram is not None:
+            return None
+        elif self.__num_scans == 0 or self.__num_prev_scans == 0:
+            self.__allocate(num_points)
+        elif num_points != self.__N:
+            return None
+        return self.__history[self.__head]
+
+    def update_batch(self, scans):
+        """Determines the median of each scan in a block of scans with
+        num_prev_scans, continuing from the scans already held. Afterwards
+        the filter is in the same state as after calling update on each scan
+
+        Args:
+
+            scans (list or numpy.ndarray): T x N block with one scan per row
+
+        Raises:
+
+            TypeError: scans is the wrong type
+            ValueError: scans is not 2D or the number of datapoints in the
+            scans not consistent with previous scans
+
+        Returns:
+
+            median_block (numpy.ndarray): T x N array with the median values
+            of each scan
+        """
+        profile = self.__profile
+        if profile is not None:
+            start = default_timer()
+
+        scan_block = _to_scan_block(scans)
+        num_new, num_points = scan_block.shape
+        median_block = np.empty((num_new, num_points),
+                                dtype=self.__result_dtype)
+        if num_new == 0:
+            return median_block
+
+        if self.__num_scans == 0 or self.__num_prev_scans == 0:
+            self.__allocate(num_points)
+        elif num_points != self.__N:
+            raise ValueError("number of data points not consistent")
+        self.__num_channel_scans = 0
+
+        if profile is not None:
+            evictions = 0
+            if self.__num_prev_scans > 0:
+                evictions = max(0, self.__num_scans + num_new -
+                                (self.__num_prev_scans + 1))
+            self.__batch_update(scan_block, median_block)
+            profile._record([start, default_timer()],
+                            (num_new, scan_block.size, evictions))
+            return median_block
+
+        self.__batch_update(scan_block, median_block)
+        return median_block
+
+    def __batch_update(self, scan_block, median_block):
+        """Adds a block of scans to the window
+
+        Args:
+
+            scan_block (numpy.ndarray): T x N array of scans
+            median_block (numpy.ndarray): T x N array the medians are
+            written to
+        """
+        num_new = scan_block.shape[0]
+        if self.__histogram is not None:
+            for idx in range(num_new):
+                median_block[idx] = self.__histogram_update(scan_block[idx])
+            return
+        if self.__motion_threshold is not None:
+            # Each scan can change the window lengths of the next
+            for idx in range(num_new):
+                median_block[idx] = self.__exact_update(scan_block[idx])
+            return
+
+        # Until the window is full each scan has a different window length,
+        # these few scans go through the incremental path, as do the scans
+        # until the windows of beams added by select_beams are full
+        num_rows = self.__num_prev_scans + 1
+        idx = 0
+        while idx < num_new and (self.__num_scans < num_rows or
+                                 self.__partial):
+            median_block[idx] = self.__exact_update(scan_block[idx])
+            idx += 1
+        if idx == num_new:
+            return
+
+        # Chronological stream of the previous scans and the remaining new
+        # scans, every scan in it past the first num_prev_scans has a full
+        # window ending at that scan
+        num_history = self.__history.shape[0]
+        previous_rows = np.arange(self.__head - num_rows + 1, self.__head)
+        previous_rows %= num_history
+        previous = self.__history.take(previous_rows, axis=0)
+        new_scans = scan_block[idx:]
+        valid_stream = None
+        if self.__mask_invalid:
+            new_scans, valid = self.__mask_returns(new_scans)
+            valid_stream = np.concatenate(
+                [self.__valid_history.take(previous_rows, axis=0), valid])
+        stream = np.concatenate([previous, self.__to_history(new_scans)])
+        self.__sliding_median(stream, median_block[idx:], valid_stream)
+
+        if valid_stream is not None:
+            valid_stream = valid_stream[-num_rows:]
+        self.__load_window(stream[-num_rows:], valid_stream)
+
+    def __exact_update(self, scan_array, times=None):
+        """Adds a scan to the ordered window
+
+        Args:
+
+            scan_array (numpy.ndarray): 1D vector of N measurements
+            times (list): timer readings the end of the insert is appended
+            to while profiling, default value is None
+
+        Returns:
+
+            median_val (numpy.ndarray): median of each beam, in the result
+            dtype
+        """
+        adaptive = self.__motion_threshold is not None
+        if not self.__mask_invalid:
+            if adaptive:
+                self.__adapt(scan_array)
+            num_scans = self.__insert(self.__to_history(scan_array))
+            if times is not None:
+                times.append(default_timer())
+            if not adaptive and not self.__partial:
+                return self.__median(self.__ordered_data, num_scans)
+            if self.__grow_windows(num_scans):
+                self.__partial = False
+                median_val = self.__median(self.__ordered_data, num_scans)
+            else:
+                median_val = self.__masked_median(self.__ordered_data,
+                                                  self.__effective)
+            if adaptive:
+                self.__last_median[...] = median_val
+            return median_val
+
+        scan_array, valid = self.__mask_returns(scan_array)
+        if adaptive:
+            self.__adapt(scan_array)
+        self.__track_valid(valid)
+        num_scans = self.__insert(self.__to_history(scan_array))
+        if times is not None:
+            times.append(default_timer())
+        median_val = self.__masked_median(self.__ordered_data,
+                                          self.__num_valid)
+        if adaptive:
+            self.__grow_windows(num_scans)
+            self.__last_median[...] = median_val
+        return median_val
+
+    def __adapt(self, scan_array):
+        """Shrinks the window of each beam whose new measurement is further
+        than motion_threshold from its last median to its min_prev_scans
+        most recent scans. The older scans of those beams are replaced in
+        the history and the ordered window by a marker that sorts after
+        every measurement, so later evictions stay consistent
+
+        Args:
+
+            scan_array (numpy.ndarray): 1D vector of N measurements, NaN for
+            invalid returns with mask_invalid
+        """
+        num_scans = self.__num_scans
+        num_kept = min(self.__min_prev_scans, self.__num_prev_scans)
+        if num_scans <= num_kept:
+            return
+
+        with np.errstate(invalid="ignore"):
+            moved = np.abs(scan_array - self.__last_median) > \
+                self.__motion_threshold
+        moved &= self.__effective > num_kept
+        beams = np.flatnonzero(moved)
+        if beams.size == 0:
+            return
+        self.__num_shrinks += beams.size
+
+        # Held history rows, oldest first
+        rows = np.arange(self.__head - num_scans, self.__head)
+        rows %= self.__history.shape[0]
+        old_rows = rows[:num_scans - num_kept, None]
+        kept_rows = rows[num_scans - num_kept:, None]
+
+        kept = self.__history[kept_rows, beams]
+        kept.sort(axis=0)
+        self.__history[old_rows, beams] = self.__marker
+        self.__ordered_data[:num_kept, beams] = kept
+        self.__ordered_data[num_kept:num_scans, beams] = self.__marker
+        if self.__mask_invalid:
+            self.__valid_history[old_rows, beams] = False
+            self.__num_valid[beams] = np.sum(
+                self.__valid_history[kept_rows, beams], axis=0)
+        self.__effective[beams] = num_kept
+
+    def __grow_windows(self, num_scans):
+        """Counts the scan just inserted in each beam's window
+
+        Args:
+
+            num_scans (int): number of scans in the window after the insert
+
+        Returns:
+
+            full (bool): True if every beam's window holds all num_scans
+            scans, so that the medians are those of a fixed window
+        """
+        self.__effective += 1
+        np.minimum(self.__effective, num_scans, out=self.__effective)
+        return self.__effective.size == 0 or \
+            self.__effective.min() == num_scans
+
+    def effective_windows(self):
+        """Gives the number of scans each beam's median is taken over. With
+        a fixed window that is the number of scans held
+
+        Returns:
+
+            effective (numpy.ndarray): 1D vector with the window length of
+            each beam
+        """
+        if self.__motion_threshold is None and not self.__partial:
+            return np.full(self.__N, self.__num_scans, dtype=np.intp)
+        return self.__effective.copy()
+
+    def window_stats(self):
+        """Summarises the effective window lengths of the beams
+
+        Returns:
+
+            stats (dict): "mean", "min" and "max" window length over the
+            beams, and "shrinks", the number of times a beam's window was
+            shrunk by motion since the filter was created
+        """
+        effective = self.effective_windows()
+        if effective.size == 0:
+            effective = np.zeros(1, dtype=np.intp)
+        return {"mean": float(np.mean(effective)),
+                "min": int(np.min(effective)),
+                "max": int(np.max(effective)),
+                "shrinks": self.__num_shrinks}
+
+    def __histogram_update(self, scan_array, times=None):
+        """Adds a scan to the histogram engine's window
+
+        Args:
+
+            scan_array (numpy.ndarray): 1D vector of N measurements
+            times (list): timer readings the end of the insert is appended
+            to while profiling, default value is None
+
+        Returns:
+
+            median_val (numpy.ndarray): median of each beam, in the result
+            dtype
+        """
+        if self.__mask_invalid:
+            scan_array = self.__mask_returns(scan_array)[0]
+        self.__num_scans = self.__histogram.insert(scan_array)
+        if times is not None:
+            times.append(default_timer())
+        median_val = self.__histogram.median(self.__num_scans,
+                                             self.__mask_invalid)
+        return median_val.astype(self.__result_dtype, copy=False)
+
+    def __masked_median(self, ordered, num_valid):
+        """Determines each column's median over its first num_valid entries
+        of an ordered window, in which invalid returns sort last
+
+        Args:
+
+            ordered (numpy.ndarray): window sorted along its second last axis
+            num_valid (numpy.ndarray): number of valid returns per column,
+            with the shape of ordered without its second last axis
+
+        Returns:
+
+            median_val (numpy.ndarray): median of each column, in the result
+            dtype, NaN for columns without valid returns
+        """
+        low = (np.maximum(num_valid, 1) - 1)//2
+        high = num_valid//2
+        median_val_1 = np.take_along_axis(ordered, low[..., None, :],
+                                          axis=-2)[..., 0, :]
+        median_val_2 = np.take_along_axis(ordered, high[..., None, :],
+                                          axis=-2)[..., 0, :]
+        median_val = self.__midpoint(median_val_1, median_val_2)
+        odd = num_valid%2 == 1
+        median_val[odd] = median_val_1[odd]
+        median_val = self.__to_result(median_val)
+        median_val[num_valid == 0] = np.nan
+        return median_val
+
+    def __median(self, ordered, num_scans):
+        """Determines the median from the first num_scans entries of an
+        ordered window
+
+        Args:
+
+            ordered (numpy.ndarray): window sorted along its second last axis
+            num_scans (int): number of scans in the window
+
+        Returns:
+
+            median_val (numpy.ndarray): median of each column, in the result
+            dtype
+        """
+        if num_scans%2:
+            median_val = ordered[..., (num_scans + 1)//2 - 1, :]
+        else:
+            median_val_1 = ordered[..., num_scans//2 - 1, :]
+            median_val_2 = ordered[..., (num_scans + 2)//2 - 1, :]
+            median_val = self.__midpoint(median_val_1, median_val_2)
+        return self.__to_result(median_val)
+
+    def __sliding_median(self, stream, out, valid_stream=None):
+        """Determines the median of every full window of num_prev_scans + 1
+        consecutive scans in stream
+
+        Windows are processed in chunks with a median selection network of
+        elementwise minimum and maximum, chunks holding NaN are partitioned
+        instead so that NaN sorts last as in update. Chunks holding invalid
+        returns are sorted and each beam's median taken over its valid
+        returns
+
+        Args:
+
+            stream (numpy.ndarray): (num_prev_scans + T) x N array of scans
+            out (numpy.ndarray): T x N array the medians are written to
+            valid_stream (numpy.ndarray): bool array the shape of stream,
+            True for each valid return, default value is None for no mask
+        """
+        num_rows = self.__num_prev_scans + 1
+        num_windows, num_points = out.shape
+        if self.__network_rows != num_rows:
+            self.__network = _median_network(num_rows)
+            self.__sort_network = _sorting_network(num_rows)
+            self.__network_rows = num_rows
+
+        chunk = max(1, BATCH_CHUNK_ELEMENTS // max(1, num_points))
+        for start in range(0, num_windows, chunk):
+            stop = min(start + chunk, num_windows)
+            block = stream[start:stop + num_rows - 1]
+            if valid_stream is not None:
+                valid = valid_stream[start:stop + num_rows - 1]
+                if not valid.all():
+                    out[start:stop] = self.__masked_window_median(
+                        block, valid, num_rows)
+                    continue
+            if np.isnan(block).any():
+                out[start:stop] = self.__partition_median(block, num_rows)
+                continue
+
+            wires = self.__run_network(block, num_rows, self.__network)
+            if num_rows%2:
+                median_val = wires[(num_rows + 1)//2 - 1]
+            else:
+                median_val_1 = wires[num_rows//2 - 1]
+                median_val_2 = wires[(num_rows + 2)//2 - 1]
+                median_val = self.__midpoint(median_val_1, median_val_2)
+            out[start:stop] = self.__to_result(median_val)
+
+    def __run_network(self, block, num_rows, network):
+        """Applies a comparator network to every window of num_rows
+        consecutive scans in block
+
+        Args:
+
+            block (numpy.ndarray): (num_rows - 1 + T) x N array of scans
+            num_rows (int): number of scans in each window
+            network (list): (low, high) pairs of positions
+
+        Returns:
+
+            wires (list): num_rows T x N arrays, wires[i] holds the value at
+            position i of every window
+        """
+        num_chunk = block.shape[0] - num_rows + 1
+        wires = [block[idx:idx + num_chunk].copy() for idx in range(num_rows)]
+        spare = np.empty((num_chunk, block.shape[1]), dtype=block.dtype)
+        for low, high in network:
+            np.minimum(wires[low], wires[high], out=spare)
+            np.maximum(wires[low], wires[high], out=wires[high])
+            wires[low], spare = spare, wires[low]
+        return wires
+
+    def __partition_median(self, block, num_rows):
+        """Determines the median of every window of num_rows consecutive
+        scans in block by partitioning them
+
+        Args:
+
+            block (numpy.ndarray): (num_rows - 1 + T) x N array of scans
+            num_rows (int): number of scans in each window
+
+        Returns:
+
+            median_block (numpy.ndarray): T x N array of medians
+        """
+        if num_rows%2:
+            kth = [(num_rows + 1)//2 - 1]
+        else:
+            kth = [num_rows//2 - 1, (num_rows + 2)//2 - 1]
+        ordered = np.partition(self.__windows(block, num_rows), kth, axis=1)
+        return self.__median(ordered, num_rows)
+
+    def __masked_window_median(self, block, valid, num_rows):
+        """Determines the median over the valid returns of every window of
+        num_rows consecutive scans in block
+
+        Args:
+
+            block (numpy.ndarray): (num_rows - 1 + T) x N array of scans
+            valid (numpy.ndarray): bool array the shape of block, True for
+            each valid return
+            num_rows (int): number of scans in each window
+
+        Returns:
+
+            median_block (numpy.ndarray): T x N array of medians
+        """
+        # Invalid returns go to the end of each window, in a uint16 history
+        # they already hold the largest value
+        if not self.__fixed_point:
+            block = np.where(valid, block, np.inf).astype(block.dtype)
+        wires = self.__run_network(block, num_rows, self.__sort_network)
+        ordered = np.stack(wires, axis=-2)
+        totals = np.zeros((block.shape[0] + 1, block.shape[1]), dtype=np.intp)
+        np.cumsum(valid, axis=0, out=totals[1:])
+        return self.__masked_median(ordered, totals[num_rows:] -
+                                    totals[:-num_rows])
+
+    def __windows(self, block, num_rows):
+        """Gives a read only view of every window of num_rows consecutive
+        scans in block
+
+        Returns:
+
+            windows (numpy.ndarray): T x num_rows x N view of block
+        """
+        num_windows = block.shape[0] - num_rows + 1
+        row_stride, column_stride = block.strides
+        return np.lib.stride_tricks.as_strided(
+            block, shape=(num_windows, num_rows, block.shape[1]),
+            strides=(row_stride, row_stride, column_stride), writeable=False)
+
+    def __load_window(self, window, valid=None):
+        """Replaces the held scans by up to a full window of scans
+
+        Args:
+
+            window (numpy.ndarray): T x N array of scans in the history
+            dtype, T at most num_prev_scans + 1, oldest scan first
+            valid (numpy.ndarray): bool array the shape of window, True for
+            each valid return, default value is None for no mask
+        """
+        num_rows = window.shape[0]
+        if valid is not None:
+            self.__valid_history[:num_rows] = valid
+            np.sum(valid, axis=0, out=self.__num_valid)
+        self.__history[:num_rows] = window
+        self.__ordered_data[:num_rows] = window
+        self.__ordered_data[:num_rows].sort(axis=0)
+        self.__effective[...] = num_rows
+        self.__head = num_rows
+        self.__num_scans = num_rows
+
+
+class SpatialMedianFilter:
+    """
+    The spatial_median_filter object
+
+    Replaces each measurement by the median of the measurements of the
+    beams within half of window_angle either side of it, which removes
+    spikes seen by single beams. The window holds 2 * half_width + 1 beams,
+    half_width being the number of whole angle_increment steps in half of
+    window_angle. Angles can be in any unit as long as both use the same.
+
+    Each scan is copied once into a padded buffer with half_width beams
+    added at each end, the first and last beam repeated or, with
+    wrap_around, the beams from the other end of a 360 degree scan. Every
+    window is then a shifted view of that buffer, and a median selection
+    network of elementwise minimum and maximum runs over all beams at once.
+    Scans holding NaN are partitioned instead, so that NaN sorts last as in
+    a TemporalMedianFilter.
+
+    With max_deviation only outliers are replaced: measurements further
+    than max_deviation from the median of their window, the rest are kept.
+
+    Attributes:
+
+        window_angle (int or float): angular width of the window, default
+        value is 1.0
+        angle_increment (int or float): angle between neighbouring beams,
+        default value is 0.25
+        wrap_around (bool): treat the first and last beams as neighbours,
+        default value is False
+        max_deviation (int or float): only replace measurements further than
+        this from their median, default value is None to replace all
+        dtype (numpy.dtype): dtype of the results, float64, float32 or
+        float16, default value is float64
+    """
+    def __init__(self, window_angle=1.0, angle_increment=0.25,
+                 wrap_around=False, max_deviation=None, dtype=np.float64):
+        self.__window_angle = window_angle
+        self.__angle_increment = angle_increment
+        self.__wrap_around = wrap_around
+        self.__max_deviation = max_deviation
+        self.__check_args()
+        self.__dtype = _check_dtype(dtype, FLOAT_DTYPES)
+
+        # The tolerance keeps a window_angle that is an exact multiple of
+        # angle_increment from losing a beam to rounding
+        self.__half_width = int(np.floor(
+            window_angle / (2.0 * angle_increment) + 1e-9))
+        self.__network = _median_network(2 * self.__half_width + 1)
+        self.__padded = np.empty((0, 0), dtype=self.__dtype)
+        self.__pad_index = np.empty(0, dtype=np.intp)
+
+    def __check_args(self):
+        self.__check_args_type()
+        self.__check_args_val()
+
+    def __check_args_type(self):
+        """Checks that window_angle, angle_increment and max_deviation are
+        int or float and wrap_around is bool
+
+        Raises:
+
+            TypeError: Invalid type
+        """
+        if not isinstance(self.__window_angle, (float, int)) or \
+                isinstance(self.__window_angle, bool):
+            error_msg = "window_angle must of type int or float, but given: "
+            error_msg += str(type(self.__window_angle))
+            raise TypeError(error_msg)
+
+        if not isinstance(self.__angle_increment, (float, int)) or \
+                isinstance(self.__angle_increment, bool):
+            error_msg = "angle_increment must of type int or float, but "
+            error_msg += "given: " + str(type(self.__angle_increment))
+            raise TypeError(error_msg)
+
+        if not isinstance(self.__wrap_around, bool):
+            error_msg = "wrap_around must of type 'bool', but given '"
+            error_msg += str(type(self.__wrap_around)) + "'"
+            raise TypeError(error_msg)
+
+        if self.__max_deviation is not None and \
+                (not isinstance(self.__max_deviation, (float, int)) or
+                 isinstance(self.__max_deviation, bool)):
+            error_msg = "max_deviation must of type int or float, but given: "
+            error_msg += str(type(self.__max_deviation))
+            raise TypeError(error_msg)
+
+    def __check_args_val(self):
+        """Checks that window_angle and max_deviation are not negative and
+        angle_increment is positive
+
+        Raises:
+
+            ValueError: Invalid value
+        """
+        if self.__window_angle < 0:
+            error_msg = "window_angle must be greater than or equal to zero"
+            raise ValueError(error_msg)
+        elif self.__angle_increment <= 0:
+            error_msg = "angle_increment must be greater than zero"
+            raise ValueError(error_msg)
+        elif self.__max_deviation is not None and self.__max_deviation < 0:
+            error_msg = "max_deviation must be greater than or equal to zero"
+            raise ValueError(error_msg)
+
+    def half_width(self):
+        """Gives the number of beams either side of a beam in its window
+
+        Returns:
+
+            half_width (int): half_width, the window holds
+            2 * half_width + 1 beams
+        """
+        return self.__half_width
+
+    def __pad(self, scan_block):
+        """Copies scans into the padded buffer, with half_width beams added
+        at each end
+
+        Args:
+
+            scan_block (numpy.ndarray): T x N block of scans, N at least 1
+
+        Returns:
+
+            padded (numpy.ndarray): T x (N + 2 * half_width) array in dtype
+        """
+        num_scans, num_points = scan_block.shape
+        half_width = self.__half_width
+        num_padded = num_points + 2 * half_width
+        if self.__pad_index.size != 2 * half_width or \
+                self.__padded.shape[1] != num_padded:
+            # Beam each padding column repeats, as a padded column
+            index = np.arange(-half_width, num_points + half_width)
+            if self.__wrap_around:
+                index %= num_points
+            else:
+                np.clip(index, 0, num_points - 1, out=index)
+            index += half_width
+            self.__pad_index = np.concatenate(
+                [index[:half_width], index[num_points + half_width:]])
+        if self.__padded.shape[0] < num_scans or \
+                self.__padded.shape[1] != num_padded:
+            self.__padded = np.empty((num_scans, num_padded),
+                                     dtype=self.__dtype)
+
+        padded = self.__padded[:num_scans]
+        padded[:, half_width:half_width + num_points] = scan_block
+        if half_width:
+            pad_index = self.__pad_index
+            padded[:, :half_width] = padded[:, pad_index[:half_width]]
+            padded[:, num_points + half_width:] = \
+                padded[:, pad_index[half_width:]]
+        return padded
+
+    def __filter_block(self, scan_block):
+        """Filters every scan in a block of scans
+
+        Args:
+
+            scan_block (numpy.ndarray): T x N block of scans
+
+        Returns:
+
+            filtered (numpy.ndarray): T x N array in dtype
+        """
+        num_points = scan_block.shape[1]
+        if num_points == 0:
+            return np.empty(scan_block.shape, dtype=self.__dtype)
+
+        padded = self.__pad(scan_block)
+        half_width = self.__half_width
+        num_rows = 2 * half_width + 1
+        centre = padded[:, half_width:half_width + num_points]
+        if np.isnan(centre).any():
+            row_stride, column_stride = padded.strides
+            windows = np.lib.stride_tricks.as_strided(
+                padded, shape=(padded.shape[0], num_points, num_rows),
+                strides=(row_stride, column_stride, column_stride),
+                writeable=False)
+            median_val = np.partition(windows, half_width, axis=2)
+            median_val = median_val[..., half_width]
+        else:
+            wires = [padded[:, idx:idx + num_points].copy()
+                     for idx in range(num_rows)]
+            spare = np.empty_like(wires[0])
+            for low, high in self.__network:
+                np.minimum(wires[low], wires[high], out=spare)
+                np.maximum(wires[low], wires[high], out=wires[high])
+                wires[low], spare = spare, wires[low]
+            median_val = wires[half_width]
+
+        if self.__max_deviation is None:
+            return median_val
+        outlier = np.abs(centre - median_val) > self.__max_deviation
+        return np.where(outlier, median_val, centre)
+
+    def _output_dtype(self):
+        """Gives the dtype of the results of update, so that a FilterPipeline
+        passes them to the next stage without converting them
+
+        Returns:
+
+            dtype (numpy.dtype): dtype of the results
+        """
+        return self.__dtype
+
+    def update(self, scan, out=None):
+        """Replaces each measurement in scan by the median of its window
+
+        By default scan is left untouched and a new list is returned. If out
+        is given the result is written into it and out itself is returned,
+        so no list is built. Passing the scan as out filters it in place.
+
+        Args:
+
+            scan (list or numpy.ndarray): list or numpy.ndarray of values
+            out (numpy.ndarray): optional array with the same number of
+            elements as scan that receives the result, default value is None
+
+        Raises:
+
+            TypeError: scan or out is the wrong type
+            ValueError: out does not have the same number of elements as scan
+
+        Returns:
+
+            scan_list (list): a list of filtered measurements, or out if given
+        """
+        if not isinstance(scan, (list, np.ndarray)):
+            error_msg = "Arg wrong type, expected 'list' or 'numpy.ndarray'"
+            raise TypeError(error_msg)
+        else:
+            scan_array = np.asarray(scan)
+            element_count = scan_array.size
+            scan_array = scan_array.reshape(1, element_count)
+
+        if out is not None:
+            if not isinstance(out, np.ndarray):
+                error_msg = "out wrong type, expected 'numpy.ndarray'"
+                raise TypeError(error_msg)
+            elif out.size != element_count:
+                error_msg = "out must have the same number of elements as scan"
+                raise ValueError(error_msg)
+
+        filtered = self.__filter_block(scan_array)[0]
+        if out is None:
+            return filtered.tolist()
+        out[...] = filtered.reshape(out.shape)
+        return out
+
+    def update_batch(self, scans, out=None):
+        """Applies update to every scan in a block of scans in one call
+
+        Args:
+
+            scans (list or numpy.ndarray): T x N block with one scan per row
+            out (numpy.ndarray): optional T x N array that receives the
+            result, passing scans filters them in place, default value is None
+
+        Raises:
+
+            TypeError: scans or out is the wrong type
+            ValueError: scans is not 2D or out is not the same shape as scans
+
+        Returns:
+
+            scan_block (numpy.ndarray): T x N array of filtered measurements,
+            out if given
+        """
+        scan_block = _to_scan_block(scans)
+        if out is None:
+            out = np.empty(scan_block.shape, dtype=self.__dtype)
+        elif not isinstance(out, np.ndarray):
+            error_msg = "out wrong type, expected 'numpy.ndarray'"
+            raise TypeError(error_msg)
+        elif out.shape != scan_block.shape:
+            error_msg = "out must be the same shape as scans"
+            raise ValueError(error_msg)
+
+        # Chunks of scans small enough that the padded buffer and the
+        # network's wires stay in cache
+        num_scans, num_points = scan_block.shape
+        chunk = max(1, BATCH_CHUNK_ELEMENTS // max(1, num_points))
+        for start in range(0, num_scans, chunk):
+            stop = min(start + chunk, num_scans)
+            out[start:stop] = self.__filter_block(scan_block[start:stop])
+        return out
+
+
+class FilterPipeline:
+    """
+    The filter_pipeline object
+
+    Applies a sequence of filters to each scan, passing numpy.ndarray
+    buffers between the stages rather than lists, each in the dtype of the
+    results of the stage that writes it. A RangeFilter directly
+    followed by a TemporalMedianFilter writes the clamped scan straight into
+    the median filter's history.
+
+    Attributes:
+
+        filters (list): RangeFilter, TemporalMedianFilter and
+        SpatialMedianFilter objects, applied in the given order
+    """
+    def __init__(self, filters):
+        self.__filters = filters
+        self.__check_args()
+        self.__filters = list(filters)
+        self.__buffers = [np.empty(0, dtype=stage._output_dtype())
+                          for stage in self.__filters]
+
+    def __check_args(self):
+        """Checks that filters is a non empty sequence of filters
+
+        Raises:
+
+            TypeError: Invalid type
+            ValueError: Invalid value
+        """
+        if not isinstance(self.__filters, (list, tuple)):
+            error_msg = "filters must of type 'list' or 'tuple', but given '"
+            error_msg += str(type(self.__filters)) + "'"
+            raise TypeError(error_msg)
+
+        for stage in self.__filters:
+            if not isinstance(stage, (RangeFilter, TemporalMedianFilter,
+                                      SpatialMedianFilter)):
+                error_msg = "filters must be RangeFilter, "
+                error_msg += "TemporalMedianFilter or SpatialMedianFilter "
+                error_msg += "objects, but given '"
+                error_msg += str(type(stage)) + "'"
+                raise TypeError(error_msg)
+
+        if len(self.__filters) == 0:
+            raise ValueError("filters must contain at least one filter")
+
+    def __buffer(self, idx, num_points):
+        """Gives the output buffer of stage idx for scans of num_points
+
+        Args:
+
+            idx (int): index of the stage
+            num_points (int): number of measurements in the scan
+
+        Returns:
+
+            buffer (numpy.ndarray): 1D vector of num_points values in the
+            dtype of the stage's results
+        """
+        if self.__buffers[idx].size != num_points:
+            self.__buffers[idx] = np.empty(
+                num_points, dtype=self.__filters[idx]._output_dtype())
+        return self.__buffers[idx]
+
+    def filters(self):
+        """Gives the filters of the pipeline
+
+        Returns:
+
+            filters (list): the filters, in the order they are applied
+        """
+        return list(self.__filters)
+
+    def select_beams(self, beams):
+        """Changes the beams of the next scans in every TemporalMedianFilter
+        of the pipeline, see TemporalMedianFilter.select_beams
+
+        Args:
+
+            beams (list or numpy.ndarray): for each beam of the next scans,
+            the index of the held beam it continues, or -1 for a new beam
+
+        Raises:
+
+            TypeError: beams is not a list or numpy.ndarray of integers
+            ValueError: beams is rejected by a TemporalMedianFilter, the
+            pipeline is then left unchanged
+        """
+        stages = [stage for stage in self.__filters
+                  if isinstance(stage, TemporalMedianFilter)]
+        # Every stage is checked first, so that a rejected beams leaves all
+        # of them unchanged
+        for stage in stages:
+            stage._check_beams(beams)
+        for stage in stages:
+            stage.select_beams(beams)
+
+    def update(self, scan, out=None):
+        """Passes scan through every filter in turn
+
+        Args:
+
+            scan (list or numpy.ndarray): a set of measurements
+            out (numpy.ndarray): optional array with the same number of
+            elements as scan that receives the result, default value is None
+
+        Raises:
+
+            TypeError: scan or out is the wrong type
+            ValueError: the number of datapoints in scan not consistent with
+            previous scans, or out does not have the same number of elements
+            as scan
+
+        Returns:
+
+            scan_list (list): the filtered scan, or out if given
+        """
+        if not isinstance(scan, (list, np.ndarray)):
+            error_msg = "argument wrong type, expected list or numpy.ndarray"
+            raise TypeError(error_msg)
+        else:
+            scan_array = np.asarray(scan)
+            element_count = scan_array.size
+            scan_array = scan_array.reshape(element_count)
+
+        if out is not None:
+            if not isinstance(out, np.ndarray):
+                error_msg = "out wrong type, expected 'numpy.ndarray'"
+                raise TypeError(error_msg)
+            elif out.size != element_count:
+                error_msg = "out must have the same number of elements as scan"
+                raise ValueError(error_msg)
+
+        num_stages = len(self.__filters)
+        for idx, stage in enumerate(self.__filters):
+            target = None
+            if idx + 1 < num_stages:
+                next_stage = self.__filters[idx + 1]
+                if isinstance(stage, RangeFilter) and \
+                        isinstance(next_stage, TemporalMedianFilter):
+                    target = next_stage._input_buffer(element_count)
+            elif out is not None:
+                target = out
+            if target is None:
+                target = self.__buffer(idx, element_count)
+            scan_array = stage.update(scan_array, out=target)
+            scan_array = scan_array.reshape(element_count)
+
+        if out is not None:
+            return out
+
+        scan_list = scan_array.tolist()
+        return scan_list
+
+    def update_batch(self, scans):
+        """Passes every scan in a block of scans through every filter in
+        turn, leaving each filter in the same state as calling update on
+        each scan
+
+        Args:
+
+            scans (list or numpy.ndarray): T x N block with one scan per row
+
+        Raises:
+
+            TypeError: scans is the wrong type
+            ValueError: scans is not 2D or the number of datapoints in the
+            scans not consistent with previous scans
+
+        Returns:
+
+            scan_block (numpy.ndarray): T x N array of filtered scans
+        """
+        scan_block = _to_scan_block(scans)
+        owned = False
+        for stage in self.__filters:
+            if isinstance(stage, (RangeFilter, SpatialMedianFilter)) and \
+                    owned:
+                # The block is already a copy, filter it in place
+                scan_block = stage.update_batch(scan_block, out=scan_block)
+            else:
+                scan_block = stage.update_batch(scan_block)
+            owned = True
+        return scan_block
+
+
+class RegionOfInterest:
+    """
+    The region_of_interest object
+
+    Selects the beams of a scan to filter: the beams in any of the index
+    ranges or angular sectors, every beam if neither is given, of which
+    only the beams whose index is a multiple of stride are kept.
+
+    Beam i is at angle_min + i * angle_increment degrees. A sector (start,
+    stop) holds the beams from start up to but excluding stop, angles are
+    taken modulo 360 so (-30, 30) is the forward sector of a scan from 0 to
+    360 degrees as well as of one from -180 to 180 degrees.
+
+    Attributes:
+
+        ranges (list): (start, stop) pairs of beam indices, stop excluded,
+        default value is None
+        sectors (list): (start, stop) pairs of angles in degrees, default
+        value is None
+        stride (int): keep every stride-th beam, default value is 1
+        angle_min (int or float): angle of the first beam in degrees,
+        default value is 0.0
+        angle_increment (int or float): angle between neighbouring beams in
+        degrees, default value is 0.25
+    """
+    def __init__(self, ranges=None, sectors=None, stride=1, angle_min=0.0,
+                 angle_increment=0.25):
+        self.__ranges = ranges
+        self.__sectors = sectors
+        self.__stride = stride
+        self.__angle_min = angle_min
+        self.__angle_increment = angle_increment
+        self.__check_args()
+        self.__ranges = [tuple(pair) for pair in ranges or []]
+        self.__sectors = [tuple(pair) for pair in sectors or []]
+
+    def __check_args(self):
+        self.__check_args_type()
+        self.__check_args_val()
+
+    def __check_args_type(self):
+        """Checks that ranges and sectors are lists or tuples of pairs of int
+        or of int or float, stride is int and angle_min and angle_increment
+        are int or float
+
+        Raises:
+
+            TypeError: Invalid type
+        """
+        for name, pairs, kinds in [("ranges", self.__ranges, (int,)),
+                                   ("sectors", self.__sectors, (int, float))]:
+            if pairs is None:
+                continue
+            elif not isinstance(pairs, (list, tuple)):
+                error_msg = name + " must of type 'list' or 'tuple', but "
+                error_msg += "given '" + str(type(pairs)) + "'"
+                raise TypeError(error_msg)
+            for pair in pairs:
+                if not isinstance(pair, (list, tuple)) or len(pair) != 2 or \
+                        not all(isinstance(value, kinds) and
+                                not isinstance(value, bool)
+                                for value in pair):
+                    error_msg = name + " must hold (start, stop) pairs of "
+                    error_msg += " or ".join(kind.__name__ for kind in kinds)
+                    error_msg += ", but given '" + str(pair) + "'"
+                    raise TypeError(error_msg)
+
+        if not isinstance(self.__stride, int) or \
+                isinstance(self.__stride, bool):
+            error_msg = "stride must of type 'int', but given '"
+            error_msg += str(type(self.__stride)) + "'"
+            raise TypeError(error_msg)
+
+        for name, value in [("angle_min", self.__angle_min),
+                            ("angle_increment", self.__angle_increment)]:
+            if not isinstance(value, (float, int)) or \
+                    isinstance(value, bool):
+                error_msg = name + " must of type int or float, but given: "
+                error_msg += str(type(value))
+                raise TypeError(error_msg)
+
+    def __check_args_val(self):
+        """Checks that ranges are not negative and do not end before they
+        start, sectors are at most 360 degrees wide and do not end before
+        they start, and stride and angle_increment are positive
+
+        Raises:
+
+            ValueError: Invalid value
+        """
+        for start, stop in self.__ranges or []:
+            if start < 0 or stop < start:
+                error_msg = "ranges must hold 0 <= start <= stop, but given "
+                error_msg += str((start, stop))
+                raise ValueError(error_msg)
+        for start, stop in self.__sectors or []:
+            if not 0 <= stop - start <= 360:
+                error_msg = "sectors must hold start <= stop <= start + 360, "
+                error_msg += "but given " + str((start, stop))
+                raise ValueError(error_msg)
+        if self.__stride <= 0:
+            raise ValueError("stride must be greater than zero")
+        elif self.__angle_increment <= 0:
+            raise ValueError("angle_increment must be greater than zero")
+
+    def beams(self, num_points):
+        """Gives the beams selected in scans of num_points measurements
+
+        Args:
+
+            num_points (int): number of measurements in each scan
+
+        Returns:
+
+            beams (numpy.ndarray): 1D vector of the selected beam indices in
+            increasing order
+        """
+        selected = np.ones(num_points, dtype=bool)
+        if self.__ranges or self.__sectors:
+            selected[...] = False
+        for start, stop in self.__ranges:
+            selected[start:stop] = True
+        if self.__sectors:
+            angles = self.__angle_min + \
+                self.__angle_increment * np.arange(num_points)
+            for start, stop in self.__sectors:
+                # The tolerance keeps a beam on the start of a sector from
+                # being lost to rounding
+                offset = np.mod(angles - start + 1e-9, 360.0)
+                if stop - start >= 360:
+                    selected[...] = True
+                else:
+                    selected |= offset < stop - start
+        selected[np.arange(num_points) % self.__stride != 0] = False
+        return np.flatnonzero(selected)
+
+
+class RegionOfInterestFilter:
+    """
+    The region_of_interest_filter object
+
+    Applies a filter to the beams of a RegionOfInterest only, so that a
+    TemporalMedianFilter holds and takes the medians of those beams only.
+    The results cover the selected beams, or with scatter a full scan in
+    which the other beams hold fill_value, or their measurement unfiltered
+    if fill_value is None.
+
+    The region can be changed with change_region between scans, the
+    TemporalMedianFilter objects then keep the held scans of the beams that
+    stay in the region, and beams that join it start without held scans.
+    The beams are selected again whenever the number of measurements of
+    the scans changes.
+
+    The selected beams are passed on as one scan, beams either side of a
+    gap in the region or of the seam of a wrapped sector become neighbours.
+    A SpatialMedianFilter, which takes the median across neighbouring
+    beams, is therefore not accepted as the stage or in its pipeline.
+
+    Attributes:
+
+        stage: RangeFilter, TemporalMedianFilter or FilterPipeline object
+        without a SpatialMedianFilter, applied to the selected beams
+        region (RegionOfInterest): the beams to filter
+        scatter (bool): give full scans rather than the selected beams,
+        default value is False
+        fill_value (int or float): value of the beams outside the region
+        with scatter, default value is NaN, None for the unfiltered
+        measurement
+    """
+    def __init__(self, stage, region, scatter=False, fill_value=np.nan):
+        self.__stage = stage
+        self.__region = region
+        self.__scatter = scatter
+        self.__fill_value = fill_value
+        self.__check_args()
+        self.__N = 0    # num of data points in the scans
+        self.__beams = np.empty(0, dtype=np.intp)
+
+    def __check_args(self):
+        """Checks that stage is a filter without a SpatialMedianFilter,
+        region is a RegionOfInterest, scatter is bool and fill_value is
+        None, int or float
+
+        Raises:
+
+            TypeError: Invalid type
+        """
+        if not isinstance(self.__stage, (RangeFilter, TemporalMedianFilter,
+                                          FilterPipeline)) or \
+                (isinstance(self.__stage, FilterPipeline) and
+                 any(isinstance(stage, SpatialMedianFilter)
+                     for stage in self.__stage.filters())):
+            error_msg = "stage must be a RangeFilter, TemporalMedianFilter "
+            error_msg += "or FilterPipeline object without a "
+            error_msg += "SpatialMedianFilter, but given '"
+            error_msg += str(type(self.__stage)) + "'"
+            raise TypeError(error_msg)
+
+        self.__check_region(self.__region)
+
+        if not isinstance(self.__scatter, bool):
+            error_msg = "scatter must of type 'bool', but given '"
+            error_msg += str(type(self.__scatter)) + "'"
+            raise TypeError(error_msg)
+
+        if self.__fill_value is not None and \
+                (not isinstance(self.__fill_value, (float, int)) or
+                 isinstance(self.__fill_value, bool)):
+            error_msg = "fill_value must of type int or float, but given: "
+            error_msg += str(type(self.__fill_value))
+            raise TypeError(error_msg)
+
+    def __check_region(self, region):
+        """Checks that region is a RegionOfInterest
+
+        Raises:
+
+            TypeError: Invalid type
+        """
+        if not isinstance(region, RegionOfInterest):
+            error_msg = "region must of type 'RegionOfInterest', but given '"
+            error_msg += str(type(region)) + "'"
+            raise TypeError(error_msg)
+
+    def beams(self):
+        """Gives the beams filtered in the current scans
+
+        Returns:
+
+            beams (numpy.ndarray): 1D vector of the selected beam indices,
+            empty before the first scan
+        """
+        return self.__beams.copy()
+
+    def change_region(self, region):
+        """Changes the beams filtered from the next scan on. The held scans
+        of the beams that stay in the region are kept
+
+        Args:
+
+            region (RegionOfInterest): the beams to filter
+
+        Raises:
+
+            TypeError: Invalid type
+            ValueError: the stage cannot change its beams, with the
+            histogram engine no beam can join the region while scans are
+            held. The region is then left unchanged
+        """
+        self.__check_region(region)
+        if self.__N == 0:
+            self.__region = region
+            return
+
+        old_beams = self.__beams
+        beams = region.beams(self.__N)
+        source = np.full(beams.size, -1, dtype=np.intp)
+        if old_beams.size:
+            pos = np.minimum(np.searchsorted(old_beams, beams),
+                             old_beams.size - 1)
+            found = old_beams[pos] == beams
+            source[found] = pos[found]
+        if isinstance(self.__stage, (TemporalMedianFilter, FilterPipeline)):
+            self.__stage.select_beams(source)
+        self.__region = region
+        self.__beams = beams
+
+    def __select(self, num_points):
+        """Gives the beams selected in scans of num_points measurements
+
+        Returns:
+
+            beams (numpy.ndarray): 1D vector of the selected beam indices
+        """
+        if num_points == self.__N:
+            return self.__beams
+        return self.__region.beams(num_points)
+
+    def __fill(self, scan_array, out):
+        """Fills out with the values of the beams outside the region
+
+        Args:
+
+            scan_array (numpy.ndarray): the unfiltered measurements
+            out (numpy.ndarray): array the shape of scan_array
+        """
+        if self.__fill_value is None:
+            out[...] = scan_array
+        else:
+            out[...] = self.__fill_value
+
+    def update(self, scan, out=None):
+        """Filters the beams of scan in the region
+
+        Args:
+
+            scan (list or numpy.ndarray): a set of measurements
+            out (numpy.ndarray): optional array that receives the result,
+            with as many elements as scan with scatter, otherwise as beams
+            in the region, default value is None
+
+        Raises:
+
+            TypeError: scan or out is the wrong type
+            ValueError: the number of beams in the region not consistent
+            with previous scans, or out does not have the number of
+            elements of the result
+
+        Returns:
+
+            scan_list (list): the filtered beams, or the full scan with
+            scatter, or out if given
+        """
+        if not isinstance(scan, (list, np.ndarray)):
+            error_msg = "argument wrong type, expected list or numpy.ndarray"
+            raise TypeError(error_msg)
+        else:
+            scan_array = np.asarray(scan)
+            element_count = scan_array.size
+            scan_array = scan_array.reshape(element_count)
+
+        beams = self.__select(element_count)
+        if out is not None:
+            if not isinstance(out, np.ndarray):
+                error_msg = "out wrong type, expected 'numpy.ndarray'"
+                raise TypeError(error_msg)
+            elif self.__scatter and out.size != element_count:
+                error_msg = "out must have the same number of elements as scan"
+                raise ValueError(error_msg)
+            elif not self.__scatter and out.size != beams.size:
+                error_msg = "out must have as many elements as beams in the "
+                error_msg += "region"
+                raise ValueError(error_msg)
+
+        result = np.empty(beams.size)
+        if out is not None and not self.__scatter:
+            result = out
+        self.__stage.update(scan_array.take(beams), out=result)
+        self.__N = element_count
+        self.__beams = beams
+
+        if self.__scatter:
+            full = np.empty(element_count)
+            if out is not None:
+                full = out.reshape(element_count)
+            self.__fill(scan_array, full)
+            full[beams] = result.reshape(beams.size)
+            result = full
+        if out is not None:
+            return out
+        return result.tolist()
+
+    def update_batch(self, scans):
+        """Filters the beams in the region of every scan in a block of scans
+
+        Args:
+
+            scans (list or numpy.ndarray): T x N block with one scan per row
+
+        Raises:
+
+            TypeError: scans is the wrong type
+            ValueError: scans is not 2D or the number of beams in the region
+            not consistent with previous scans
+
+        Returns:
+
+            scan_block (numpy.ndarray): T x B array of the filtered beams, B
+            the number of beams in the region, or T x N with scatter
+        """
+        scan_block = _to_scan_block(scans)
+        num_points = scan_block.shape[1]
+        beams = self.__select(num_points)
+        median_block = self.__stage.update_batch(scan_block.take(beams,
+                                                                  axis=1))
+        self.__N = num_points
+        self.__beams = beams
+        if not self.__scatter:
+            return median_block
+
+        full_block = np.empty(scan_block.shape, dtype=median_block.dtype)
+        self.__fill(scan_block, full_block)
+        full_block[:, beams] = median_block
+        return full_block
+
+
+class RangeFilterBank:
     """
-    The range_filter object
+    The range_filter_bank object
+
+    Applies a RangeFilter to the scans of S sensors in one vectorized pass.
+    Each sensor can have its own min_range and max_range.
 
     Attributes:
 
-        min_range (int): used to determine if a measurement is below this value,
-        default value is set to 0.03
-        max_range (int): used to determine if a measurement is above this value,
-        default value is set to 50.0
+        min_range (int, float or list): min_range of every sensor, or a list
+        with the min_range of each sensor, default value is 0.03
+        max_range (int, float or list): max_range of every sensor, or a list
+        with the max_range of each sensor, default value is 50.0
+        dtype (numpy.dtype): dtype of the results, float64, float32 or
+        float16, default value is float64
     """
-    def __init__(self,min_range=0.03,max_range=50.0):
+    def __init__(self, min_range=0.03, max_range=50.0, dtype=np.float64):
         self.__min_range = min_range
         self.__max_range = max_range
         self.__check_args()
+        self.__dtype = _check_dtype(dtype, FLOAT_DTYPES)
 
     def __check_args(self):
-        self.__check_args_type()
-        self.__check_args_val()
-
-    def __check_args_type(self):
-        """Checks that min_range and max_range are int or float types
+        """Checks each sensor's min_range and max_range as RangeFilter does
+        and builds the per sensor limits
 
         Raises:
 
             TypeError: Invalid type
+            ValueError: Invalid value or lists of different lengths
         """
-        if not isinstance(self.__min_range, (float, int)):
-            error_msg = "min_range must of type int or float, but given: "
-            error_msg += str(type(self.__min_range))
-            raise TypeError(error_msg)
-        elif not isinstance(self.__max_range, (float, int)):
-            error_msg = "max_range must of type int or float, but given: "
-            error_msg += str(type(self.__max_range))
-            raise TypeError(error_msg)
+        min_list = isinstance(self.__min_range, (list, tuple))
+        max_list = isinstance(self.__max_range, (list, tuple))
+        if min_list and max_list and \
+                len(self.__min_range) != len(self.__max_range):
+            error_msg = "min_range and max_range must have the same length"
+            raise ValueError(error_msg)
 
-        if isinstance(self.__min_range, bool):
-            error_msg = "min_range must of type int or float, but given: "
-            error_msg += str(type(self.__min_range))
-            raise TypeError(error_msg)
-        elif isinstance(self.__max_range, bool):
-            error_msg = "max_range must of type int or float, but given: "
-            error_msg += str(type(self.__max_range))
-            raise TypeError(error_msg)
+        if min_list:
+            self.__num_sensors = len(self.__min_range)
+        elif max_list:
+            self.__num_sensors = len(self.__max_range)
+        else:
+            self.__num_sensors = None
 
-    def __check_args_val(self):
-        """Checks that min_range and max_range are valid and logical values
+        count = self.__num_sensors if self.__num_sensors is not None else 1
+        min_ranges = self.__min_range if min_list else [self.__min_range]*count
+        max_ranges = self.__max_range if max_list else [self.__max_range]*count
+        for min_range, max_range in zip(min_ranges, max_ranges):
+            RangeFilter(min_range, max_range)
+
+        # Limits as columns so they broadcast over each sensor's row
+        self.__min_column = np.array(min_ranges, dtype=float).reshape(-1, 1)
+        self.__max_column = np.array(max_ranges, dtype=float).reshape(-1, 1)
+
+    def change_range(self, min_range, max_range):
+        """Changes the limits of every sensor, given as in the constructor.
+        The limits are checked and rebuilt before the next update uses them
 
         Raises:
 
-            ValueError: Invalid value
+            TypeError: Invalid type
+            ValueError: Invalid value or lists of different lengths, the
+            limits are then left unchanged
         """
-        if self.__min_range < 0:
-            error_msg = "min_range must be greater than or equal to zero"
-            raise ValueError(error_msg)
-        elif self.__max_range < 0:
-            error_msg = "max_range must be greater than or equal to zero"
+        old_state = (self.__min_range, self.__max_range, self.__num_sensors,
+                     self.__min_column, self.__max_column)
+        self.__min_range = min_range
+        self.__max_range = max_range
+        try:
+            self.__check_args()
+        except (TypeError, ValueError):
+            (self.__min_range, self.__max_range, self.__num_sensors,
+             self.__min_column, self.__max_column) = old_state
+            raise
+
+    def __check_num_sensors(self, num_sensors):
+        """Checks scans for num_sensors sensors match the given limits
+
+        Raises:
+
+            ValueError: number of sensors not consistent
+        """
+        if self.__num_sensors is not None and \
+                num_sensors != self.__num_sensors:
+            error_msg = "expected scans of " + str(self.__num_sensors)
+            error_msg += " sensors, but given " + str(num_sensors)
             raise ValueError(error_msg)
-        elif self.__max_range < self.__min_range:
-            error_msg = "max_range must be greater than or equal to min_range"
+
+    def update(self, scans, out=None):
+        """Replaces measurements in each sensor's scan by its min_range or
+        max_range if measurement below or above them respectively
+
+        Args:
+
+            scans (list or numpy.ndarray): one scan per sensor, as an S x N
+            array or a list of S scans of possibly different lengths
+            out (numpy.ndarray): optional S x N array that receives the
+            result, rows of shorter scans are padded, default value is None
+
+        Raises:
+
+            TypeError: scans or out is the wrong type
+            ValueError: number of sensors not consistent, or out is not the
+            shape of the padded scans
+
+        Returns:
+
+            scan_lists (list): S lists of updated measurements, or out if given
+        """
+        frame, beam_counts = _to_sensor_frame(scans)
+        self.__check_num_sensors(frame.shape[0])
+        if out is None:
+            result = np.empty(frame.shape, dtype=self.__dtype)
+            np.clip(frame, self.__min_column, self.__max_column, out=result)
+            return _to_sensor_lists(result, beam_counts)
+
+        if not isinstance(out, np.ndarray):
+            error_msg = "out wrong type, expected 'numpy.ndarray'"
+            raise TypeError(error_msg)
+        elif out.shape != frame.shape:
+            error_msg = "out must be the same shape as the padded scans"
             raise ValueError(error_msg)
 
-    def change_min_range(self, min_range):
-        self.__check_args()
-        self.__min_range = min_range
+        np.clip(frame, self.__min_column, self.__max_column, out=out)
+        return out
 
-    def change_max_range(self, max_range):
-        self.__checkArgs()
-        self.__max_range = max_range
+    def update_batch(self, scans):
+        """Applies update to a block of T frames in one call
 
-    def update(self,scan):
-        """Replaces measurements in scan by min_range or max_range if
-        measurement below or above them respectively
+        Args:
+
+            scans (list or numpy.ndarray): T x S x N block with one frame of
+            S scans per row
+
+        Raises:
+
+            TypeError: scans is the wrong type
+            ValueError: scans is not 3D or number of sensors not consistent
+
+        Returns:
+
+            scan_block (numpy.ndarray): T x S x N array of updated measurements
+        """
+        scan_block = _to_frame_block(scans)
+        self.__check_num_sensors(scan_block.shape[1])
+        result = np.empty(scan_block.shape, dtype=self.__dtype)
+        np.clip(scan_block, self.__min_column, self.__max_column, out=result)
+        return result
+
+
+class TemporalMedianFilterBank:
+    """
+    The temporal_median_filter_bank object
+
+    Applies a TemporalMedianFilter to the scans of S sensors in one
+    vectorized pass, giving the same results as S separate filters. The
+    first frame sets the number of sensors and each sensor's number of
+    measurements. Scans with fewer measurements than the longest are
+    padded, so the histories of all sensors are held as the columns of a
+    single contiguous circular history.
+
+    Attributes:
+
+        num_prev_scans (int): used to store that many previous scans of each
+        sensor, default value is 3
+        dtype (numpy.dtype): dtype of the history and results as for a
+        TemporalMedianFilter, default value is float64
+    """
+    def __init__(self, num_prev_scans=3, dtype=np.float64):
+        self.__num_prev_scans = num_prev_scans
+        self.__filter = TemporalMedianFilter(num_prev_scans, dtype=dtype)
+        self.__result_dtype = _result_dtype(dtype)
+        self.__beam_counts = None
+        self.__result = np.empty((0, 0))
+
+    def change_num_prev_scans(self, num_prev_scans):
+        """Changes the number of previous scans of every sensor, keeping the
+        most recent scans held as TemporalMedianFilter.change_num_prev_scans
+        does
+
+        Raises:
+
+            TypeError: Invalid type
+            ValueError: Invalid value, num_prev_scans is then left unchanged
+        """
+        self.__filter.change_num_prev_scans(num_prev_scans)
+        self.__num_prev_scans = num_prev_scans
+
+    def __check_frame(self, beam_counts):
+        """Sets the beam counts from the first frame and checks every later
+        frame against them
 
         Args:
 
-            scan (list or numpy.ndarray): list or numpy.ndarray of values
+            beam_counts (list): number of measurements of each sensor's scan
 
         Raises:
 
-            TypeError: scan is the wrong type
-            ValueError: scan is a multidimensional list or numpy.ndarray not a
-            single vector
+            ValueError: number of sensors or data points not consistent
+        """
+        if self.__beam_counts is None or self.__num_prev_scans == 0:
+            self.__beam_counts = beam_counts
+        elif len(beam_counts) != len(self.__beam_counts):
+            error_msg = "expected scans of " + str(len(self.__beam_counts))
+            error_msg += " sensors, but given " + str(len(beam_counts))
+            raise ValueError(error_msg)
+        elif beam_counts != self.__beam_counts:
+            raise ValueError("number of data points not consistent")
+
+    def update(self, scans, out=None):
+        """Determines the median of each sensor's current scan with its
+        num_prev_scans
+
+        Args:
+
+            scans (list or numpy.ndarray): one scan per sensor, as an S x N
+            array or a list of S scans of possibly different lengths
+            out (numpy.ndarray): optional S x N array that receives the
+            result, rows of shorter scans are padded, default value is None
+
+        Raises:
+
+            TypeError: scans or out is the wrong type
+            ValueError: number of sensors or data points not consistent with
+            previous frames, or out is not the shape of the padded scans
 
         Returns:
 
-            scan_list (list): a list of updated measurements
+            median_lists (list): S lists with each sensor's median values,
+            or out if given
         """
+        frame, beam_counts = _to_sensor_frame(scans)
+        if out is not None:
+            if not isinstance(out, np.ndarray):
+                error_msg = "out wrong type, expected 'numpy.ndarray'"
+                raise TypeError(error_msg)
+            elif out.shape != frame.shape:
+                error_msg = "out must be the same shape as the padded scans"
+                raise ValueError(error_msg)
+        self.__check_frame(beam_counts)
 
-        # Convert the data to an numpy.ndarray and reszie to ensure it
-        # is a 1D vector
-        if not isinstance(scan, (list, np.ndarray)):
-            error_msg = "Arg wrong type, expected 'list' or 'numpy.ndarray'"
-            raise TypeError(error_msg)
+        # All sensors are the columns of a single filter
+        if out is None:
+            if self.__result.shape != frame.shape:
+                self.__result = np.empty(frame.shape,
+                                         dtype=self.__result_dtype)
+            result = self.__result
         else:
-            scan_array = np.asarray(scan)
-            element_count = scan_array.size
-            scan_array.shape = (element_count)
+            result = out
+        self.__filter.update(frame.reshape(frame.size), out=result)
 
-        for index in range(scan_array.size):
-            if scan_array[index] < self.__min_range:
-                scan_array[index] = self.__min_range
-            elif scan_array[index] > self.__max_range:
-                scan_array[index] = self.__max_range
+        if out is not None:
+            return out
+        return _to_sensor_lists(result, beam_counts)
 
-        scan_list = scan_array.tolist()
-        return scan_list
+    def update_batch(self, scans):
+        """Determines the median of each sensor's scans in a block of T
+        frames, continuing from the scans already held
 
-class TemporalMedianFilter:
+        Args:
+
+            scans (list or numpy.ndarray): T x S x N block with one frame of
+            S scans per row
+
+        Raises:
+
+            TypeError: scans is the wrong type
+            ValueError: scans is not 3D or the number of sensors or data
+            points not consistent with previous frames
+
+        Returns:
+
+            median_block (numpy.ndarray): T x S x N array with the median
+            values of each sensor's scans
+        """
+        scan_block = _to_frame_block(scans)
+        num_frames, num_sensors, num_points = scan_block.shape
+        beam_counts = [num_points] * num_sensors
+        if self.__beam_counts is not None and \
+                len(self.__beam_counts) == num_sensors and \
+                max(self.__beam_counts + [0]) == num_points:
+            # Frames padded to the longest scan of the bank
+            beam_counts = self.__beam_counts
+        if num_frames:
+            self.__check_frame(beam_counts)
+
+        median_block = self.__filter.update_batch(
+            scan_block.reshape(num_frames, num_sensors * num_points))
+        return median_block.reshape(scan_block.shape)
+
+
+def _shared_memory():
+    """Imports multiprocessing.shared_memory on first use
+
+    Returns:
+
+        shared_memory (module): the module, None before Python 3.8 where
+        ShardedTemporalMedianFilter runs in a single process
     """
-    The temporal_median_filter object
+    try:
+        from multiprocessing import shared_memory
+    except ImportError:
+        return None
+    return shared_memory
+
+
+def _attach_segment(name):
+    """Attaches to a shared memory segment created by another process,
+    leaving it to the resource tracker of the process that created it
+
+    Args:
+
+        name (str): name of the segment
+
+    Returns:
+
+        segment (SharedMemory): the attached segment
+    """
+    shared_memory = _shared_memory()
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 always tracks. A worker that shares its parent's
+        # tracker, as forked workers do, must not unregister the segment,
+        # that would drop the parent's own registration. A tracker of the
+        # worker's own would unlink the segment when the worker exits
+        from multiprocessing import resource_tracker
+        own_tracker = resource_tracker._resource_tracker._fd is None
+        segment = shared_memory.SharedMemory(name=name)
+        if own_tracker:
+            resource_tracker.unregister(segment._name, "shared_memory")
+        return segment
+
+
+def _shard_layout(shape, dtype):
+    """Gives the layout of a shared memory segment of a
+    ShardedTemporalMedianFilter, a scans array in the history dtype
+    followed by a medians array in the result dtype
+
+    Args:
+
+        shape (tuple): shape of each array
+        dtype (numpy.dtype): dtype of the filter's history
+
+    Returns:
+
+        offset (int): offset of the medians array in bytes
+        size (int): size of the segment in bytes
+    """
+    count = int(np.prod(shape))
+    offset = _align(count * np.dtype(dtype).itemsize)
+    return offset, offset + count * _result_dtype(dtype).itemsize
+
+
+def _shard_arrays(buffer, shape, dtype):
+    """Gives the scans and medians arrays of a shared memory segment of a
+    ShardedTemporalMedianFilter. A uint16 filter exchanges its scans as the
+    whole millimetres its history holds, so they take two bytes per beam
+
+    Args:
+
+        buffer (memoryview): buffer of the segment
+        shape (tuple): shape of each array
+        dtype (numpy.dtype): dtype of the filter's history
+
+    Returns:
+
+        scans (numpy.ndarray): scans in the history dtype
+        medians (numpy.ndarray): medians in the result dtype
+    """
+    offset = _shard_layout(shape, dtype)[0]
+    scans = np.ndarray(shape, dtype=dtype, buffer=buffer)
+    medians = np.ndarray(shape, dtype=_result_dtype(dtype), buffer=buffer,
+                         offset=offset)
+    return scans, medians
+
+
+def _shard_worker(connection, num_prev_scans, dtype, start, stop,
+                  parent_ends=()):
+    """Runs a TemporalMedianFilter on the beams start to stop of the scans
+    placed in shared memory, one command from connection at a time
+
+    Commands are ("update", name, shape) and ("batch", name, shape), where
+    name is a segment holding a scans array followed by a medians array of
+    the given shape as laid out by _shard_arrays, and ("close",). Each
+    command is answered with None or the exception it raised.
+
+    Args:
+
+        connection (Connection): end of the pipe to the parent process
+        num_prev_scans (int): num_prev_scans of the filter
+        dtype (numpy.dtype): dtype of the filter
+        start (int): first beam of the shard
+        stop (int): end of the shard, exclusive
+        parent_ends (tuple): the parent's ends of the pipes to the workers,
+        closed so that every worker sees the end of its pipe if the parent
+        dies, default value is ()
+    """
+    for parent_end in parent_ends:
+        parent_end.close()
+    median_filter = TemporalMedianFilter(num_prev_scans, dtype=dtype)
+    segments = {}
+    while True:
+        try:
+            command = connection.recv()
+        except EOFError:
+            # The parent died without closing the filter
+            break
+        if command[0] == "close":
+            break
+        try:
+            action, name, shape = command
+            if name not in segments:
+                segments[name] = _attach_segment(name)
+            scans, medians = _shard_arrays(segments[name].buf, shape, dtype)
+            if scans.dtype == FIXED_POINT_DTYPE:
+                # Metres that convert back to exactly the same millimetres
+                scans = scans / float(MILLIMETRES_PER_UNIT)
+            if action == "update":
+                median_filter.update(scans[start:stop],
+                                     out=medians[start:stop])
+            else:
+                medians[:, start:stop] = \
+                    median_filter.update_batch(scans[:, start:stop])
+            del scans, medians
+            connection.send(None)
+        except Exception as error:
+            connection.send(error)
+
+    for segment in segments.values():
+        segment.close()
+    connection.close()
+
+
+class ShardedTemporalMedianFilter:
+    """
+    The sharded_temporal_median_filter object
+
+    Gives the same results as a TemporalMedianFilter, with the beams of each
+    scan split into contiguous shards that a persistent pool of worker
+    processes filter in parallel. Each worker holds the history of its
+    shard, and scans and medians are exchanged through shared memory so a
+    scan is never pickled. Without multiprocessing.shared_memory (Python
+    < 3.8), with a single worker or with num_prev_scans of zero the filter
+    runs in this process.
+
+    The workers are started by the first scan and stopped by close, the
+    filter can also be used as a context manager.
 
     Attributes:
+
         num_prev_scans (int): used to store that many previous scans, default
         value is 3
+        num_workers (int): number of worker processes, default value is None
+        for one per CPU
+        dtype (numpy.dtype): dtype of the history and results as for a
+        TemporalMedianFilter, default value is float64
     """
-    def __init__(self, num_prev_scans=3):
-        self.__N = 0;   # num of data points in scan
+    def __init__(self, num_prev_scans=3, num_workers=None, dtype=np.float64):
+        self.__filter = TemporalMedianFilter(num_prev_scans, dtype=dtype)
+        self.__dtype = np.dtype(dtype)
+        self.__result_dtype = _result_dtype(dtype)
         self.__num_prev_scans = num_prev_scans
-        self.__ordered_data = np.array([[]])
-        self.__unordered_data = np.array([[]])
+        self.__num_workers = num_workers
         self.__check_args()
+        if self.__num_workers is None:
+            import multiprocessing
+            self.__num_workers = multiprocessing.cpu_count()
+        self.__N = None
+        self.__workers = []
+        self.__segments = {}
+        self.__closed = False
 
     def __check_args(self):
-        """Checks that num_prev_scans is the correct data type and value
-        """
-        self.__check_args_type()
-        self.__check_args_val()
-
-    def __check_args_type(self):
-        """Checks that num_prev_scans is int
+        """Checks that num_workers is None or a positive int
 
         Raises:
+
             TypeError: Invalid type
+            ValueError: Invalid value
         """
-        if not isinstance(self.__num_prev_scans, int):
-            error_msg = "num_prev_scans must of type 'int', but given '"
-            error_msg += str(type(self.__num_prev_scans))+ "'"
+        if self.__num_workers is None:
+            return
+        if not isinstance(self.__num_workers, int) or \
+                isinstance(self.__num_workers, bool):
+            error_msg = "num_workers must of type 'int', but given '"
+            error_msg += str(type(self.__num_workers)) + "'"
             raise TypeError(error_msg)
+        if self.__num_workers < 1:
+            error_msg = "num_workers must be greater than or equal to one"
+            raise ValueError(error_msg)
 
-        if isinstance(self.__num_prev_scans, bool):
-            error_msg = "num_prev_scans must of type 'int', but given '"
-            error_msg += str(type(self.__num_prev_scans))+ "'"
-            raise TypeError(error_msg)
+    def __enter__(self):
+        return self
 
-    def __check_args_val(self):
-        """Checks that num_prev_scans is positive
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def is_parallel(self):
+        """Checks whether scans are filtered by worker processes
+
+        Returns:
+
+            parallel (bool): False if the filter runs in this process
+        """
+        return _shared_memory() is not None and self.__num_workers > 1 and \
+            self.__num_prev_scans > 0
+
+    def close(self):
+        """Stops the worker processes and frees the shared memory. Updating
+        a closed filter raises a ValueError
+        """
+        for process, connection in self.__workers:
+            try:
+                connection.send(("close",))
+            except (IOError, OSError):
+                pass
+            process.join()
+            connection.close()
+        self.__workers = []
+        self.__closed = True
+
+        for segment in self.__segments.values():
+            segment.close()
+            segment.unlink()
+        self.__segments = {}
+
+    def __start(self, num_points):
+        """Splits the beams into shards and starts one worker per shard
+
+        Args:
+
+            num_points (int): number of measurements in each scan
+        """
+        import multiprocessing
+        from multiprocessing import resource_tracker
+        self.__N = num_points
+        # Workers share the tracker running when they start, which then
+        # unlinks the segments if this process dies without closing them
+        resource_tracker.ensure_running()
+        num_shards = max(1, min(self.__num_workers, num_points))
+        bounds = np.linspace(0, num_points, num_shards + 1).astype(int)
+        for shard in range(num_shards):
+            parent_end, child_end = multiprocessing.Pipe()
+            parent_ends = tuple(end for _, end in self.__workers)
+            process = multiprocessing.Process(
+                target=_shard_worker,
+                args=(child_end, self.__num_prev_scans, self.__dtype,
+                      bounds[shard], bounds[shard + 1],
+                      parent_ends + (parent_end,)))
+            process.daemon = True
+            process.start()
+            child_end.close()
+            self.__workers.append((process, parent_end))
+
+    def __buffers(self, key, shape):
+        """Gives the scans and medians arrays of a shared memory segment,
+        allocating a larger segment if needed. Scans are held in the
+        history dtype and medians in the result dtype
+
+        Args:
+
+            key (str): "update" or "batch"
+            shape (tuple): shape of each array
+
+        Returns:
+
+            name (str): name of the segment
+            scans (numpy.ndarray): array the scans are written to
+            medians (numpy.ndarray): array the workers write medians to
+        """
+        size = _shard_layout(shape, self.__dtype)[1]
+        segment = self.__segments.get(key)
+        if segment is None or segment.size < size:
+            if segment is not None:
+                segment.close()
+                segment.unlink()
+            segment = _shared_memory().SharedMemory(create=True,
+                                                    size=max(size, 1))
+            self.__segments[key] = segment
+        scans, medians = _shard_arrays(segment.buf, shape, self.__dtype)
+        return segment.name, scans, medians
+
+    def __to_scans(self, scan_array, scans):
+        """Writes measurements into the scans array of a segment, as the
+        whole millimetres of the history for uint16
+
+        Args:
+
+            scan_array (numpy.ndarray): measurements in metres
+            scans (numpy.ndarray): scans array of the segment
+        """
+        if self.__dtype == FIXED_POINT_DTYPE:
+            scan_array = _to_millimetres(scan_array, 0)
+        scans[...] = scan_array
+
+    def __run(self, action, name, shape):
+        """Sends a command to every worker and waits for all of them
 
         Raises:
 
-            ValueError: Invalid value
+            Exception: the first exception raised by a worker
         """
-        if self.__num_prev_scans < 0:
-            error_msg = "num_prev_scans must be greater than or equal to zero"
-            raise ValueError(error_msg)
+        for process, connection in self.__workers:
+            connection.send((action, name, shape))
+        errors = [connection.recv() for process, connection in self.__workers]
+        for error in errors:
+            if error is not None:
+                raise error
+
+    def __check_points(self, num_points):
+        """Starts the workers on the first scan and checks every later scan
+        has the same number of measurements
+
+        Raises:
+
+            ValueError: the filter is closed or the number of datapoints not
+            consistent
+        """
+        if self.__closed:
+            raise ValueError("filter is closed")
+        elif self.__N is None:
+            self.__start(num_points)
+        elif num_points != self.__N:
+            raise ValueError("number of data points not consistent")
 
-    def update(self, scan):
+    def update(self, scan, out=None):
         """Determines the median of the current scan with num_prev_scans
 
         Args:
 
             scan (list or numpy.ndarray): a set of measurements
+            out (numpy.ndarray): optional array with the same number of
+            elements as scan that receives the result, default value is None
 
         Raises:
 
-            TypeError: scan is the wrong type
+            TypeError: scan or out is the wrong type
             ValueError: the number of datapoints in scan not consistent with
-            previous scans
+            previous scans, or out does not have the same number of elements
+            as scan
 
         Returns:
 
             median_val (list): scan with median values determined from
-            current and num_prev_scans
-
+            current and num_prev_scans, or out if given
         """
+        if not self.is_parallel():
+            if self.__closed:
+                raise ValueError("filter is closed")
+            return self.__filter.update(scan, out=out)
 
-        # Check the input type and convert to ndarray if a list
-        # and ensure that the input is a 1D vector
         if not isinstance(scan, (list, np.ndarray)):
             error_msg = "argument wrong type, expected list or numpy.ndarray"
             raise TypeError(error_msg)
         else:
             scan_array = np.asarray(scan)
             element_count = scan_array.size
-            scan_array.shape = (element_count)
+            scan_array = scan_array.reshape(element_count)
 
-        # Remove the last entry in the array to maintain num_prev_scans
-        # most recent scans
-        num_scans = self.__unordered_data.shape[0]
-        if num_scans > self.__num_prev_scans:
-            num_scans-=1
-            self.__unordered_data = \
-                np.delete(self.__unordered_data, num_scans,axis=0)
+        if out is not None:
+            if not isinstance(out, np.ndarray):
+                error_msg = "out wrong type, expected 'numpy.ndarray'"
+                raise TypeError(error_msg)
+            elif out.size != element_count:
+                error_msg = "out must have the same number of elements as scan"
+                raise ValueError(error_msg)
 
-        # Return the scan if it is the very first input into the array
-        if self.__unordered_data.size == 0:
-            self.__N = scan_array.size;
-            self.__unordered_data = np.vstack([scan_array])
-            return self.__unordered_data[0].tolist()
-        else:
-            # Check every scan has same number of measurements as first scan
-            if scan_array.size != self.__N:
-                raise ValueError("number of data points not consistent")
-            else:
-                self.__unordered_data = \
-                    np.vstack([scan_array, self.__unordered_data])
-                self.__ordered_data = copy.deepcopy(self.__unordered_data)
-                num_scans+=1
+        self.__check_points(element_count)
+        name, scans, medians = self.__buffers("update", (element_count,))
+        self.__to_scans(scan_array, scans)
+        self.__run("update", name, (element_count,))
 
-        # sort by column
-        self.__ordered_data.sort(axis=0)
+        if out is not None:
+            out[...] = medians.reshape(out.shape)
+            return out
+        median_val = medians.tolist()
+        return median_val
 
-        # determine the median val for each column
-        if num_scans%2:
-            median_val = self.__ordered_data[(num_scans + 1) / 2 - 1, :]
-        else:
-            median_val_1 = self.__ordered_data[num_scans / 2 - 1, :]
-            median_val_2 = self.__ordered_data[(num_scans + 2) / 2 - 1, :]
-            median_val = (median_val_1 + median_val_2) / 2.0
+    def update_batch(self, scans):
+        """Determines the median of each scan in a block of scans with
+        num_prev_scans, continuing from the scans already held
 
-        median_val = median_val.tolist()
-        return median_val
+        Args:
+
+            scans (list or numpy.ndarray): T x N block with one scan per row
+
+        Raises:
+
+            TypeError: scans is the wrong type
+            ValueError: scans is not 2D or the number of datapoints in the
+            scans not consistent with previous scans
+
+        Returns:
+
+            median_block (numpy.ndarray): T x N array with the median values
+            of each scan
+        """
+        if not self.is_parallel():
+            if self.__closed:
+                raise ValueError("filter is closed")
+            return self.__filter.update_batch(scans)
+
+        scan_block = _to_scan_block(scans)
+        if scan_block.shape[0] == 0:
+            return np.empty(scan_block.shape, dtype=self.__result_dtype)
+
+        self.__check_points(scan_block.shape[1])
+        name, block, medians = self.__buffers("batch", scan_block.shape)
+        self.__to_scans(scan_block, block)
+        self.__run("batch", name, scan_block.shape)
+        return medians.copy()
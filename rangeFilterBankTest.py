@@ -0,0 +1,89 @@
+import numpy as np
+import unittest
+from filters import RangeFilter
+from filters import RangeFilterBank
+
+
+class TestRangeFilterBank(unittest.TestCase):
+
+    def test_update_with_shared_limits(self):
+        self.bank = RangeFilterBank(0.03, 50.0)
+        scan_array = np.array([[-1.0,0.0,30.0],[50.0,100.0,-0.025]])
+        expected_result = [[0.03,0.03,30.0],[50.0,50.0,0.03]]
+        actual_result = self.bank.update(scan_array)
+        self.assertEqual(expected_result, actual_result)
+
+    def test_update_with_per_sensor_limits(self):
+        self.bank = RangeFilterBank([0.03, 1.0], [50.0, 20.0])
+        scan_list = [[-1.0,0.0,30.0],[50.0,100.0,-0.025]]
+        expected_result = [[0.03,0.03,30.0],[20.0,20.0,1.0]]
+        actual_result = self.bank.update(scan_list)
+        self.assertEqual(expected_result, actual_result)
+
+    def test_update_with_different_beam_counts(self):
+        self.bank = RangeFilterBank([0.03, 1.0], 50.0)
+        scan_list = [[-1.0,0.0,30.0,70.0],[100.0,-0.025]]
+        expected_result = [[0.03,0.03,30.0,50.0],[50.0,1.0]]
+        actual_result = self.bank.update(scan_list)
+        self.assertEqual(expected_result, actual_result)
+
+    def test_update_into_out_numpy_array(self):
+        self.bank = RangeFilterBank(0.03, 50.0)
+        scan_array = np.array([[-1.0,0.0,30.0],[50.0,100.0,-0.025]])
+        actual_result = self.bank.update(scan_array, out=scan_array)
+        self.assertIs(scan_array, actual_result)
+        self.assertEqual([[0.03,0.03,30.0],[50.0,50.0,0.03]],
+                         scan_array.tolist())
+
+    def test_update_batch_matches_range_filters(self):
+        self.bank = RangeFilterBank([0.03, 1.0, 5.0], [50.0, 20.0, 10.0])
+        self.filters = [RangeFilter(0.03, 50.0), RangeFilter(1.0, 20.0),
+                        RangeFilter(5.0, 10.0)]
+        scan_block = np.random.RandomState(0).uniform(-5.0, 60.0, (4, 3, 6))
+        actual_result = self.bank.update_batch(scan_block)
+        for idx in range(4):
+            for sensor in range(3):
+                expected_result = \
+                    self.filters[sensor].update(scan_block[idx, sensor])
+                self.assertEqual(expected_result,
+                                 actual_result[idx, sensor].tolist())
+
+    def test_inconsistent_num_sensors(self):
+        self.bank = RangeFilterBank([0.03, 1.0], [50.0, 20.0])
+        with self.assertRaises(ValueError):
+            self.bank.update([[1.0,2.0],[1.0,2.0],[1.0,2.0]])
+
+    def test_different_length_limits(self):
+        with self.assertRaises(ValueError):
+            self.bank = RangeFilterBank([0.03, 1.0], [50.0, 20.0, 10.0])
+
+    def test_change_range(self):
+        self.bank = RangeFilterBank(0.03, 50.0)
+        self.bank.change_range([0.03, 1.0], [50.0, 20.0])
+        scan_list = [[-1.0,0.0,30.0],[50.0,100.0,-0.025]]
+        expected_result = [[0.03,0.03,30.0],[20.0,20.0,1.0]]
+        self.assertEqual(expected_result, self.bank.update(scan_list))
+        with self.assertRaises(ValueError):
+            self.bank.change_range([0.03, 30.0], 20.0)
+        self.assertEqual(expected_result, self.bank.update(scan_list))
+
+    def test_negative_min_range(self):
+        with self.assertRaises(ValueError):
+            self.bank = RangeFilterBank([0.03, -1.0])
+
+    def test_min_range_greater_than_max_range(self):
+        with self.assertRaises(ValueError):
+            self.bank = RangeFilterBank([0.03, 30.0], [50.0, 20.0])
+
+    def test_wrong_max_range_type_bool(self):
+        with self.assertRaises(TypeError):
+            self.bank = RangeFilterBank(max_range=[50.0, True])
+
+    def test_wrong_scans_type(self):
+        self.bank = RangeFilterBank()
+        with self.assertRaises(TypeError):
+            self.bank.update(((1.0,2.0),(1.0,2.0)))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
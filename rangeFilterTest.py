@@ -1,3 +1,6 @@
+import os
+import shutil
+import tempfile
 import numpy as np
 import unittest
 from filters import RangeFilter
@@ -109,6 +112,203 @@ class TestRangeFilter(unittest.TestCase):
         self.assertEqual(expected_result,actual_result)
 
 
+    def test_update_does_not_modify_numpy_array(self):
+        scan_array = np.array([[-1.0,0.0],[30.0,50.0],[97.5,-0.025]])
+        self.filter.update(scan_array)
+        self.assertEqual((3,2), scan_array.shape)
+        self.assertEqual([[-1.0,0.0],[30.0,50.0],[97.5,-0.025]],
+                         scan_array.tolist())
+
+    def test_update_into_out_numpy_array(self):
+        scan_list = [-1.0,0.0,30.0,50.0,100.0]
+        out = np.empty(5)
+        expected_result = [0.03,0.03,30.0,50.0,50.0]
+        actual_result = self.filter.update(scan_list, out=out)
+        self.assertIs(out, actual_result)
+        self.assertEqual(expected_result, actual_result.tolist())
+
+    def test_update_in_place(self):
+        scan_array = np.array([[-1.0,0.0],[30.0,50.0],[97.5,-0.025]])
+        expected_result = [[0.03,0.03],[30.0,50.0],[50.0,0.03]]
+        actual_result = self.filter.update(scan_array, out=scan_array)
+        self.assertIs(scan_array, actual_result)
+        self.assertEqual(expected_result, scan_array.tolist())
+
+    def test_update_out_wrong_type(self):
+        with self.assertRaises(TypeError):
+            self.filter.update([1.0,2.0], out=[0.0,0.0])
+
+    def test_update_out_wrong_size(self):
+        with self.assertRaises(ValueError):
+            self.filter.update([1.0,2.0], out=np.empty(3))
+
+    def test_update_batch(self):
+        scan_list = [[-1.0,0.0,30.0],[50.0,100.0,-0.025]]
+        expected_result = [[0.03,0.03,30.0],[50.0,50.0,0.03]]
+        actual_result = self.filter.update_batch(scan_list)
+        self.assertIsInstance(actual_result, np.ndarray)
+        self.assertEqual(expected_result, actual_result.tolist())
+
+    def test_update_batch_one_dimensional_scans(self):
+        with self.assertRaises(ValueError):
+            self.filter.update_batch(np.array([-1.0,0.0,30.0]))
+
+    def test_update_batch_wrong_type(self):
+        with self.assertRaises(TypeError):
+            self.filter.update_batch((1.0,2.0))
+
+    def test_update_batch_float32(self):
+        self.test_filter = RangeFilter(0.03, 50.0, dtype=np.float32)
+        scan_array = np.array([[-1.0,0.0,30.0],[50.0,100.0,-0.025]])
+        actual_result = self.test_filter.update_batch(scan_array)
+        self.assertEqual(np.float32, actual_result.dtype)
+        self.assertEqual(np.array([[0.03,0.03,30.0],[50.0,50.0,0.03]],
+                                  dtype=np.float32).tolist(),
+                         actual_result.tolist())
+
+    def test_mask_invalid_returns(self):
+        self.test_filter = RangeFilter(0.03, 50.0, mask_invalid=True)
+        scan_list = [0.0,np.nan,np.inf,-np.inf,0.01,100.0,3.0]
+        actual_result = self.test_filter.update(scan_list)
+        self.assertTrue(np.all(np.isnan(actual_result[:4])))
+        self.assertEqual([0.03,50.0,3.0], actual_result[4:])
+
+    def test_mask_invalid_returns_in_place(self):
+        self.test_filter = RangeFilter(0.03, 50.0, mask_invalid=True)
+        scan_array = np.array([[0.0,1.0],[np.inf,100.0]])
+        self.test_filter.update_batch(scan_array, out=scan_array)
+        self.assertTrue(np.isnan(scan_array[0, 0]))
+        self.assertTrue(np.isnan(scan_array[1, 0]))
+        self.assertEqual([1.0,50.0], scan_array[:, 1].tolist())
+
+    def test_wrong_mask_invalid_type(self):
+        with self.assertRaises(TypeError):
+            self.test_filter = RangeFilter(mask_invalid=1)
+
+    def test_profiling_counts_clamped_measurements(self):
+        samples = []
+        profile = self.filter.enable_profiling(capacity=2,
+                                               callback=samples.append)
+        self.assertIs(profile, self.filter.profile())
+        self.filter.update([-1.0,0.0,30.0,50.0,100.0])
+        self.filter.update(np.array([60.0,1.0]))
+        self.filter.update_batch([[0.0,70.0],[80.0,90.0]])
+        summary = profile.snapshot()
+        self.assertEqual(3, summary["calls"])
+        self.assertEqual({"scans": 4, "beams": 11, "clamped_low": 3,
+                          "clamped_high": 5, "invalid": 0},
+                         summary["counters"])
+        self.assertEqual(1, summary["stages"]["clip"]["calls"])
+        self.assertEqual(2, summary["stages"]["total"]["calls"])
+        self.assertEqual((2, 5), profile.export()["durations"].shape)
+        self.assertEqual(3, len(samples))
+        self.assertEqual(1, samples[0]["clamped_high"])
+        self.filter.disable_profiling()
+        self.assertIsNone(self.filter.profile())
+
+    def test_profiling_wrong_capacity(self):
+        with self.assertRaises(ValueError):
+            self.filter.enable_profiling(capacity=0)
+        with self.assertRaises(TypeError):
+            self.filter.enable_profiling(callback="print")
+
+    def test_load_state_restores_limits(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "range.state")
+        try:
+            RangeFilter(1.0, 20.0).save_state(path)
+            self.filter.load_state(path)
+            self.assertEqual([1.0,20.0], self.filter.update([0.5,30.0]))
+            with self.assertRaises(ValueError):
+                RangeFilter(mask_invalid=True).load_state(path)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_load_state_checks_limits(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "range.state")
+        try:
+            RangeFilter(1.0, 20.0).save_state(path)
+            with open(path, "rb") as state_file:
+                data = state_file.read()
+            # The settings are not covered by a checksum
+            for tampered in [b'"min_range": 900', b'"min_range": "1"']:
+                with open(path, "wb") as state_file:
+                    state_file.write(data.replace(b'"min_range": 1.0',
+                                                  tampered))
+                with self.assertRaises(ValueError):
+                    self.filter.load_state(path)
+            self.assertEqual([0.03,50.0], self.filter.update([0.0,60.0]))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_change_range(self):
+        self.filter.change_min_range(1.0)
+        self.filter.change_max_range(20.0)
+        self.assertEqual([1.0,5.0,20.0], self.filter.update([0.5,5.0,30.0]))
+        self.filter.change_range(30.0, 40.0)
+        self.assertEqual([30.0,40.0], self.filter.update([5.0,50.0]))
+
+    def test_invalid_change_range_keeps_limits(self):
+        with self.assertRaises(ValueError):
+            self.filter.change_min_range(60.0)
+        with self.assertRaises(ValueError):
+            self.filter.change_max_range(-1.0)
+        with self.assertRaises(TypeError):
+            self.filter.change_range("0.1", 20.0)
+        self.assertEqual([0.03,50.0], self.filter.update([0.0,60.0]))
+
+    def test_update_unchecked_matches_update(self):
+        scan_array = np.random.RandomState(0).uniform(-5.0, 60.0, (4, 8))
+        for scan in scan_array:
+            expected_result = self.filter.update(scan)
+            actual_result = self.filter.update_unchecked(scan)
+            self.assertEqual(expected_result, actual_result.tolist())
+        self.filter.update_unchecked(scan_array[0], out=scan_array[0])
+        self.assertEqual(self.filter.update(scan_array[1]),
+                         self.filter.update_unchecked(scan_array[1]).tolist())
+
+    def test_update_unchecked_checks_first_call(self):
+        with self.assertRaises(TypeError):
+            self.filter.update_unchecked([1.0,2.0])
+        with self.assertRaises(TypeError):
+            self.filter.update_unchecked(np.ones(3, dtype=np.float32))
+        with self.assertRaises(ValueError):
+            self.filter.update_unchecked(np.ones((2, 3)))
+        with self.assertRaises(ValueError):
+            self.filter.update_unchecked(np.ones(3), out=np.empty(2))
+
+    def test_update_channels_flags_clamped_ranges(self):
+        scan = {"range": [-1.0,0.0,30.0,50.0,100.0], "intensity": [1,2,3,4,5]}
+        channels = self.filter.update_channels(scan)
+        self.assertEqual([0.03,0.03,30.0,50.0,50.0], channels["range"].tolist())
+        self.assertEqual([True,True,False,False,True],
+                         channels["clamped"].tolist())
+        self.assertEqual([1,2,3,4,5], channels["intensity"].tolist())
+
+    def test_update_channels_structured_array(self):
+        scan_array = np.zeros(3, dtype=[("r", float), ("intensity", int)])
+        scan_array["r"] = [60.0,10.0,0.0]
+        scan_array["intensity"] = [7,8,9]
+        channels = self.filter.update_channels(scan_array, range_key="r")
+        self.assertEqual([50.0,10.0,0.03], channels["r"].tolist())
+        self.assertTrue(np.shares_memory(scan_array, channels["intensity"]))
+
+    def test_update_channels_wrong_scan(self):
+        with self.assertRaises(TypeError):
+            self.filter.update_channels([1.0,2.0])
+        with self.assertRaises(ValueError):
+            self.filter.update_channels({"ranges": [1.0,2.0]})
+        with self.assertRaises(ValueError):
+            self.filter.update_channels({"range": [1.0,2.0], "ring": [1]})
+        with self.assertRaises(ValueError):
+            self.filter.update_channels({"range": [1.0,2.0],
+                                         "clamped": [True,False]})
+
+    def test_wrong_dtype(self):
+        with self.assertRaises(TypeError):
+            self.test_filter = RangeFilter(dtype=np.uint16)
+
     def test_wrong_min_range_type_char(self):
         with self.assertRaises(TypeError):
             self.test_filter = RangeFilter(min_range='a')
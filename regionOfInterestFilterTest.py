@@ -0,0 +1,187 @@
+import numpy as np
+import unittest
+from filters import RangeFilter
+from filters import TemporalMedianFilter
+from filters import SpatialMedianFilter
+from filters import FilterPipeline
+from filters import RegionOfInterest
+from filters import RegionOfInterestFilter
+
+
+class TestRegionOfInterest(unittest.TestCase):
+
+    def test_all_beams_by_default(self):
+        self.assertEqual([0,1,2,3], RegionOfInterest().beams(4).tolist())
+
+    def test_index_ranges_and_stride(self):
+        region = RegionOfInterest(ranges=[(0, 5), (9, 20)], stride=2)
+        self.assertEqual([0,2,4,10], region.beams(11).tolist())
+
+    def test_sectors_wrap_around(self):
+        region = RegionOfInterest(sectors=[(-30, 30)], angle_increment=10.0)
+        self.assertEqual([0,1,2,33,34,35], region.beams(36).tolist())
+        region = RegionOfInterest(sectors=[(-30, 30)], angle_min=-180.0,
+                                  angle_increment=10.0)
+        self.assertEqual([15,16,17,18,19,20], region.beams(36).tolist())
+        region = RegionOfInterest(sectors=[(0, 360)], angle_increment=90.0)
+        self.assertEqual([0,1,2,3], region.beams(4).tolist())
+
+    def test_wrong_args(self):
+        with self.assertRaises(TypeError):
+            self.test_region = RegionOfInterest(ranges=(0, 5))
+        with self.assertRaises(TypeError):
+            self.test_region = RegionOfInterest(ranges=[(0.0, 5.0)])
+        with self.assertRaises(TypeError):
+            self.test_region = RegionOfInterest(sectors=[("0", 5)])
+        with self.assertRaises(TypeError):
+            self.test_region = RegionOfInterest(stride=2.0)
+        with self.assertRaises(TypeError):
+            self.test_region = RegionOfInterest(angle_min=None)
+        with self.assertRaises(ValueError):
+            self.test_region = RegionOfInterest(ranges=[(5, 0)])
+        with self.assertRaises(ValueError):
+            self.test_region = RegionOfInterest(ranges=[(-1, 5)])
+        with self.assertRaises(ValueError):
+            self.test_region = RegionOfInterest(sectors=[(30, -30)])
+        with self.assertRaises(ValueError):
+            self.test_region = RegionOfInterest(stride=0)
+        with self.assertRaises(ValueError):
+            self.test_region = RegionOfInterest(angle_increment=0.0)
+
+
+class TestRegionOfInterestFilter(unittest.TestCase):
+
+    def setUp(self):
+        self.filter = RegionOfInterestFilter(
+            TemporalMedianFilter(2), RegionOfInterest(ranges=[(1, 3)]))
+
+    def test_filters_selected_beams_only(self):
+        self.assertEqual([2.0,3.0], self.filter.update([1.0,2.0,3.0,4.0]))
+        self.assertEqual([3.0,4.0], self.filter.update([9.0,4.0,5.0,9.0]))
+        self.assertEqual([1,2], self.filter.beams().tolist())
+
+    def test_scatter_into_full_scan(self):
+        self.filter = RegionOfInterestFilter(
+            TemporalMedianFilter(2), RegionOfInterest(ranges=[(1, 3)]),
+            scatter=True)
+        actual_result = self.filter.update([1.0,2.0,3.0,4.0])
+        np.testing.assert_array_equal([np.nan,2.0,3.0,np.nan], actual_result)
+
+        self.filter = RegionOfInterestFilter(
+            RangeFilter(), RegionOfInterest(ranges=[(1, 3)]), scatter=True,
+            fill_value=None)
+        out = np.empty(4)
+        self.filter.update([100.0,100.0,0.0,0.0], out=out)
+        self.assertEqual([100.0,50.0,0.03,0.0], out.tolist())
+
+    def test_update_batch_matches_update(self):
+        scan_array = np.random.RandomState(0).uniform(0.0, 60.0, (9, 12))
+        region = RegionOfInterest(ranges=[(2, 10)], stride=3)
+        stages = [RangeFilter, lambda: TemporalMedianFilter(3),
+                  lambda: FilterPipeline([RangeFilter(),
+                                          TemporalMedianFilter(3)])]
+        for make_stage in stages:
+            for scatter in [False, True]:
+                self.filter = RegionOfInterestFilter(make_stage(), region,
+                                                     scatter=scatter)
+                expected_result = [self.filter.update(scan)
+                                   for scan in scan_array]
+                self.filter = RegionOfInterestFilter(make_stage(), region,
+                                                     scatter=scatter)
+                actual_result = self.filter.update_batch(scan_array)
+                np.testing.assert_array_equal(expected_result, actual_result)
+
+    def test_change_region_keeps_history_of_remaining_beams(self):
+        for scan in [[1.0,5.0,9.0,0.0],[2.0,6.0,7.0,0.0],[3.0,4.0,8.0,0.0]]:
+            self.filter.update(scan)
+        self.filter.change_region(RegionOfInterest(ranges=[(2, 4)]))
+        self.assertEqual([2,3], self.filter.beams().tolist())
+        self.assertEqual([7.0,20.0], self.filter.update([0.0,0.0,1.0,20.0]))
+        self.assertEqual([1.0,21.0],
+                         self.filter.update_batch([[0.0,0.0,0.0,22.0]])
+                         .tolist()[0])
+
+    def test_change_region_in_pipeline(self):
+        self.filter = RegionOfInterestFilter(
+            FilterPipeline([RangeFilter(), TemporalMedianFilter(2)]),
+            RegionOfInterest(ranges=[(0, 2)]))
+        self.filter.update([1.0,2.0,3.0])
+        self.filter.change_region(RegionOfInterest(ranges=[(1, 3)]))
+        self.assertEqual([3.5,6.0], self.filter.update([4.0,5.0,6.0]))
+        self.assertEqual([5.0,4.0],
+                         self.filter.update_batch([[1.0,100.0,2.0]])
+                         .tolist()[0])
+
+    def test_failed_change_region_keeps_region(self):
+        self.filter = RegionOfInterestFilter(
+            FilterPipeline([TemporalMedianFilter(2),
+                            TemporalMedianFilter(2, engine="histogram")]),
+            RegionOfInterest(ranges=[(1, 3)]))
+        self.filter.update([1.0,2.0,3.0,4.0])
+        self.filter.update([1.0,4.0,5.0,4.0])
+        with self.assertRaises(ValueError):
+            self.filter.change_region(RegionOfInterest(ranges=[(0, 3)]))
+        self.assertEqual([1,2], self.filter.beams().tolist())
+        # Neither median filter was changed
+        expected_result = FilterPipeline([
+            TemporalMedianFilter(2),
+            TemporalMedianFilter(2, engine="histogram")]).update_batch(
+                [[2.0,3.0],[4.0,5.0],[3.0,3.0]])[-1].tolist()
+        self.assertEqual(expected_result,
+                         self.filter.update([0.0,3.0,3.0,0.0]))
+
+    def test_sector_across_wrap_seam(self):
+        # Beams 0 to 2 and 33 to 35 are selected, 2 and 33 are 30 degrees
+        # apart either side of the seam
+        region = RegionOfInterest(sectors=[(-30, 30)], angle_increment=10.0)
+        scan_array = np.full(36, 10.0)
+        scan_array[[1, 33]] = 50.0
+        self.filter = RegionOfInterestFilter(TemporalMedianFilter(0), region,
+                                             scatter=True)
+        actual_result = self.filter.update(scan_array)
+        expected_result = np.full(36, np.nan)
+        expected_result[[0, 1, 2, 33, 34, 35]] = scan_array[[0, 1, 2, 33, 34,
+                                                             35]]
+        np.testing.assert_array_equal(expected_result, actual_result)
+
+        # A spatial median would take beams 2 and 33 as neighbours
+        spatial_filter = SpatialMedianFilter(window_angle=30.0,
+                                             angle_increment=10.0)
+        with self.assertRaises(TypeError):
+            self.test_filter = RegionOfInterestFilter(spatial_filter, region)
+        with self.assertRaises(TypeError):
+            self.test_filter = RegionOfInterestFilter(
+                FilterPipeline([RangeFilter(), spatial_filter]), region)
+
+    def test_inconsistent_num_measurement(self):
+        self.filter.update([1.0,2.0,3.0,4.0])
+        with self.assertRaises(ValueError):
+            self.filter.update([1.0,2.0])
+        self.assertEqual([1,2], self.filter.beams().tolist())
+
+    def test_wrong_out(self):
+        with self.assertRaises(TypeError):
+            self.filter.update([1.0,2.0,3.0,4.0], out=[0.0,0.0])
+        with self.assertRaises(ValueError):
+            self.filter.update([1.0,2.0,3.0,4.0], out=np.empty(4))
+
+    def test_wrong_args(self):
+        region = RegionOfInterest()
+        with self.assertRaises(TypeError):
+            self.test_filter = RegionOfInterestFilter(None, region)
+        with self.assertRaises(TypeError):
+            self.test_filter = RegionOfInterestFilter(RangeFilter(), [(0, 1)])
+        with self.assertRaises(TypeError):
+            self.test_filter = RegionOfInterestFilter(RangeFilter(), region,
+                                                      scatter=1)
+        with self.assertRaises(TypeError):
+            self.test_filter = RegionOfInterestFilter(RangeFilter(), region,
+                                                      fill_value="0")
+        with self.assertRaises(TypeError):
+            self.filter.change_region(None)
+        with self.assertRaises(TypeError):
+            self.filter.update(1.0)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,168 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+import unittest
+from filters import RangeFilter
+from filters import TemporalMedianFilter
+from filters import FilterPipeline
+import scan_log
+from scan_log import ScanLogReader
+from scan_log import ScanLogWriter
+
+
+class TestScanLog(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "scans.log")
+        self.scan_array = np.random.RandomState(0).uniform(-5.0, 60.0, (9, 5))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_write_and_read_frames(self):
+        with ScanLogWriter(self.path, 5) as writer:
+            writer.write(self.scan_array[0], timestamp=1.5)
+            writer.write_batch(self.scan_array[1:].tolist(),
+                               timestamps=np.arange(8.0))
+        with ScanLogReader(self.path) as reader:
+            self.assertEqual(9, len(reader))
+            self.assertEqual(5, reader.num_points)
+            self.assertEqual(self.scan_array.tolist(), reader.read().tolist())
+            self.assertEqual([1.5] + list(range(8)),
+                             reader.timestamps().tolist())
+
+    def test_missing_timestamps_are_nan(self):
+        with ScanLogWriter(self.path, 5) as writer:
+            writer.write(self.scan_array[0])
+        with ScanLogReader(self.path) as reader:
+            self.assertTrue(np.isnan(reader.timestamps()[0]))
+
+    def test_append_frames(self):
+        with ScanLogWriter(self.path, 5) as writer:
+            writer.write_batch(self.scan_array[:4])
+        with ScanLogWriter(self.path, 5, append=True) as writer:
+            writer.write_batch(self.scan_array[4:])
+        with ScanLogReader(self.path) as reader:
+            self.assertEqual(self.scan_array.tolist(), reader.read().tolist())
+
+    def test_append_drops_partial_frame(self):
+        with ScanLogWriter(self.path, 5) as writer:
+            writer.write_batch(self.scan_array[:4])
+        with open(self.path, "ab") as log_file:
+            log_file.write(b"\1\2\3")
+        with ScanLogWriter(self.path, 5, append=True) as writer:
+            writer.write_batch(self.scan_array[4:])
+        with ScanLogReader(self.path) as reader:
+            self.assertEqual(self.scan_array.tolist(), reader.read().tolist())
+
+    def test_append_with_different_num_points(self):
+        with ScanLogWriter(self.path, 5) as writer:
+            writer.write(self.scan_array[0])
+        with self.assertRaises(ValueError):
+            ScanLogWriter(self.path, 4, append=True)
+
+    def test_float32_frames(self):
+        with ScanLogWriter(self.path, 5, dtype=np.float32) as writer:
+            writer.write_batch(self.scan_array)
+        with ScanLogReader(self.path) as reader:
+            self.assertEqual(np.float32, reader.dtype)
+            self.assertEqual(self.scan_array.astype(np.float32).tolist(),
+                             reader.read().tolist())
+
+    def test_integer_frames(self):
+        for dtype in [np.int16, np.int64]:
+            with ScanLogWriter(self.path, 5, dtype=dtype) as writer:
+                writer.write_batch(self.scan_array)
+            with ScanLogReader(self.path) as reader:
+                self.assertEqual(dtype, reader.dtype)
+                self.assertEqual(self.scan_array.astype(dtype).tolist(),
+                                 reader.read().tolist())
+
+    def test_wrong_dtype(self):
+        for dtype in [np.complex64, np.bool_, "U4"]:
+            with self.assertRaises(TypeError):
+                ScanLogWriter(self.path, 5, dtype=dtype)
+
+    def test_read_chunks(self):
+        with ScanLogWriter(self.path, 5) as writer:
+            writer.write_batch(self.scan_array)
+        with ScanLogReader(self.path) as reader:
+            chunks = [scan_block.shape[0]
+                      for timestamps, scan_block in reader.chunks(4)]
+        self.assertEqual([4, 4, 1], chunks)
+
+    def test_empty_log(self):
+        ScanLogWriter(self.path, 5).close()
+        with ScanLogReader(self.path) as reader:
+            self.assertEqual(0, len(reader))
+            self.assertEqual((0, 5), reader.read().shape)
+
+    def test_inconsistent_num_measurement(self):
+        with ScanLogWriter(self.path, 5) as writer:
+            with self.assertRaises(ValueError):
+                writer.write([1.0,2.0])
+
+    def test_not_a_scan_log(self):
+        with open(self.path, "w") as log_file:
+            log_file.write("0.0 1.0 2.0\n" * 4)
+        with self.assertRaises(ValueError):
+            ScanLogReader(self.path)
+
+    def test_filter_log_matches_update(self):
+        reference = FilterPipeline([RangeFilter(), TemporalMedianFilter(3)])
+        expected_result = [reference.update(scan) for scan in self.scan_array]
+
+        with ScanLogWriter(self.path, 5) as writer:
+            writer.write_batch(self.scan_array, timestamps=np.arange(9.0))
+        target_path = os.path.join(self.directory, "filtered.log")
+        num_frames = scan_log.filter_log(
+            FilterPipeline([RangeFilter(), TemporalMedianFilter(3)]),
+            self.path, target_path, chunk_frames=2)
+        self.assertEqual(9, num_frames)
+        with ScanLogReader(target_path) as reader:
+            self.assertEqual(expected_result, reader.read().tolist())
+            self.assertEqual(list(range(9)), reader.timestamps().tolist())
+
+    def test_csv_round_trip(self):
+        csv_path = os.path.join(self.directory, "scans.csv")
+        with open(csv_path, "w") as csv_file:
+            for idx, scan in enumerate(self.scan_array):
+                csv_file.write(",".join(repr(value) for value in
+                                        [float(idx)] + scan.tolist()) + "\n")
+        scan_log.text_to_log(csv_path, self.path, delimiter=",",
+                             timestamp_column=True)
+        with ScanLogReader(self.path) as reader:
+            self.assertEqual(self.scan_array.tolist(), reader.read().tolist())
+            self.assertEqual(list(range(9)), reader.timestamps().tolist())
+
+        text_path = os.path.join(self.directory, "scans.txt")
+        scan_log.log_to_text(self.path, text_path)
+        self.assertEqual(self.scan_array.tolist(),
+                         np.loadtxt(text_path).tolist())
+
+    def test_text_with_inconsistent_num_measurement(self):
+        text_path = os.path.join(self.directory, "scans.txt")
+        with open(text_path, "w") as text_file:
+            text_file.write("0.0 1.0 2.0\n0.0 1.0\n")
+        with self.assertRaises(ValueError):
+            scan_log.text_to_log(text_path, self.path)
+
+
+    def test_text_error_in_later_chunk_removes_log(self):
+        text_path = os.path.join(self.directory, "scans.txt")
+        chunk_frames = scan_log.CHUNK_FRAMES
+        scan_log.CHUNK_FRAMES = 2
+        try:
+            for bad_line in ["0.0 1.0\n", "0.0 1.0 x\n"]:
+                with open(text_path, "w") as text_file:
+                    text_file.write("0.0 1.0 2.0\n" * 5 + bad_line)
+                with self.assertRaises(ValueError):
+                    scan_log.text_to_log(text_path, self.path)
+                self.assertFalse(os.path.exists(self.path))
+        finally:
+            scan_log.CHUNK_FRAMES = chunk_frames
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,437 @@
+import os
+import struct
+
+import numpy as np
+
+# A scan log is a header followed by fixed size frame records. Each record
+# holds the frame's float64 timestamp (NaN if unknown) and its N
+# measurements, padded to a multiple of 8 bytes. The number of frames
+# follows from the file size, so frames are added by appending.
+MAGIC = b"SCANLOG\0"
+VERSION = 1
+HEADER = struct.Struct("<8sHHI8s8x")   # magic, version, header size, N, dtype
+
+# Number of frames filter_log and the converters hold in memory at once
+CHUNK_FRAMES = 1024
+
+
+def _record_dtype(num_points, dtype):
+    """Builds the dtype of one frame record
+
+    Args:
+
+        num_points (int): number of measurements in each scan
+        dtype (numpy.dtype): dtype of the measurements
+
+    Returns:
+
+        record_dtype (numpy.dtype): structured dtype with "timestamp" and
+        "scan" fields
+    """
+    return np.dtype([("timestamp", "<f8"), ("scan", dtype, (num_points,))],
+                    align=True)
+
+
+def _check_dtype(dtype):
+    """Checks that dtype is a float, signed int or unsigned int dtype of at
+    most 8 bytes
+
+    Raises:
+
+        TypeError: Invalid type
+
+    Returns:
+
+        dtype (numpy.dtype): the dtype in little endian byte order
+    """
+    try:
+        dtype = np.dtype(dtype)
+    except TypeError:
+        error_msg = "dtype must be a numpy dtype, but given: " + str(dtype)
+        raise TypeError(error_msg)
+    if dtype.kind not in "fiu" or dtype.itemsize > 8:
+        error_msg = "dtype must be a float, signed int or unsigned int dtype "
+        error_msg += "of at most 8 bytes, but given: "
+        error_msg += str(dtype)
+        raise TypeError(error_msg)
+    return dtype.newbyteorder("<")
+
+
+def _read_header(path):
+    """Reads and checks the header of a scan log
+
+    Args:
+
+        path (str): path of the scan log
+
+    Raises:
+
+        ValueError: not a scan log or an unsupported version
+
+    Returns:
+
+        header_size (int): number of bytes before the first record
+        num_points (int): number of measurements in each scan
+        dtype (numpy.dtype): dtype of the measurements
+    """
+    with open(path, "rb") as log_file:
+        data = log_file.read(HEADER.size)
+    if len(data) < HEADER.size:
+        raise ValueError(path + " is not a scan log")
+
+    magic, version, header_size, num_points, dtype = HEADER.unpack(data)
+    if magic != MAGIC:
+        raise ValueError(path + " is not a scan log")
+    elif version != VERSION:
+        error_msg = path + " has scan log version " + str(version)
+        error_msg += ", expected " + str(VERSION)
+        raise ValueError(error_msg)
+    dtype = _check_dtype(dtype.rstrip(b"\0").decode("ascii"))
+    return header_size, num_points, dtype
+
+
+class ScanLogWriter:
+    """
+    The scan_log_writer object
+
+    Appends frames to a scan log, creating it if needed.
+
+    Attributes:
+
+        path (str): path of the scan log
+        num_points (int): number of measurements in each scan
+        dtype (numpy.dtype): dtype the measurements are stored in, default
+        value is float64
+        append (bool): add frames to an existing log rather than replacing
+        it, its num_points and dtype must match, default value is False
+    """
+    def __init__(self, path, num_points, dtype=np.float64, append=False):
+        if not isinstance(num_points, int) or isinstance(num_points, bool):
+            error_msg = "num_points must of type 'int', but given '"
+            error_msg += str(type(num_points)) + "'"
+            raise TypeError(error_msg)
+        elif num_points < 0:
+            error_msg = "num_points must be greater than or equal to zero"
+            raise ValueError(error_msg)
+
+        self.__num_points = num_points
+        self.__dtype = _check_dtype(dtype)
+        self.__record_dtype = _record_dtype(num_points, self.__dtype)
+
+        if append and os.path.exists(path) and os.path.getsize(path) > 0:
+            header_size, log_points, log_dtype = _read_header(path)
+            if log_points != num_points or log_dtype != self.__dtype:
+                error_msg = "scan log has " + str(log_points) + " points of "
+                error_msg += str(log_dtype) + ", but given "
+                error_msg += str(num_points) + " points of "
+                error_msg += str(self.__dtype)
+                raise ValueError(error_msg)
+
+            # Drop a partly written record left by an interrupted writer
+            record_bytes = self.__record_dtype.itemsize
+            body_size = os.path.getsize(path) - header_size
+            self.__file = open(path, "r+b")
+            self.__file.truncate(header_size +
+                                 body_size // record_bytes * record_bytes)
+            self.__file.seek(0, os.SEEK_END)
+        else:
+            self.__file = open(path, "wb")
+            dtype_name = self.__dtype.str.encode("ascii")
+            self.__file.write(HEADER.pack(MAGIC, VERSION, HEADER.size,
+                                          num_points, dtype_name))
+
+        self.__record = np.zeros(1, dtype=self.__record_dtype)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Flushes and closes the scan log"""
+        self.__file.close()
+
+    def write(self, scan, timestamp=None):
+        """Appends one frame to the scan log
+
+        Args:
+
+            scan (list or numpy.ndarray): the frame's measurements
+            timestamp (float): time of the frame, default value is None for
+            unknown
+
+        Raises:
+
+            TypeError: scan is the wrong type
+            ValueError: the number of datapoints in scan not consistent with
+            the scan log
+        """
+        if not isinstance(scan, (list, np.ndarray)):
+            error_msg = "argument wrong type, expected list or numpy.ndarray"
+            raise TypeError(error_msg)
+        scan_array = np.asarray(scan)
+        if scan_array.size != self.__num_points:
+            raise ValueError("number of data points not consistent")
+
+        record = self.__record
+        record["timestamp"] = np.nan if timestamp is None else timestamp
+        record["scan"][0] = scan_array.reshape(self.__num_points)
+        self.__file.write(record.tobytes())
+
+    def write_batch(self, scans, timestamps=None):
+        """Appends a block of frames to the scan log
+
+        Args:
+
+            scans (list or numpy.ndarray): T x N block with one frame per row
+            timestamps (list or numpy.ndarray): time of each frame, default
+            value is None for unknown
+
+        Raises:
+
+            TypeError: scans is the wrong type
+            ValueError: scans is not 2D, the number of datapoints in the
+            scans not consistent with the scan log or the number of
+            timestamps not the number of frames
+        """
+        if not isinstance(scans, (list, np.ndarray)):
+            error_msg = "scans wrong type, expected 'list' or 'numpy.ndarray'"
+            raise TypeError(error_msg)
+        scan_block = np.asarray(scans)
+        if scan_block.ndim != 2:
+            error_msg = "scans must be 2D with one scan per row, but given "
+            error_msg += str(scan_block.ndim) + "D"
+            raise ValueError(error_msg)
+        elif scan_block.shape[1] != self.__num_points:
+            raise ValueError("number of data points not consistent")
+
+        records = np.zeros(scan_block.shape[0], dtype=self.__record_dtype)
+        if timestamps is None:
+            records["timestamp"] = np.nan
+        else:
+            timestamps = np.asarray(timestamps, dtype=float)
+            if timestamps.shape != (scan_block.shape[0],):
+                error_msg = "timestamps must have one value per frame"
+                raise ValueError(error_msg)
+            records["timestamp"] = timestamps
+        records["scan"] = scan_block
+        self.__file.write(records.tobytes())
+
+
+class ScanLogReader:
+    """
+    The scan_log_reader object
+
+    Reads the frames of a scan log through a read only numpy.memmap, so only
+    the frames that are used are loaded. Frames appended after the reader
+    was opened are not seen.
+
+    Attributes:
+
+        path (str): path of the scan log
+    """
+    def __init__(self, path):
+        header_size, self.num_points, self.dtype = _read_header(path)
+        record_dtype = _record_dtype(self.num_points, self.dtype)
+        num_frames = (os.path.getsize(path) - header_size) // \
+            record_dtype.itemsize
+        if num_frames > 0:
+            self.__records = np.memmap(path, dtype=record_dtype, mode="r",
+                                       offset=header_size,
+                                       shape=(num_frames,))
+        else:
+            self.__records = np.zeros(0, dtype=record_dtype)
+        self.num_frames = num_frames
+
+    def __len__(self):
+        return self.num_frames
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Releases the memory map"""
+        self.__records = None
+
+    def timestamps(self, start=0, stop=None):
+        """Gives the timestamps of frames start to stop
+
+        Returns:
+
+            timestamps (numpy.ndarray): read only view of the timestamps
+        """
+        return self.__records["timestamp"][start:stop]
+
+    def read(self, start=0, stop=None):
+        """Gives the frames start to stop
+
+        Returns:
+
+            scan_block (numpy.ndarray): read only T x N view of the frames
+        """
+        return self.__records["scan"][start:stop]
+
+    def chunks(self, chunk_frames=None):
+        """Iterates over the frames in blocks of at most chunk_frames
+
+        Args:
+
+            chunk_frames (int): number of frames in each block, default value
+            is None for CHUNK_FRAMES
+
+        Yields:
+
+            timestamps (numpy.ndarray): read only view of the block's
+            timestamps
+            scan_block (numpy.ndarray): read only T x N view of the block
+        """
+        if chunk_frames is None:
+            chunk_frames = CHUNK_FRAMES
+        for start in range(0, self.num_frames, chunk_frames):
+            stop = start + chunk_frames
+            yield self.timestamps(start, stop), self.read(start, stop)
+
+
+def filter_log(stage, source_path, target_path, chunk_frames=None):
+    """Filters every frame of a scan log with a filter's update_batch, one
+    block of frames at a time, and writes the results to a new scan log
+    with the same timestamps
+
+    Args:
+
+        stage: any filter object with an update_batch method, such as a
+        RangeFilter, TemporalMedianFilter or FilterPipeline
+        source_path (str): path of the scan log to filter
+        target_path (str): path of the filtered scan log, float64
+        chunk_frames (int): number of frames filtered at once, default value
+        is None for CHUNK_FRAMES
+
+    Returns:
+
+        num_frames (int): number of frames filtered
+    """
+    with ScanLogReader(source_path) as reader:
+        with ScanLogWriter(target_path, reader.num_points) as writer:
+            for timestamps, scan_block in reader.chunks(chunk_frames):
+                writer.write_batch(stage.update_batch(scan_block), timestamps)
+        return reader.num_frames
+
+
+def text_to_log(text_path, log_path, delimiter=None, timestamp_column=False,
+                dtype=np.float64):
+    """Converts a text or CSV dump with one scan per line to a scan log
+
+    Args:
+
+        text_path (str): path of the text dump
+        log_path (str): path of the scan log to write
+        delimiter (str): separator of the values, default value is None for
+        whitespace, "," for CSV
+        timestamp_column (bool): the first value of each line is the frame's
+        timestamp, default value is False
+        dtype (numpy.dtype): dtype the measurements are stored in, default
+        value is float64
+
+    Raises:
+
+        ValueError: the lines do not all have the same number of values or
+        a value is not a number. The frames written so far are then removed
+
+    Returns:
+
+        num_frames (int): number of frames written
+    """
+    writer = None
+    num_frames = 0
+    try:
+        for rows in _text_chunks(text_path, delimiter):
+            block, timestamps = _text_block(rows, timestamp_column)
+            if writer is None:
+                writer = ScanLogWriter(log_path, block.shape[1], dtype=dtype)
+            writer.write_batch(block, timestamps)
+            num_frames += len(rows)
+    except Exception:
+        # A failed conversion leaves no truncated log behind
+        if writer is not None:
+            writer.close()
+            os.remove(log_path)
+        raise
+    writer.close()
+    return num_frames
+
+
+def _text_chunks(text_path, delimiter):
+    """Parses the lines of a text dump, CHUNK_FRAMES lines at a time
+
+    Returns:
+
+        chunks (generator): lists of rows of float values, a single empty
+        list for a dump without scans
+    """
+    rows = []
+    num_chunks = 0
+    with open(text_path) as text_file:
+        for line in text_file:
+            if not line.strip():
+                continue
+            rows.append([float(value) for value in line.split(delimiter)])
+            if len(rows) == CHUNK_FRAMES:
+                yield rows
+                num_chunks += 1
+                rows = []
+    if rows or num_chunks == 0:
+        yield rows
+
+
+def _text_block(rows, timestamp_column):
+    """Converts rows of parsed text values to a block of scans
+
+    Raises:
+
+        ValueError: the rows do not all have the same number of values
+
+    Returns:
+
+        block (numpy.ndarray): T x N array of scans
+        timestamps (numpy.ndarray): timestamp of each scan, None without a
+        timestamp column
+    """
+    num_values = len(rows[0]) if rows else int(timestamp_column)
+    for row in rows:
+        if len(row) != num_values:
+            raise ValueError("number of data points not consistent")
+    block = np.array(rows, dtype=float).reshape(len(rows), num_values)
+
+    if timestamp_column:
+        return block[:, 1:], block[:, 0]
+    return block, None
+
+
+def log_to_text(log_path, text_path, delimiter=" ", timestamp_column=False):
+    """Converts a scan log to a text or CSV dump with one scan per line
+
+    Args:
+
+        log_path (str): path of the scan log
+        text_path (str): path of the text dump to write
+        delimiter (str): separator of the values, default value is " ", ","
+        for CSV
+        timestamp_column (bool): write each frame's timestamp as the first
+        value of its line, default value is False
+
+    Returns:
+
+        num_frames (int): number of frames written
+    """
+    with ScanLogReader(log_path) as reader:
+        with open(text_path, "w") as text_file:
+            for timestamps, scan_block in reader.chunks():
+                if timestamp_column:
+                    scan_block = np.column_stack([timestamps, scan_block])
+                np.savetxt(text_file, scan_block, delimiter=delimiter,
+                           fmt="%.17g")
+        return reader.num_frames
@@ -0,0 +1,117 @@
+import numpy as np
+import unittest
+from filters import TemporalMedianFilter
+from filters import ShardedTemporalMedianFilter
+
+
+class TestShardedTemporalMedianFilter(unittest.TestCase):
+
+    def setUp(self):
+        self.scan_array = np.random.RandomState(0).rand(15, 11)
+        self.scan_array[3, 4] = np.nan
+
+    def tearDown(self):
+        if hasattr(self, 'filter'):
+            self.filter.close()
+
+    def test_update_matches_temporal_median_filter(self):
+        self.filter = ShardedTemporalMedianFilter(3, num_workers=3)
+        reference = TemporalMedianFilter(3)
+        for scan in self.scan_array:
+            expected_result = reference.update(scan)
+            actual_result = self.filter.update(scan)
+            np.testing.assert_array_equal(expected_result, actual_result)
+
+    def test_update_batch_matches_update(self):
+        reference = TemporalMedianFilter(4)
+        expected_result = [reference.update(scan) for scan in self.scan_array]
+
+        self.filter = ShardedTemporalMedianFilter(4, num_workers=2)
+        actual_result = [self.filter.update(scan)
+                         for scan in self.scan_array[:2]]
+        actual_result += self.filter.update_batch(self.scan_array[2:9]).tolist()
+        actual_result += [self.filter.update(scan)
+                          for scan in self.scan_array[9:]]
+        np.testing.assert_array_equal(expected_result, actual_result)
+
+    def test_update_into_out_numpy_array(self):
+        self.filter = ShardedTemporalMedianFilter(2, num_workers=2)
+        reference = TemporalMedianFilter(2)
+        out = np.empty(11)
+        for scan in self.scan_array:
+            expected_result = reference.update(scan)
+            actual_result = self.filter.update(scan, out=out)
+            self.assertIs(out, actual_result)
+            np.testing.assert_array_equal(expected_result, out)
+
+    def test_float32_matches_temporal_median_filter(self):
+        self.filter = ShardedTemporalMedianFilter(3, num_workers=2,
+                                                  dtype=np.float32)
+        reference = TemporalMedianFilter(3, dtype=np.float32)
+        expected_result = reference.update_batch(self.scan_array)
+        actual_result = self.filter.update_batch(self.scan_array)
+        self.assertEqual(np.float32, actual_result.dtype)
+        np.testing.assert_array_equal(expected_result, actual_result)
+
+    def test_fixed_point_and_float16_match_temporal_median_filter(self):
+        scan_array = self.scan_array.copy()
+        scan_array[1, 3] = np.nan
+        scan_array[4, 5] = 70.0
+        for dtype in [np.uint16, np.float16]:
+            if hasattr(self, 'filter'):
+                self.filter.close()
+            self.filter = ShardedTemporalMedianFilter(3, num_workers=2,
+                                                      dtype=dtype)
+            reference = TemporalMedianFilter(3, dtype=dtype)
+            expected_result = [reference.update(scan)
+                               for scan in scan_array[:3]]
+            expected_result += reference.update_batch(scan_array[3:]).tolist()
+            actual_result = [self.filter.update(scan)
+                             for scan in scan_array[:3]]
+            actual_block = self.filter.update_batch(scan_array[3:])
+            self.assertEqual(reference.update_batch(scan_array[:0]).dtype,
+                             actual_block.dtype)
+            actual_result += actual_block.tolist()
+            np.testing.assert_array_equal(expected_result, actual_result)
+
+    def test_more_workers_than_beams(self):
+        self.filter = ShardedTemporalMedianFilter(1, num_workers=4)
+        self.filter.update([1.0,2.0])
+        actual_result = self.filter.update([3.0,6.0])
+        self.assertEqual([2.0,4.0], actual_result)
+
+    def test_single_worker_runs_in_process(self):
+        self.filter = ShardedTemporalMedianFilter(3, num_workers=1)
+        self.assertFalse(self.filter.is_parallel())
+        self.filter.update([0.0,1.0])
+        actual_result = self.filter.update([1.0,5.0])
+        self.assertEqual([0.5,3.0], actual_result)
+
+    def test_inconsistent_num_measurement(self):
+        self.filter = ShardedTemporalMedianFilter(3, num_workers=2)
+        self.filter.update([0.0,1.0,2.0])
+        with self.assertRaises(ValueError):
+            self.filter.update([0.0,1.0])
+
+    def test_update_after_close(self):
+        self.filter = ShardedTemporalMedianFilter(3, num_workers=2)
+        self.filter.update([0.0,1.0,2.0])
+        self.filter.close()
+        with self.assertRaises(ValueError):
+            self.filter.update([0.0,1.0,2.0])
+
+    def test_zero_num_workers(self):
+        with self.assertRaises(ValueError):
+            ShardedTemporalMedianFilter(3, num_workers=0)
+
+    def test_float_num_workers(self):
+        with self.assertRaises(TypeError):
+            ShardedTemporalMedianFilter(3, num_workers=2.0)
+
+    def test_negative_num_previous_scan(self):
+        with self.assertRaises(ValueError):
+            ShardedTemporalMedianFilter(-1)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
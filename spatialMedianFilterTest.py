@@ -0,0 +1,116 @@
+import numpy as np
+import unittest
+from filters import SpatialMedianFilter
+
+
+class TestSpatialMedianFilter(unittest.TestCase):
+
+    def setUp(self):
+        self.filter = SpatialMedianFilter(window_angle=0.5,
+                                          angle_increment=0.25)
+
+    def test_removes_single_beam_spike(self):
+        scan_array = np.array([1.0,1.0,1.0,9.0,1.0,1.0])
+        expected_result = [1.0,1.0,1.0,1.0,1.0,1.0]
+        actual_result = self.filter.update(scan_array)
+        self.assertEqual(expected_result, actual_result)
+
+    def test_window_beams_from_angles(self):
+        self.assertEqual(1, self.filter.half_width())
+        self.assertEqual(2, SpatialMedianFilter(1.0, 0.25).half_width())
+        self.assertEqual(2, SpatialMedianFilter(1.2, 0.25).half_width())
+        self.assertEqual(0, SpatialMedianFilter(0.0, 0.25).half_width())
+
+    def test_edges_repeat_first_and_last_beam(self):
+        scan_list = [5.0,1.0,2.0,3.0,9.0]
+        expected_result = [5.0,2.0,2.0,3.0,9.0]
+        actual_result = self.filter.update(scan_list)
+        self.assertEqual(expected_result, actual_result)
+
+    def test_wrap_around(self):
+        self.filter = SpatialMedianFilter(0.5, 0.25, wrap_around=True)
+        scan_list = [5.0,1.0,2.0,3.0,9.0]
+        expected_result = [5.0,2.0,2.0,3.0,5.0]
+        actual_result = self.filter.update(scan_list)
+        self.assertEqual(expected_result, actual_result)
+
+    def test_max_deviation_only_replaces_outliers(self):
+        self.filter = SpatialMedianFilter(0.5, 0.25, max_deviation=1.0)
+        scan_list = [1.0,1.5,1.0,9.0,1.0,1.8]
+        expected_result = [1.0,1.5,1.0,1.0,1.0,1.8]
+        actual_result = self.filter.update(scan_list)
+        self.assertEqual(expected_result, actual_result)
+
+    def test_nan_sorts_last(self):
+        scan_list = [1.0,np.nan,2.0,np.nan,np.nan,3.0]
+        expected_result = [1.0,2.0,np.nan,np.nan,np.nan,3.0]
+        actual_result = self.filter.update(scan_list)
+        np.testing.assert_array_equal(expected_result, actual_result)
+
+    def test_update_batch_matches_update(self):
+        scan_array = np.random.RandomState(0).uniform(0.0, 50.0, (9, 16))
+        for wrap_around in [False, True]:
+            self.filter = SpatialMedianFilter(1.0, 0.25,
+                                              wrap_around=wrap_around)
+            expected_result = [self.filter.update(scan) for scan in scan_array]
+            actual_result = self.filter.update_batch(scan_array)
+            self.assertEqual(expected_result, actual_result.tolist())
+
+    def test_update_in_place(self):
+        scan_array = np.array([[1.0,1.0,9.0,1.0],[2.0,0.0,2.0,2.0]])
+        expected_result = [[1.0,1.0,1.0,1.0],[2.0,2.0,2.0,2.0]]
+        self.filter.update(scan_array[0], out=scan_array[0])
+        self.filter.update_batch(scan_array[1:], out=scan_array[1:])
+        self.assertEqual(expected_result, scan_array.tolist())
+
+    def test_update_float32(self):
+        self.filter = SpatialMedianFilter(0.5, 0.25, dtype=np.float32)
+        scan_array = np.array([[1.0,1.0,9.0,1.0]])
+        self.assertEqual(np.float32, self.filter.update_batch(scan_array).dtype)
+
+    def test_empty_scan(self):
+        self.assertEqual([], self.filter.update([]))
+
+    def test_update_out_wrong_size(self):
+        with self.assertRaises(ValueError):
+            self.filter.update([1.0,2.0,3.0], out=np.empty(2))
+
+    def test_update_wrong_type(self):
+        with self.assertRaises(TypeError):
+            self.filter.update("1.0 2.0")
+
+    def test_wrong_dtype(self):
+        with self.assertRaises(TypeError):
+            self.test_filter = SpatialMedianFilter(dtype=np.uint16)
+
+    def test_negative_window_angle(self):
+        with self.assertRaises(ValueError):
+            self.test_filter = SpatialMedianFilter(window_angle=-1.0)
+
+    def test_zero_angle_increment(self):
+        with self.assertRaises(ValueError):
+            self.test_filter = SpatialMedianFilter(angle_increment=0)
+
+    def test_negative_max_deviation(self):
+        with self.assertRaises(ValueError):
+            self.test_filter = SpatialMedianFilter(max_deviation=-0.1)
+
+    def test_wrong_window_angle_type_bool(self):
+        with self.assertRaises(TypeError):
+            self.test_filter = SpatialMedianFilter(window_angle=True)
+
+    def test_wrong_angle_increment_type_string(self):
+        with self.assertRaises(TypeError):
+            self.test_filter = SpatialMedianFilter(angle_increment="0.25")
+
+    def test_wrong_wrap_around_type(self):
+        with self.assertRaises(TypeError):
+            self.test_filter = SpatialMedianFilter(wrap_around=1)
+
+    def test_wrong_max_deviation_type(self):
+        with self.assertRaises(TypeError):
+            self.test_filter = SpatialMedianFilter(max_deviation="1.0")
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
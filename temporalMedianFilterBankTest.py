@@ -0,0 +1,104 @@
+import numpy as np
+import unittest
+from filters import TemporalMedianFilter
+from filters import TemporalMedianFilterBank
+
+
+class TestTemporalMedianFilterBank(unittest.TestCase):
+
+    def setUp(self):
+        self.scan_block = np.random.RandomState(0).randint(0, 9, (12, 3, 5))
+        self.scan_block = self.scan_block.astype(float)
+
+    def test_update_matches_separate_filters(self):
+        self.bank = TemporalMedianFilterBank(3)
+        self.filters = [TemporalMedianFilter(3) for sensor in range(3)]
+        for frame in self.scan_block:
+            expected_result = [self.filters[sensor].update(frame[sensor])
+                               for sensor in range(3)]
+            actual_result = self.bank.update(frame)
+            self.assertEqual(expected_result, actual_result)
+
+    def test_update_with_different_beam_counts(self):
+        self.bank = TemporalMedianFilterBank(2)
+        self.filters = [TemporalMedianFilter(2) for sensor in range(3)]
+        beam_counts = [5, 2, 4]
+        for frame in self.scan_block:
+            scan_list = [frame[sensor, :beam_counts[sensor]].tolist()
+                         for sensor in range(3)]
+            expected_result = [self.filters[sensor].update(scan_list[sensor])
+                               for sensor in range(3)]
+            actual_result = self.bank.update(scan_list)
+            self.assertEqual(expected_result, actual_result)
+
+    def test_update_into_out_numpy_array(self):
+        self.bank = TemporalMedianFilterBank(3)
+        self.filters = [TemporalMedianFilter(3) for sensor in range(3)]
+        out = np.empty((3, 5))
+        for frame in self.scan_block:
+            expected_result = [self.filters[sensor].update(frame[sensor])
+                               for sensor in range(3)]
+            actual_result = self.bank.update(frame, out=out)
+            self.assertIs(out, actual_result)
+            self.assertEqual(expected_result, out.tolist())
+
+    def test_update_batch_matches_update(self):
+        self.bank = TemporalMedianFilterBank(4)
+        expected_result = [self.bank.update(frame)
+                           for frame in self.scan_block]
+
+        self.bank = TemporalMedianFilterBank(4)
+        actual_result = [self.bank.update(frame)
+                         for frame in self.scan_block[:2]]
+        actual_result += self.bank.update_batch(self.scan_block[2:10]).tolist()
+        actual_result += [self.bank.update(frame)
+                          for frame in self.scan_block[10:]]
+        self.assertEqual(expected_result, actual_result)
+
+    def test_uint16_matches_separate_filters(self):
+        self.bank = TemporalMedianFilterBank(3, dtype=np.uint16)
+        self.filters = [TemporalMedianFilter(3, dtype=np.uint16)
+                        for sensor in range(3)]
+        for frame in self.scan_block / 7.0:
+            expected_result = [self.filters[sensor].update(frame[sensor])
+                               for sensor in range(3)]
+            actual_result = self.bank.update(frame)
+            self.assertEqual(expected_result, actual_result)
+
+    def test_inconsistent_num_sensors(self):
+        self.bank = TemporalMedianFilterBank(3)
+        self.bank.update(self.scan_block[0])
+        with self.assertRaises(ValueError):
+            self.bank.update(self.scan_block[1, :2])
+
+    def test_inconsistent_num_measurement(self):
+        self.bank = TemporalMedianFilterBank(3)
+        self.bank.update([[1.0,2.0,3.0],[1.0,2.0]])
+        with self.assertRaises(ValueError):
+            self.bank.update([[1.0,2.0],[1.0,2.0,3.0]])
+
+    def test_update_batch_one_frame(self):
+        self.bank = TemporalMedianFilterBank(3)
+        with self.assertRaises(ValueError):
+            self.bank.update_batch(self.scan_block[0])
+
+    def test_change_num_prev_scans(self):
+        scans = [[[1.0,2.0],[3.0]], [[5.0,6.0],[1.0]], [[3.0,4.0],[2.0]]]
+        self.bank = TemporalMedianFilterBank(0)
+        for frame in scans:
+            self.bank.update(frame)
+        self.bank.change_num_prev_scans(2)
+        self.assertEqual([[3.5,4.5],[5.5]], self.bank.update([[4.0,5.0],[9.0]]))
+        self.assertEqual([[3.0,4.0],[9.0]], self.bank.update([[3.0,4.0],[9.0]]))
+
+    def test_negative_num_previous_scan(self):
+        with self.assertRaises(ValueError):
+            self.bank = TemporalMedianFilterBank(-1)
+
+    def test_float_three_point_zero_num_previous_scan(self):
+        with self.assertRaises(TypeError):
+            self.bank = TemporalMedianFilterBank(3.0)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
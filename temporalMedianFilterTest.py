@@ -1,5 +1,10 @@
+import os
+import shutil
+import tempfile
+import warnings
 import numpy as np
 import unittest
+from filters import MEDIAN_ENGINES
 from filters import TemporalMedianFilter
 
 
@@ -136,6 +141,550 @@ class TestTemporalMedianFilter(unittest.TestCase):
             actual_result = self.filter.update(scan_list[idx])
             self.assertEqual(expected_result[idx],actual_result)
 
+    def test_median_filter_matches_numpy_median_over_long_stream(self):
+        self.filter = TemporalMedianFilter(4)
+        scan_array = np.random.RandomState(0).randint(0, 6, (40, 7))
+        scan_array = scan_array.astype(float)
+        num_scans = scan_array.shape[0]
+        for idx in range(num_scans):
+            window = scan_array[max(0, idx - 4):idx + 1]
+            expected_result = np.median(window, axis=0).tolist()
+            actual_result = self.filter.update(scan_array[idx])
+            self.assertEqual(expected_result, actual_result)
+
+    def test_median_filter_window_unchanged_by_inconsistent_scan(self):
+        self.filter = TemporalMedianFilter(2)
+        self.filter.update([1.0,2.0,3.0])
+        self.filter.update([3.0,2.0,1.0])
+        with self.assertRaises(ValueError):
+            self.filter.update([1.0,2.0])
+        actual_result = self.filter.update([5.0,5.0,5.0])
+        self.assertEqual([3.0,2.0,3.0], actual_result)
+
+    def test_update_batch_three_previous_scans(self):
+        self.filter = TemporalMedianFilter(3)
+        scan_array = np.array([[0.0,1.0,2.0,1.0,3.0],
+                                [1.0,5.0,7.0,1.0,3.0],
+                                [2.0,3.0,4.0,1.0,0.0],
+                                [3.0,3.0,3.0,1.0,3.0],
+                                [10.0,2.0,4.0,0.0,0.0]])
+
+        expected_result = [[0.0,1.0,2.0,1.0,3.0],
+                            [0.5,3.0,4.5,1.0,3.0],
+                            [1.0,3.0,4.0,1.0,3.0],
+                            [1.5,3.0,3.5,1.0,3.0],
+                            [2.5,3.0,4.0,1.0,1.5]]
+        actual_result = self.filter.update_batch(scan_array)
+        self.assertEqual(expected_result, actual_result.tolist())
+
+    def test_update_batch_continues_from_previous_scans(self):
+        scan_array = np.random.RandomState(1).rand(30, 6)
+        self.filter = TemporalMedianFilter(4)
+        expected_result = [self.filter.update(scan) for scan in scan_array]
+
+        self.filter = TemporalMedianFilter(4)
+        actual_result = [self.filter.update(scan) for scan in scan_array[:2]]
+        actual_result += self.filter.update_batch(scan_array[2:20]).tolist()
+        actual_result += [self.filter.update(scan) for scan in scan_array[20:]]
+        self.assertEqual(expected_result, actual_result)
+
+    def test_update_batch_inconsistent_num_measurement(self):
+        self.filter = TemporalMedianFilter(3)
+        self.filter.update([0.0,1.0])
+        with self.assertRaises(ValueError):
+            self.filter.update_batch([[1.0,5.0,7.0]])
+
+    def test_update_batch_one_dimensional_scans(self):
+        self.filter = TemporalMedianFilter(3)
+        with self.assertRaises(ValueError):
+            self.filter.update_batch([1.0,5.0,7.0])
+
+    def test_float32_history_within_precision_of_float64(self):
+        scan_array = np.random.RandomState(2).uniform(0.0, 60.0, (20, 50))
+        self.filter = TemporalMedianFilter(4, dtype=np.float32)
+        reference = TemporalMedianFilter(4)
+        for scan in scan_array:
+            expected_result = np.array(reference.update(scan))
+            actual_result = np.array(self.filter.update(scan))
+            self.assertTrue(np.all(np.abs(actual_result - expected_result)
+                                   <= 2.0**-23 * expected_result))
+
+    def test_float16_history_within_precision_of_float64(self):
+        scan_array = np.random.RandomState(2).uniform(0.0, 60.0, (20, 50))
+        self.filter = TemporalMedianFilter(4, dtype=np.float16)
+        reference = TemporalMedianFilter(4)
+        for scan in scan_array:
+            expected_result = np.array(reference.update(scan))
+            actual_result = np.array(self.filter.update(scan))
+            self.assertTrue(np.all(np.abs(actual_result - expected_result)
+                                   <= 2.0**-10 * expected_result))
+
+    def test_uint16_history_within_half_millimetre_of_float64(self):
+        scan_array = np.random.RandomState(2).uniform(0.0, 60.0, (20, 50))
+        self.filter = TemporalMedianFilter(4, dtype=np.uint16)
+        reference = TemporalMedianFilter(4)
+        for scan in scan_array:
+            expected_result = np.array(reference.update(scan))
+            actual_result = np.array(self.filter.update(scan))
+            self.assertTrue(np.all(np.abs(actual_result - expected_result)
+                                   <= 0.0005 + 2.0**-24 * expected_result))
+
+    def test_update_batch_keeps_dtype(self):
+        scan_array = np.random.RandomState(2).uniform(0.0, 60.0, (20, 6))
+        for dtype, result_dtype in [(np.float32, np.float32),
+                                    (np.float16, np.float16),
+                                    (np.uint16, np.float32)]:
+            self.filter = TemporalMedianFilter(3, dtype=dtype)
+            expected_result = [self.filter.update(scan)
+                               for scan in scan_array]
+            self.filter = TemporalMedianFilter(3, dtype=dtype)
+            actual_result = self.filter.update_batch(scan_array)
+            self.assertEqual(result_dtype, actual_result.dtype)
+            self.assertEqual(expected_result, actual_result.tolist())
+
+    def test_uint16_history_saturates(self):
+        self.filter = TemporalMedianFilter(0, dtype=np.uint16)
+        actual_result = self.filter.update([-1.0,0.0004,70.0])
+        self.assertEqual([0.0,0.0,np.float32(65.535)], actual_result)
+
+    def test_histogram_engine_within_bin_width_of_exact(self):
+        scan_array = np.random.RandomState(2).uniform(0.0, 50.0, (60, 50))
+        self.filter = TemporalMedianFilter(20, engine="histogram",
+                                           bin_width=0.05, num_bins=1000)
+        reference = TemporalMedianFilter(20)
+        self.assertEqual(0.05, self.filter.error_bound())
+        self.assertEqual(0.0, reference.error_bound())
+        for scan in scan_array:
+            expected_result = np.array(reference.update(scan))
+            actual_result = np.array(self.filter.update(scan))
+            self.assertTrue(np.all(np.abs(actual_result - expected_result)
+                                   <= 0.05))
+
+    def test_histogram_engine_nan_sorts_last(self):
+        self.filter = TemporalMedianFilter(2, engine="histogram",
+                                           bin_width=0.5, num_bins=10)
+        self.filter.update([np.nan,1.2,np.nan])
+        self.filter.update([np.nan,0.3,2.2])
+        actual_result = self.filter.update([3.7,np.nan,100.0])
+        self.assertTrue(np.isnan(actual_result[0]))
+        self.assertEqual([1.25,4.75], actual_result[1:])
+
+    def test_histogram_engine_update_batch_matches_update(self):
+        scan_array = np.random.RandomState(2).uniform(0.0, 50.0, (20, 6))
+        self.filter = TemporalMedianFilter(5, engine="histogram")
+        expected_result = [self.filter.update(scan) for scan in scan_array]
+        self.filter = TemporalMedianFilter(5, engine="histogram")
+        actual_result = self.filter.update_batch(scan_array[:7]).tolist()
+        actual_result += self.filter.update_batch(scan_array[7:]).tolist()
+        self.assertEqual(expected_result, actual_result)
+
+    def test_mask_invalid_median_over_valid_returns(self):
+        self.filter = TemporalMedianFilter(3, mask_invalid=True)
+        scan_list = [[1.0,0.0,np.nan,5.0],
+                     [2.0,np.inf,np.nan,0.0],
+                     [np.nan,3.0,np.nan,0.0],
+                     [4.0,np.nan,np.nan,6.0]]
+        expected_result = [[1.0,None,None,5.0],
+                           [1.5,None,None,5.0],
+                           [1.5,3.0,None,5.0],
+                           [2.0,3.0,None,5.5]]
+        for scan, expected in zip(scan_list, expected_result):
+            actual_result = self.filter.update(scan)
+            for actual, value in zip(actual_result, expected):
+                if value is None:
+                    self.assertTrue(np.isnan(actual))
+                else:
+                    self.assertEqual(value, actual)
+
+    def test_mask_invalid_matches_nanmedian(self):
+        scan_array = np.random.RandomState(2).uniform(0.5, 50.0, (40, 30))
+        mask = np.random.RandomState(3).uniform(size=scan_array.shape)
+        scan_array[mask < 0.2] = np.nan
+        scan_array[mask > 0.9] = 0.0
+        nan_array = np.where(scan_array == 0.0, np.nan, scan_array)
+        for dtype in [np.float64, np.uint16]:
+            self.filter = TemporalMedianFilter(5, dtype=dtype,
+                                               mask_invalid=True)
+            for idx, scan in enumerate(scan_array):
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore", RuntimeWarning)
+                    expected_result = np.nanmedian(
+                        nan_array[max(0, idx - 5):idx + 1], axis=0)
+                actual_result = np.array(self.filter.update(scan))
+                self.assertTrue(np.array_equal(np.isnan(expected_result),
+                                               np.isnan(actual_result)))
+                valid = ~np.isnan(expected_result)
+                self.assertTrue(np.all(np.abs(actual_result[valid] -
+                                              expected_result[valid])
+                                       <= 0.0005 + 2.0**-24 * 50.0))
+
+    def test_mask_invalid_update_batch_matches_update(self):
+        scan_array = np.random.RandomState(2).uniform(0.5, 50.0, (30, 8))
+        mask = np.random.RandomState(3).uniform(size=scan_array.shape)
+        scan_array[mask < 0.3] = np.nan
+        for engine in MEDIAN_ENGINES:
+            self.filter = TemporalMedianFilter(4, engine=engine,
+                                               mask_invalid=True)
+            expected_result = np.array([self.filter.update(scan)
+                                        for scan in scan_array])
+            self.filter = TemporalMedianFilter(4, engine=engine,
+                                               mask_invalid=True)
+            actual_result = np.concatenate(
+                [self.filter.update_batch(scan_array[:11]),
+                 self.filter.update_batch(scan_array[11:])])
+            self.assertTrue(np.array_equal(expected_result, actual_result,
+                                           equal_nan=True))
+
+    def test_wrong_mask_invalid_type(self):
+        with self.assertRaises(TypeError):
+            self.test_filter = TemporalMedianFilter(3, mask_invalid="yes")
+
+    def test_profiling_counts_evictions(self):
+        self.filter = TemporalMedianFilter(2)
+        profile = self.filter.enable_profiling()
+        scan_array = np.random.RandomState(2).uniform(0.0, 50.0, (6, 4))
+        expected_result = TemporalMedianFilter(2).update_batch(scan_array)
+        actual_result = [self.filter.update(scan) for scan in scan_array[:4]]
+        actual_result += self.filter.update_batch(scan_array[4:]).tolist()
+        self.assertEqual(expected_result.tolist(), actual_result)
+        summary = profile.snapshot()
+        self.assertEqual({"scans": 6, "beams": 24, "evictions": 3},
+                         summary["counters"])
+        for stage in ["convert", "insert", "median", "output"]:
+            self.assertEqual(4, summary["stages"][stage]["calls"])
+        self.assertEqual(5, summary["stages"]["total"]["calls"])
+        profile.reset()
+        self.assertEqual(0, profile.snapshot()["calls"])
+
+    def test_load_state_resumes_filtering(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "median.state")
+        try:
+            scan_array = np.random.RandomState(2).uniform(0.0, 50.0, (12, 7))
+            scan_array[3, 2] = np.nan
+            for options in [{}, {"dtype": np.uint16, "mask_invalid": True},
+                            {"engine": "histogram"}]:
+                reference = TemporalMedianFilter(4, **options)
+                expected_result = [reference.update(scan)
+                                   for scan in scan_array]
+                self.filter = TemporalMedianFilter(4, **options)
+                for scan in scan_array[:6]:
+                    self.filter.update(scan)
+                self.filter.save_state(path)
+
+                self.filter = TemporalMedianFilter(1, **options)
+                self.filter.load_state(path)
+                actual_result = [self.filter.update(scan)
+                                 for scan in scan_array[6:]]
+                self.assertTrue(np.array_equal(
+                    np.array(expected_result[6:]), np.array(actual_result),
+                    equal_nan=True))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_load_state_checks_settings_and_data(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "median.state")
+        try:
+            self.filter = TemporalMedianFilter(3)
+            self.filter.update([1.0,2.0,3.0])
+            self.filter.save_state(path)
+            with self.assertRaises(ValueError):
+                TemporalMedianFilter(3, dtype=np.float32).load_state(path)
+            with self.assertRaises(ValueError):
+                TemporalMedianFilter(3, engine="histogram").load_state(path)
+
+            with open(path, "r+b") as state_file:
+                state_file.seek(-1, os.SEEK_END)
+                state_file.write(b"\xff")
+            with self.assertRaises(ValueError):
+                TemporalMedianFilter(3).load_state(path)
+
+            with open(path, "wb") as state_file:
+                state_file.write(b"0.0 1.0 2.0\n")
+            with self.assertRaises(ValueError):
+                TemporalMedianFilter(3).load_state(path)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_load_state_checks_tampered_settings(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "median.state")
+        try:
+            for engine in MEDIAN_ENGINES:
+                saved = TemporalMedianFilter(30, engine=engine)
+                saved.update([1.0,2.0,3.0])
+                saved.save_state(path)
+                with open(path, "rb") as state_file:
+                    data = state_file.read()
+                self.filter = TemporalMedianFilter(2, engine=engine)
+                reference = TemporalMedianFilter(2, engine=engine)
+                for scan in [[4.0,5.0], [6.0,7.0]]:
+                    self.filter.update(scan)
+                    reference.update(scan)
+
+                # The settings are not covered by a checksum
+                for original, tampered in [
+                        (b'"num_prev_scans": 30', b'"num_prev_scans": -1'),
+                        (b'"num_prev_scans": 30', b'"num_prev_scans":"3"'),
+                        (b'"num_prev_scans": 30', b'"num_prev_scans":1.5'),
+                        (b'"num_points": 3', b'"num_points":-3'),
+                        (b'"num_points": 3', b'"num_points": 2')]:
+                    self.assertIn(original, data)
+                    with open(path, "wb") as state_file:
+                        state_file.write(data.replace(original, tampered))
+                    with self.assertRaises(ValueError):
+                        self.filter.load_state(path)
+                self.assertEqual(reference.update([8.0,9.0]),
+                                 self.filter.update([8.0,9.0]))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_change_num_prev_scans_keeps_recent_scans(self):
+        scan_array = np.random.RandomState(4).uniform(0.5, 50.0, (12, 6))
+        scan_array[np.random.RandomState(5).uniform(size=(12, 6)) < 0.2] = 0.0
+        for engine in MEDIAN_ENGINES:
+            for mask_invalid in [False, True]:
+                for num_prev_scans in [1, 6]:
+                    self.filter = TemporalMedianFilter(
+                        3, engine=engine, mask_invalid=mask_invalid)
+                    self.filter.update_batch(scan_array[:8])
+                    self.filter.change_num_prev_scans(num_prev_scans)
+                    actual_result = self.filter.update_batch(scan_array[8:])
+
+                    # A new filter holding only the scans kept
+                    self.filter = TemporalMedianFilter(
+                        num_prev_scans, engine=engine,
+                        mask_invalid=mask_invalid)
+                    kept = min(4, num_prev_scans + 1)
+                    self.filter.update_batch(scan_array[8 - kept:8])
+                    expected_result = self.filter.update_batch(
+                        scan_array[8:])
+                    self.assertTrue(np.array_equal(
+                        expected_result, actual_result, equal_nan=True))
+
+    def test_invalid_change_num_prev_scans_keeps_window(self):
+        self.filter = TemporalMedianFilter(2)
+        for scan in [[1.0], [5.0], [3.0]]:
+            self.filter.update(scan)
+        with self.assertRaises(ValueError):
+            self.filter.change_num_prev_scans(-1)
+        with self.assertRaises(TypeError):
+            self.filter.change_num_prev_scans(2.0)
+        self.assertEqual([4.0], self.filter.update([4.0]))
+
+    def test_update_unchecked_matches_update(self):
+        scan_array = np.random.RandomState(0).uniform(0.0, 50.0, (10, 6))
+        for engine in MEDIAN_ENGINES:
+            self.filter = TemporalMedianFilter(3, engine=engine)
+            expected_result = [self.filter.update(scan) for scan in scan_array]
+            self.filter = TemporalMedianFilter(3, engine=engine)
+            out = np.empty(6)
+            actual_result = [self.filter.update_unchecked(scan).tolist()
+                             for scan in scan_array[:5]]
+            actual_result += [self.filter.update_unchecked(scan, out).tolist()
+                              for scan in scan_array[5:]]
+            self.assertEqual(expected_result, actual_result)
+
+    def test_update_unchecked_checks_first_call(self):
+        self.filter = TemporalMedianFilter(3, dtype=np.uint16)
+        with self.assertRaises(TypeError):
+            self.filter.update_unchecked(np.ones(4))
+        self.filter.update([1.0,2.0,3.0,4.0])
+        with self.assertRaises(ValueError):
+            self.filter.update_unchecked(np.ones(3, dtype=np.float32))
+        self.assertEqual([1.0,1.5,2.0,2.5], self.filter.update_unchecked(
+            np.ones(4, dtype=np.float32)).tolist())
+
+    def test_update_does_not_reshape_numpy_array(self):
+        scan_array = np.array([[1.0,2.0],[3.0,4.0]])
+        TemporalMedianFilter(3).update(scan_array)
+        self.assertEqual((2, 2), scan_array.shape)
+
+    def test_update_channels_gathers_median_sample(self):
+        self.filter = TemporalMedianFilter(2)
+        scans = [{"range": [1.0,9.0], "intensity": [10,11]},
+                 {"range": [5.0,2.0], "intensity": [20,21]},
+                 {"range": [3.0,4.0], "intensity": [30,31]},
+                 {"range": [4.0,2.0], "intensity": [40,41]}]
+        channels = [self.filter.update_channels(scan) for scan in scans]
+        self.assertEqual([1.0,9.0], channels[0]["range"].tolist())
+        self.assertEqual([10,11], channels[0]["intensity"].tolist())
+        self.assertEqual([3.0,4.0], channels[2]["range"].tolist())
+        self.assertEqual([30,31], channels[2]["intensity"].tolist())
+        # Of equally near samples the most recent is chosen
+        self.assertEqual([4.0,2.0], channels[3]["range"].tolist())
+        self.assertEqual([40,41], channels[3]["intensity"].tolist())
+
+    def test_update_channels_matches_update(self):
+        scan_array = np.random.RandomState(0).uniform(0.0, 50.0, (10, 6))
+        for engine in MEDIAN_ENGINES:
+            self.filter = TemporalMedianFilter(3, engine=engine)
+            expected_result = [self.filter.update(scan) for scan in scan_array]
+            self.filter = TemporalMedianFilter(3, engine=engine)
+            actual_result = []
+            for idx, scan in enumerate(scan_array):
+                channels = self.filter.update_channels(
+                    {"range": scan, "stamp": np.full(6, idx)})
+                actual_result.append(channels["range"].tolist())
+                self.assertTrue(np.all(channels["stamp"] <= idx))
+                self.assertTrue(np.all(channels["stamp"] >= idx - 3))
+            self.assertEqual(expected_result, actual_result)
+
+    def test_update_channels_without_channels_gathers_zeros(self):
+        self.filter = TemporalMedianFilter(2)
+        self.filter.update_channels({"range": [1.0,1.0], "id": [1,1]})
+        self.filter.update([2.0,2.0])
+        channels = self.filter.update_channels({"range": [3.0,3.0],
+                                                "id": [3,3]})
+        # The medians are samples of the scan given to update
+        self.assertEqual([2.0,2.0], channels["range"].tolist())
+        self.assertEqual([0,0], channels["id"].tolist())
+        channels = self.filter.update_channels({"range": [2.5,0.5],
+                                                "id": [4,4]})
+        self.assertEqual([2.5,2.0], channels["range"].tolist())
+        self.assertEqual([4,0], channels["id"].tolist())
+
+        # Channels held before select_beams are dropped
+        self.filter.select_beams([1,0])
+        channels = self.filter.update_channels({"range": [10.0,2.6],
+                                                "id": [5,5]})
+        self.assertEqual([3.0,2.6], channels["range"].tolist())
+        self.assertEqual([0,5], channels["id"].tolist())
+
+    def test_update_channels_gathers_from_window(self):
+        scan_array = np.random.RandomState(1).uniform(0.0, 20.0, (30, 7))
+        scan_array = scan_array.round(3)
+        scan_array[np.random.RandomState(2).rand(30, 7) < 0.1] = np.nan
+        options = [{}, {"dtype": np.uint16}, {"mask_invalid": True},
+                   {"motion_threshold": 1.0}, {"engine": "histogram"}]
+        for kwargs in options:
+            self.filter = TemporalMedianFilter(4, **kwargs)
+            for idx, scan in enumerate(scan_array):
+                if idx == 15:
+                    self.filter.change_num_prev_scans(2)
+                channels = self.filter.update_channels(
+                    {"range": scan, "id": (idx + 1)*10 + np.arange(7)})
+                scans, beams = np.divmod(channels["id"], 10)
+                self.assertEqual(list(range(7)), beams.tolist())
+                self.assertTrue(np.all(idx + 1 - scans <
+                                       self.filter.effective_windows()))
+                if kwargs or idx % 2 == 1:
+                    continue
+                # An odd window's median is the gathered sample
+                np.testing.assert_array_equal(
+                    channels["range"], scan_array[scans - 1, beams])
+
+    def test_adaptive_window_follows_step(self):
+        self.filter = TemporalMedianFilter(6, motion_threshold=1.0,
+                                           min_prev_scans=2)
+        scans = [[10.0,10.0]] * 7 + [[20.0,10.1]] * 3
+        actual_result = [self.filter.update(scan) for scan in scans]
+        # The first beam shrinks to its 3 most recent scans while it moves
+        self.assertEqual([10.0,10.0], actual_result[6])
+        self.assertEqual([10.0,10.0], actual_result[7])
+        self.assertEqual([20.0,10.0], actual_result[8])
+        self.assertEqual([20.0,10.0], actual_result[9])
+        self.assertEqual([4, 7], self.filter.effective_windows().tolist())
+        stats = self.filter.window_stats()
+        self.assertEqual({"mean": 5.5, "min": 4, "max": 7, "shrinks": 2},
+                         stats)
+
+    def test_adaptive_window_without_motion_matches_fixed(self):
+        scan_array = 10.0 + np.random.RandomState(0).uniform(0.0, 0.1,
+                                                             (12, 8))
+        for mask_invalid in [False, True]:
+            expected_result = TemporalMedianFilter(
+                4, mask_invalid=mask_invalid).update_batch(scan_array)
+            self.filter = TemporalMedianFilter(
+                4, mask_invalid=mask_invalid, motion_threshold=0.5)
+            actual_result = self.filter.update_batch(scan_array)
+            self.assertEqual(expected_result.tolist(), actual_result.tolist())
+            self.assertEqual(0, self.filter.window_stats()["shrinks"])
+
+    def test_select_beams_keeps_history_of_remaining_beams(self):
+        self.filter = TemporalMedianFilter(2)
+        for scan in [[1.0,5.0,9.0],[2.0,6.0,7.0],[3.0,4.0,8.0]]:
+            self.filter.update(scan)
+        # Beams 2 and 0 stay, the last beam is new
+        self.filter.select_beams([2, 0, -1])
+        self.assertEqual([3, 3, 0], self.filter.effective_windows().tolist())
+        self.assertEqual([7.0,3.0,20.0], self.filter.update([1.0,9.0,20.0]))
+        self.assertEqual([1.0,3.0,21.0],
+                         self.filter.update_batch([[0.0,0.0,22.0]]).tolist()[0])
+        self.assertEqual([0.0,0.0,22.0], self.filter.update([0.0,0.0,23.0]))
+        self.assertEqual([3, 3, 3], self.filter.effective_windows().tolist())
+
+    def test_select_beams_matches_new_filter_for_new_beams(self):
+        scan_array = np.random.RandomState(0).uniform(0.0, 50.0, (9, 4))
+        for kwargs in [{}, {"mask_invalid": True}, {"dtype": np.uint16},
+                       {"motion_threshold": 100.0}]:
+            self.filter = TemporalMedianFilter(3, **kwargs)
+            self.filter.update_batch(scan_array[:5, :2])
+            self.filter.select_beams([1, -1, -1])
+            actual_result = self.filter.update_batch(scan_array[5:, 1:])
+            expected_result = TemporalMedianFilter(3, **kwargs).update_batch(
+                scan_array[:, 1:])[5:, 0]
+            self.assertEqual(expected_result.tolist(),
+                             actual_result[:, 0].tolist())
+            expected_result = TemporalMedianFilter(3, **kwargs).update_batch(
+                scan_array[5:, 2:])
+            self.assertEqual(expected_result.tolist(),
+                             actual_result[:, 1:].tolist())
+
+    def test_wrong_select_beams(self):
+        self.filter = TemporalMedianFilter(3)
+        self.filter.update([1.0,2.0])
+        with self.assertRaises(TypeError):
+            self.filter.select_beams("0")
+        with self.assertRaises(TypeError):
+            self.filter.select_beams([0.0])
+        with self.assertRaises(ValueError):
+            self.filter.select_beams([[0]])
+        with self.assertRaises(ValueError):
+            self.filter.select_beams([2])
+        with self.assertRaises(ValueError):
+            self.filter.select_beams([-2])
+        self.test_filter = TemporalMedianFilter(3, engine="histogram")
+        self.test_filter.update([1.0,2.0])
+        with self.assertRaises(ValueError):
+            self.test_filter.select_beams([0, -1])
+        self.test_filter.select_beams([1])
+        self.assertEqual([2.025], self.test_filter.update([2.0]))
+
+    def test_wrong_adaptive_args(self):
+        with self.assertRaises(ValueError):
+            TemporalMedianFilter(3, engine="histogram", motion_threshold=1.0)
+        with self.assertRaises(ValueError):
+            TemporalMedianFilter(3, motion_threshold=-1.0)
+        with self.assertRaises(ValueError):
+            TemporalMedianFilter(3, motion_threshold=1.0, min_prev_scans=-1)
+        with self.assertRaises(TypeError):
+            TemporalMedianFilter(3, motion_threshold="1.0")
+        with self.assertRaises(TypeError):
+            TemporalMedianFilter(3, motion_threshold=1.0, min_prev_scans=2.0)
+
+    def test_wrong_engine(self):
+        with self.assertRaises(ValueError):
+            self.test_filter = TemporalMedianFilter(3, engine="approximate")
+        with self.assertRaises(TypeError):
+            self.test_filter = TemporalMedianFilter(3, engine=1)
+
+    def test_wrong_histogram_bins(self):
+        with self.assertRaises(ValueError):
+            self.test_filter = TemporalMedianFilter(3, engine="histogram",
+                                                    bin_width=0.0)
+        with self.assertRaises(ValueError):
+            self.test_filter = TemporalMedianFilter(3, engine="histogram",
+                                                    num_bins=0)
+        with self.assertRaises(TypeError):
+            self.test_filter = TemporalMedianFilter(3, engine="histogram",
+                                                    num_bins=10.0)
+
+    def test_wrong_dtype(self):
+        with self.assertRaises(TypeError):
+            self.test_filter = TemporalMedianFilter(3, dtype=np.int32)
+
     def test_negative_num_previous_scan(self):
         with self.assertRaises(ValueError):
             self.test_filter = TemporalMedianFilter(-1)